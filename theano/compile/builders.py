@@ -21,9 +21,6 @@ class OpFromGraph(gof.Op):
 
     TODO:
         - examples for a multi-layer mlp. where?
-        - __hash__, __eq__ otherwise won't merge, try
-          gof.opt.is_same_graph_with_merge(op1.new_outputs, op2,
-          new_outputs)
         - c_code() to remove the double overhead?
         - opt to unfold it, work inplace on inputs
         - grad() make it support DisconnectedType and the new interface
@@ -106,14 +103,32 @@ class OpFromGraph(gof.Op):
         self.kwargs = kwargs
         self.input_types = [input.type for input in inputs]
         self.output_types = [output.type for output in outputs]
+        self._hash_inner_graph = gof.graph.graph_hash(new_inputs, new_outputs)
 
     def __eq__(self, other):
-        # TODO: recognize a copy
-        return self is other
+        if self is other:
+            return True
+        if (type(self) != type(other) or
+                # Graphs that compute the same thing have the same
+                # structural hash, this rejects most Ops quickly.
+                self._hash_inner_graph != other._hash_inner_graph or
+                self.input_types != other.input_types or
+                self.kwargs != other.kwargs):
+            return False
+        # The shared variables are inputs of the node, so they don't need
+        # to be the same.
+        from theano.scan_module.scan_utils import equal_computations
+        return equal_computations(self.new_outputs, other.new_outputs,
+                                  self.new_inputs, other.new_inputs)
 
     def __hash__(self):
-        # TODO: use internal variables in hash
-        return hash(type(self))
+        return hash((type(self), self._hash_inner_graph))
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        # The structural hash is not stable across processes.
+        self._hash_inner_graph = gof.graph.graph_hash(self.new_inputs,
+                                                      self.new_outputs)
 
     def make_node(self, *inputs):
         for input, type in zip(inputs, self.input_types):
@@ -124,6 +139,17 @@ class OpFromGraph(gof.Op):
                          list(inputs) + self.shared_inputs,
                          [type() for type in self.output_types])
 
+    def inner_function_args(self):
+        """
+        Return the arguments of `orig_function` used to compile the inner
+        graph, as a tuple (inputs, outputs, kwargs), or None if it is
+        already compiled (see `theano.compile.parallel_opt`).
+
+        """
+        if hasattr(self, "fn"):
+            return None
+        return self.new_inputs, self.new_outputs, self.kwargs
+
     def prepare_node(self, node, storage_map, compute_map, impl):
         if not hasattr(self, "fn") and impl == 'py':
             self.fn = orig_function(self.new_inputs,
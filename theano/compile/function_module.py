@@ -5,10 +5,10 @@ Driver of graph construction, optimization, and linking.
 from __future__ import absolute_import, print_function, division
 
 import copy
+import threading
 from six import string_types, iteritems, iterkeys
 from six.moves import xrange
 import six.moves.copyreg as copyreg
-import six.moves.cPickle as pickle
 from itertools import chain
 import time
 import warnings
@@ -22,7 +22,7 @@ import theano.compile.mode
 from theano.compile.io import (
     In, SymbolicInput, SymbolicOutput)
 from theano.compile.ops import deep_copy_op, view_op
-from theano.gof.graph import is_same_graph
+from theano.configparser import local_flags
 from theano.gof.op import ops_with_inner_function
 
 import logging
@@ -30,6 +30,12 @@ _logger = logging.getLogger('theano.compile.function_module')
 
 __docformat__ = "restructuredtext en"
 
+# Held while a function is linked or changes global state. The second tier
+# of a function compiled with a TieredMode is compiled in another thread.
+# The optimization of the graph works on its own copy and changes the flags
+# with `local_flags`, so it can run in both threads at once.
+_compile_lock = threading.RLock()
+
 
 class UnusedInputError(Exception):
     """
@@ -374,6 +380,9 @@ class Function(object):
         self.name = None
         self.nodes_with_inner_function = []
         self.output_keys = output_keys
+        self._map_fn = None  # built by map
+        self._next_tier = None  # set when the second tier is compiled
+        self._tier_thread = None
 
         # We will be popping stuff off this `containers` object.  It is a copy.
         containers = list(self.input_storage)
@@ -501,6 +510,72 @@ class Function(object):
             if node.op in ops_with_inner_function:
                 self.nodes_with_inner_function.append(node.op)
 
+        self._init_fast_call()
+
+    def _init_fast_call(self):
+        """
+        Cache what `__call__` needs to check the arguments quickly.
+
+        When the function is called with all its explicit inputs as
+        positional arguments, and each of them is a ndarray of the expected
+        dtype and number of dimensions, the arguments are used as they are
+        instead of going through `Type.filter` and the bookkeeping of the
+        provided inputs. Any other call takes the usual path.
+
+        """
+        from theano.tensor.type import TensorType
+
+        # Aliased inputs only need to be copied when an input can be
+        # destroyed.
+        self._may_destroy_inputs = any(
+            getattr(i, 'mutable', False) or i.update is not None
+            for i in self.maker.expanded_inputs)
+        self._refeed = [i for i, (required, refeed, value)
+                        in enumerate(self.defaults) if refeed]
+
+        # The storage and checks of the explicit inputs: (storage, dtype,
+        # ndim, indices of the broadcastable dimensions), or None if the
+        # fast path isn't possible.
+        self._fast_checks = None
+        checks = []
+        n_explicit = 0
+        for c in self.input_storage:
+            if c.implicit:
+                break
+            n_explicit += 1
+        if any(c.required for c in self.input_storage[n_explicit:]):
+            return
+        for c in self.input_storage[:n_explicit]:
+            if (type(c.type) is not TensorType or
+                    c.type.filter_checks_isfinite or not c.required):
+                return
+            checks.append((c.storage, c.type.numpy_dtype, c.type.ndim,
+                           [i for i, b in enumerate(c.type.broadcastable)
+                            if b]))
+        self._fast_checks = checks
+
+    def _fast_filter(self, args):
+        """
+        Store `args` in the input storage if they pass the checks of the
+        fast path, and return whether they did.
+
+        """
+        checks = self._fast_checks
+        if checks is None or len(args) != len(checks):
+            return False
+        # When a check fails, the arguments already stored will be
+        # overwritten by the usual path.
+        for arg, (storage, dtype, ndim, broadcastable) in izip(args, checks):
+            if (type(arg) is not numpy.ndarray or arg.ndim != ndim or
+                    arg.dtype != dtype or arg.dtype.num != dtype.num or
+                    not arg.flags.aligned):
+                return False
+            for i in broadcastable:
+                if arg.shape[i] != 1:
+                    return False
+            storage[0] = arg
+        return True
+
     def __contains__(self, item):
         return self.value.__contains__(item)
 
@@ -749,6 +824,8 @@ class Function(object):
             List of outputs on indices/keys from ``output_subset`` or all of them,
             if ``output_subset`` is not passed.
         """
+        if self._next_tier is not None:
+            self._swap_tier()
         profile = self.profile
         t0 = time.time()
 
@@ -758,12 +835,15 @@ class Function(object):
                 [self.output_keys.index(key) for key in output_subset]
 
         # Reinitialize each container's 'provided' counter
+        fast = False
         if self.trust_input:
             i = 0
             for arg in args:
                 s = self.input_storage[i]
                 s.storage[0] = arg
                 i += 1
+        elif not kwargs and self._fast_filter(args):
+            fast = True
         else:
             for c in self.input_storage:
                 c.provided = 0
@@ -814,7 +894,8 @@ class Function(object):
                 self[k] = arg
 
         if (not self.trust_input and
-                getattr(self, '_check_for_aliased_inputs', True)):
+                getattr(self, '_check_for_aliased_inputs', True) and
+                (not fast or self._may_destroy_inputs)):
             # Collect aliased inputs among the storage space
             args_share_memory = []
             for i in xrange(len(self.input_storage)):
@@ -829,9 +910,9 @@ class Function(object):
                              in args_share_memory[j]],
                             [self.input_storage[k].storage[0] for k
                              in args_share_memory[j]])
-                        if numpy.any([(var.type is i_var.type and
-                                       var.type.may_share_memory(val, i_val))
-                                      for (var, val) in group_j]):
+                        if any(var.type is i_var.type and
+                               var.type.may_share_memory(val, i_val)
+                               for (var, val) in group_j):
 
                             is_aliased = True
                             args_share_memory[j].append(i)
@@ -840,17 +921,17 @@ class Function(object):
                     if not is_aliased:
                         args_share_memory.append([i])
 
-                # Check for groups of more than one argument that share memory
-                for group in args_share_memory:
-                    if len(group) > 1:
-                        # copy all but the first
-                        for idx in group[1:]:
-                            self.input_storage[i].storage[0] = copy.copy(
-                                self.input_storage[i].storage[0])
+            # Check for groups of more than one argument that share memory
+            for group in args_share_memory:
+                if len(group) > 1:
+                    # copy all but the first
+                    for idx in group[1:]:
+                        self.input_storage[idx].storage[0] = copy.copy(
+                            self.input_storage[idx].storage[0])
 
         # Check if inputs are missing, or if inputs were set more than once, or
         # if we tried to provide inputs that are supposed to be implicit.
-        if not self.trust_input:
+        if not self.trust_input and not fast:
             for c in self.input_storage:
                 if c.required and not c.provided:
                     raise TypeError("Missing required input: %s" %
@@ -925,11 +1006,11 @@ class Function(object):
             outputs = outputs[:self.n_returned_outputs]
 
         # Put default values back in the storage
-        for i, (required, refeed, value) in enumerate(self.defaults):
-            if refeed:
-                if isinstance(value, gof.Container):
-                    value = value.storage[0]
-                self[i] = value
+        for i in self._refeed:
+            value = self.defaults[i][2]
+            if isinstance(value, gof.Container):
+                value = value.storage[0]
+            self[i] = value
         #
         # NOTE: This logic needs to be replicated in
         #       scan.
@@ -938,6 +1019,11 @@ class Function(object):
 
         dt_call = time.time() - t0
         self.maker.mode.call_time += dt_call
+        tracer = getattr(self.fn, 'tracer', None)
+        if tracer is not None:
+            name = self.name or 'Function'
+            tracer.record(name, 'call', t0, t0 + dt_call)
+            tracer.record(name, 'vm', t0_fn, t0_fn + dt_fn)
         if profile:
             profile.fct_callcount += 1
             profile.fct_call_time += dt_call
@@ -968,6 +1054,122 @@ class Function(object):
             else:
                 return [outputs[i] for i in output_subset]
 
+    def _swap_tier(self):
+        """
+        Use the graph compiled by the second tier of a TieredMode.
+
+        It was linked on our input storage, so only the maker, the VM and
+        the output storage have to be swapped.
+
+        """
+        with _compile_lock:
+            maker, fn, output_storage = self._next_tier
+            self._next_tier = None
+            self.maker = maker
+            self.fn = fn
+            self.output_storage = output_storage
+            self.nodes_with_inner_function = [
+                node.op for node in maker.fgraph.apply_nodes
+                if node.op in ops_with_inner_function]
+            self._map_fn = None
+
+    def map(self, *args):
+        """
+        Evaluate the function on a batch of inputs.
+
+        Each argument stacks the values of an input along a new leading
+        axis. The result is the same as calling the function on each slice
+        of the arguments and stacking the outputs, but when all the Ops of
+        the graph can be batched (see `theano.tensor.batch`), it is computed
+        by a single call of a batched version of the function. Otherwise
+        the function is called on each slice.
+
+        Parameters
+        ----------
+        args
+            One array for each explicit input of the function, all with the
+            same length.
+
+        Returns
+        -------
+        The outputs, stacked along a new leading axis, returned as by
+        `__call__`.
+
+        """
+        n_inputs = len([c for c in self.input_storage if not c.implicit])
+        if len(args) != n_inputs:
+            raise TypeError("map expects %d arguments, got %d" %
+                            (n_inputs, len(args)))
+        args = [numpy.asarray(a) for a in args]
+        if not args or any(a.ndim == 0 for a in args):
+            raise TypeError("map needs arguments with a leading batch axis")
+        n = len(args[0])
+        if any(len(a) != n for a in args):
+            raise ValueError("The arguments of map must have the same "
+                             "length", [len(a) for a in args])
+
+        if self._map_fn is None:
+            self._map_fn = self._make_map_fn()
+        if self._map_fn is not False:
+            outputs = self._map_fn(*args)
+        else:
+            outputs = None
+            n_outputs = len(self.maker.outputs)
+            for i in xrange(n):
+                outs = self(*[a[i] for a in args])
+                if self.return_none:
+                    outs = []
+                elif self.output_keys is not None:
+                    outs = [outs[k] for k in self.output_keys]
+                elif self.unpack_single and n_outputs == 1:
+                    outs = [outs]
+                if outputs is None:
+                    outputs = [numpy.empty((n,) + numpy.shape(o),
+                                           dtype=numpy.asarray(o).dtype)
+                               for o in outs]
+                for out, o in zip(outputs, outs):
+                    out[i] = o
+            if outputs is None:
+                raise ValueError("map can't call this function on 0 "
+                                 "inputs")
+
+        if self.return_none:
+            return None
+        elif self.output_keys is not None:
+            return dict(izip(self.output_keys, outputs))
+        elif self.unpack_single and len(outputs) == 1:
+            return outputs[0]
+        else:
+            return outputs
+
+    def _make_map_fn(self):
+        """
+        Compile the batched version of the function used by `map`, or
+        return False if the graph can't be batched.
+
+        """
+        from theano.tensor.type import TensorType
+        from theano.tensor.batch import batch_graph
+
+        maker = self.maker
+        inputs = [i.variable for i in maker.inputs if not i.implicit]
+        if (any(i.update is not None for i in maker.expanded_inputs) or
+                not all(type(i.type) is TensorType for i in inputs)):
+            return False
+        batched_inputs = [TensorType(i.type.dtype,
+                                     (False,) + i.type.broadcastable)(i.name)
+                          for i in inputs]
+        try:
+            outputs = batch_graph(inputs, batched_inputs,
+                                  [o.variable for o in maker.outputs])
+        except NotImplementedError as e:
+            _logger.debug('map of %s calls it on each input: %s',
+                          self.name, e)
+            return False
+        return theano.function(batched_inputs, outputs, mode=maker.mode,
+                               on_unused_input='ignore',
+                               no_default_updates=True)
+
     value = property(
         lambda self: self._value,
         None,  # this property itself is not settable
@@ -1213,170 +1415,54 @@ class FunctionMaker(object):
             raise TypeError("Unknown output type: %s (%s)", type(output),
                             output)
 
-    def optimize_graph_with_cache(self, optimizer, inputs, outputs):
-        # This function is not finished
-        from theano.gof.compilelock import get_lock, release_lock
-        import os.path
-
-        graph_db_file = os.path.join(theano.config.compiledir,
-                                     'optimized_graphs.pkl')
-
-        # the inputs, outputs, and size of the graph to be optimized
-        inputs_new = [inp.variable for inp in inputs]
-        outputs_new = [out.variable for out in outputs]
-        size_new = len(self.fgraph.apply_nodes)
-        get_lock()
-        # Beginning of cache optimizations.
-        # Could be refactored in different functions.
-
-        def load_graph_db():
-            if os.path.isfile(graph_db_file):
-                print('graph_db already exists')
-            else:
-                # create graph_db
-                with open(graph_db_file, 'wb') as f:
-                    print('create new graph_db in %s' % graph_db_file)
-            # load the graph_db dictionary
-            try:
-                with open(graph_db_file, 'rb') as f:
-                    # Temporary hack to allow
-                    # theano.scan_module.tests.test_scan.T_Scan to
-                    # finish. Should be changed in definitive version.
-                    tmp = theano.config.unpickle_function
-                    theano.config.unpickle_function = False
-                    graph_db = pickle.load(f)
-                print('graph_db loaded and it is not empty')
-            except EOFError as e:
-                # the file has nothing in it
-                print(e)
-                print('graph_db loaded and it is empty')
-                graph_db = {}
-            finally:
-                theano.config.unpickle_function = tmp
-
-            return graph_db
-
-        def find_same_graph_in_db(graph_db):
-            # If found_graph_in_db is None, then need to optimize.
-            # Otherwise, return the graph found.
-            found_graph_in_db = None
-            # The sole purpose of this loop is to set 'need_optimize' by
-            # going through graph_db, looking for graph that has the same
-            # computation performed.
-            for graph_old, graph_optimized in iteritems(graph_db):
-                inputs_old = graph_old.inputs
-                outputs_old = graph_old.outputs
-                size_old = len(graph_old.apply_nodes)
-                # Some heuristics to check is the same graphs have
-                # already been optimized before.
-                if len(inputs_new) != len(inputs_old):
-                    # If the inputs are of different size,
-                    # two graphs are for sure different
-                    print('need to optimize, because input size is different')
-                    continue
-                elif len(outputs_new) != len(outputs_old):
-                    # If the inputs are of different size,
-                    # two graphs are for sure different
-                    print('need to optimize, because output size is different')
-                    continue
-                elif not all(input_new.type == input_old.type
-                             for input_new, input_old in
-                             zip(inputs_new, inputs_old)):
-                    print('need to optimize, because inputs are of different '
-                          'types')
-                    continue
-                elif not all(output_new.type == output_old.type
-                             for output_new, output_old in
-                             zip(outputs_new, outputs_old)):
-                    print('need to optimize, because outputs are of different '
-                          'types')
-                    continue
-                elif not size_old == size_new:
-                    print('need to optimize, because numbers of nodes in graph'
-                          ' are different')
-                    continue
-                else:
-                    flags = []
-                    for i, (output_new, output_old) in enumerate(
-                            zip(outputs_new, outputs_old)):
-                        print('loop through outputs node for both graphs')
-                        graph_old.variables = set(gof.graph.variables(
-                            graph_old.inputs, graph_old.outputs))
-
-                        # using clone allowed to avoid a lot of errors
-                        # deep copy seemed to had.
-                        f2 = graph_old.clone(check_integrity=False)
-                        t1 = output_new
-                        t2 = f2.outputs[i]
-
-                        # Used to remove "already used by another graph error
-                        def removeAllFgraph(remove):
-                            if hasattr(remove, 'fgraph'):
-                                del remove.fgraph
-                            if hasattr(remove, 'owner'):
-                                if remove.owner is None:
-                                    pass
-                                else:
-                                    if hasattr(remove.owner, 'fgraph'):
-                                        del remove.owner.fgraph
-                                    if hasattr(remove.owner, 'inputs'):
-                                        remove.owner.inputs = [removeAllFgraph(
-                                            i) for i in remove.owner.inputs]
-                                        for o in remove.owner.outputs:
-                                            if hasattr(o, 'fgraph'):
-                                                del o.fgraph
-                            return remove
-
-                        t2 = removeAllFgraph(t2)
-
-                        givens = dict(izip(gof.graph.inputs([t1]),
-                                           gof.graph.inputs([t2])))
-
-                        temp = dict(izip(gof.graph.inputs([t1]),
-                                         gof.graph.inputs([t2])))
-
-                        # hack to remove inconstent entry in givens
-                        # seems to work that but source of inconsistency
-                        # could be worth investigating.
-                        for key, value in iteritems(temp):
-                            if key.type != value.type:
-                                del givens[key]
-
-                        flag = is_same_graph(t1, t2, givens=givens)
-
-                        flags.append(flag)
-
-                    is_same = all(flags)
-                    if is_same:
-                        # found the match
-                        print('found a match, no need to optimize')
-                        found_graph_in_db = graph_optimized
-                        break
-            return found_graph_in_db
-
-        graph_db = load_graph_db()
-        print('loaded graph_db from %s, size=%d' % (graph_db_file,
-                                                    len(graph_db)))
-        found_graph = find_same_graph_in_db(graph_db)
-        if found_graph:
-            self.fgraph = found_graph
-            optimizer_profile = None
-        else:
-            # this is a brand new graph, optimize it, save it to graph_db
-            print('graph not found in graph_db, optimizing the graph')
-            self.fgraph.variables = set(gof.graph.variables(
-                self.fgraph.inputs, self.fgraph.outputs))
-            # check_integrity parameters was added to ignore
-            # "excess cached variables" errors. Works that way
-            # but once again the error couldbe worth
-            # investigating.
-            before_opt = self.fgraph.clone(check_integrity=False)
-            optimizer_profile = optimizer(self.fgraph)
-            graph_db.update({before_opt: self.fgraph})
-            with open(graph_db_file, 'wb') as f:
-                pickle.dump(graph_db, f, -1)
-            print('new graph saved into graph_db')
-        release_lock()
+    def optimize_graph_with_cache(self, optimizer, inputs, outputs, mode,
+                                  accept_inplace):
+        """
+        Optimize `self.fgraph`, or replace it by the optimized graph found
+        in the cache of optimized graphs (see `theano.compile.graph_cache`),
+        or optimized in advance (see `theano.compile.parallel_opt`).
+
+        Returns the profile of the optimizer, or None if the graph was found
+        in the cache.
+
+        """
+        from theano.compile.graph_cache import (get_optimized_graph_cache,
+                                                graph_key)
+        from theano.compile.parallel_opt import pop_optimized_graph
+        cache = get_optimized_graph_cache()
+        key = graph_key(self.fgraph, inputs, mode, accept_inplace)
+        if key is not None:
+            with _compile_lock:
+                found = pop_optimized_graph(key)
+            if found is None and theano.config.cache_optimizations:
+                found = cache.get(key)
+            if (found is not None and
+                    len(found[0]) == len(self.fgraph.inputs) and
+                    len(found[1]) == len(self.fgraph.outputs)):
+                found_inputs, found_outputs = found
+                # Build the FunctionGraph like the one we replace, but
+                # from the optimized variables.
+                found_updates = iter(found_outputs[len(outputs):])
+                input_specs = []
+                for spec, variable in zip(inputs, found_inputs):
+                    spec = copy.copy(spec)
+                    spec.variable = variable
+                    if spec.update:
+                        spec.update = next(found_updates)
+                    input_specs.append(spec)
+                output_specs = [SymbolicOutput(o)
+                                for o in found_outputs[:len(outputs)]]
+                fgraph, _ = std_fgraph(input_specs, output_specs,
+                                       accept_inplace=True)
+                fgraph.profile = self.fgraph.profile
+                self.fgraph = fgraph
+                return None
+        optimizer_profile = optimizer(self.fgraph)
+        if key is not None and theano.config.cache_optimizations:
+            # Store a copy of the variables only, the features of the
+            # FunctionGraph can't be restored from a pickle.
+            cache.add(key, graph.clone(self.fgraph.inputs,
+                                       self.fgraph.outputs))
         return optimizer_profile
 
     def __init__(self, inputs, outputs,
@@ -1447,20 +1533,22 @@ class FunctionMaker(object):
         # Fetch the optimizer and linker
         optimizer, linker = mode.optimizer, copy.copy(mode.linker)
         if need_opt:
-            compute_test_value_orig = theano.config.compute_test_value
-            limit_orig = theano.config.traceback.limit
             # Why we add stack on node when it get done in output var?
-            try:
+            # The flags are only changed in this thread: the second tier of
+            # a TieredMode is compiled while the user keeps building graphs.
+            with local_flags(**{
+                    'compute_test_value': theano.config.compute_test_value_opt,
+                    'traceback.limit': theano.config.traceback.compile_limit}):
                 # optimize the fgraph
-                theano.config.compute_test_value = \
-                    theano.config.compute_test_value_opt
-                theano.config.traceback.limit = theano.config.traceback.compile_limit
                 start_optimizer = time.time()
 
                 # now optimize the graph
-                if theano.config.cache_optimizations:
+                from theano.compile.parallel_opt import has_optimized_graphs
+                if (theano.config.cache_optimizations or
+                        has_optimized_graphs()):
                     optimizer_profile = self.optimize_graph_with_cache(
-                        optimizer, inputs, outputs)
+                        optimizer, inputs, outputs, mode, accept_inplace)
+                    fgraph = self.fgraph
                 else:
                     optimizer_profile = optimizer(fgraph)
 
@@ -1479,9 +1567,6 @@ class FunctionMaker(object):
 
                 # Add deep copy to respect the memory interface
                 insert_deepcopy(fgraph, inputs, outputs + additional_outputs)
-            finally:
-                theano.config.compute_test_value = compute_test_value_orig
-                theano.config.traceback.limit = limit_orig
 
         # initialize the linker
         if not hasattr(linker, 'accept'):
@@ -1641,16 +1726,24 @@ class FunctionMaker(object):
 
             defaults.append((required, refeed, storage))
 
-        # Get a function instance
+        _fn, _i, _o = self._make_thunk(input_storage_lists, storage_map)
+        fn = self.function_builder(_fn, _i, _o, self.indices, self.outputs,
+                                   defaults, self.unpack_single,
+                                   self.return_none, self.output_keys, self)
+        fn.profile = self.profile
+        return fn
+
+    def _make_thunk(self, input_storage_lists, storage_map=None):
+        """
+        Link the optimized graph on the storage of the inputs.
+
+        """
         start_linker = time.time()
         start_import_time = theano.gof.cmodule.import_time
-        limit_orig = theano.config.traceback.limit
-        try:
-            theano.config.traceback.limit = theano.config.traceback.compile_limit
+        with local_flags(**{
+                'traceback.limit': theano.config.traceback.compile_limit}):
             _fn, _i, _o = self.linker.make_thunk(
                 input_storage=input_storage_lists, storage_map=storage_map)
-        finally:
-            theano.config.traceback.limit = limit_orig
 
         end_linker = time.time()
 
@@ -1661,12 +1754,7 @@ class FunctionMaker(object):
             _fn.time_thunks = self.profile.flag_time_thunks
             import_time = theano.gof.cmodule.import_time - start_import_time
             self.profile.import_time += import_time
-
-        fn = self.function_builder(_fn, _i, _o, self.indices, self.outputs,
-                                   defaults, self.unpack_single,
-                                   self.return_none, self.output_keys, self)
-        fn.profile = self.profile
-        return fn
+        return _fn, _i, _o
 
 
 def _pickle_FunctionMaker(self):
@@ -1774,14 +1862,15 @@ def orig_function(inputs, outputs, mode=None, accept_inplace=False,
         raise Exception("We do not support the passing of multiple modes")
     else:
         Maker = getattr(mode, 'function_maker', FunctionMaker)
-        fn = Maker(inputs,
-                   outputs,
-                   mode,
-                   accept_inplace=accept_inplace,
-                   profile=profile,
-                   on_unused_input=on_unused_input,
-                   output_keys=output_keys).create(
-            defaults)
+        maker = Maker(inputs,
+                      outputs,
+                      mode,
+                      accept_inplace=accept_inplace,
+                      profile=profile,
+                      on_unused_input=on_unused_input,
+                      output_keys=output_keys)
+        with _compile_lock:
+            fn = maker.create(defaults)
 
     t2 = time.time()
     if profile:
@@ -1790,9 +1879,47 @@ def orig_function(inputs, outputs, mode=None, accept_inplace=False,
 
     fn.name = name
     fn.maker.fgraph.name = name
+    if isinstance(mode, theano.compile.mode.TieredMode):
+        thread = threading.Thread(
+            target=_compile_next_tier,
+            args=(fn, inputs, outputs, accept_inplace, profile,
+                  on_unused_input, output_keys),
+            name='Theano second tier')
+        thread.daemon = True
+        fn._tier_thread = thread
+        thread.start()
     return fn
 
 
+def _compile_next_tier(fn, inputs, outputs, accept_inplace, profile,
+                       on_unused_input, output_keys):
+    """
+    Compile the second tier of a function compiled with a TieredMode.
+
+    The graph is linked on the input storage of `fn`, which will swap to
+    it at its next call.
+
+    """
+    mode = theano.compile.mode.get_mode(fn.maker.mode.full_mode)
+    try:
+        Maker = getattr(mode, 'function_maker', FunctionMaker)
+        maker = Maker(inputs, outputs, mode,
+                      accept_inplace=accept_inplace, profile=profile,
+                      on_unused_input=on_unused_input,
+                      output_keys=output_keys)
+        with _compile_lock:
+            _fn, _i, _o = maker._make_thunk(
+                [c.storage for c in fn.input_storage])
+    except Exception as e:
+        _logger.warning('Could not compile the second tier of %s, it will '
+                        'keep using the first one: %s',
+                        fn.name or 'a function', e)
+        return
+    maker.fgraph.name = fn.name
+    with _compile_lock:
+        fn._next_tier = (maker, _fn, _o)
+
+
 def convert_function_input(input):
     """
     Upgrade a input shortcut to an In instance.
@@ -0,0 +1,320 @@
+"""
+On-disk cache of optimized graphs.
+
+Optimizing a big graph can take minutes, and the same graphs are often
+compiled again by each new process. When the Theano flag
+``cache_optimizations`` is True, `FunctionMaker` looks up the graph to
+optimize in this cache before running the optimizer.
+
+Each entry is stored in its own file, named after a structural hash of the
+graph to optimize (see `graph_key`), in the 'optimized_graphs' directory of
+the compilation directory. A lookup is thus a single file access. When there
+are more than ``cache_optimizations_max_entries`` entries, the least
+recently used ones are deleted.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import logging
+import os
+import tempfile
+
+import six.moves.cPickle as pickle
+
+import theano
+from theano import config, gof
+from theano.gof.utils import hash_from_code
+
+_logger = logging.getLogger('theano.compile.graph_cache')
+
+
+def _digest(obj):
+    return hash_from_code(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _optdb_names(db):
+    """
+    Return the sorted names of all the optimizations registered in `db` and
+    its sub-databases.
+
+    """
+    names = []
+    for name in sorted(db._names):
+        names.append(name)
+        for obj in db.__db__[name]:
+            if isinstance(obj, gof.optdb.DB):
+                names.extend('%s.%s' % (name, n) for n in _optdb_names(obj))
+    return names
+
+
+def _describe(obj):
+    """
+    Describe an optimizer (or a feature) by its class and its attributes.
+
+    """
+    if not hasattr(obj, '__dict__'):
+        return repr(obj)
+    return (type(obj).__module__, type(obj).__name__,
+            sorted((k, _describe(v)) for k, v in obj.__dict__.items()
+                   if k not in ('name', '_optimizer_idx')))
+
+
+def optimizer_key(mode):
+    """
+    Return a string identifying the optimizations that `mode` will apply.
+
+    This covers the optimizer (or query) of the mode, the optimizations
+    registered in `optdb`, the Theano version and the Theano flags.
+
+    """
+    from theano.compile.mode import optdb
+    flags = sorted((cv.fullname, str(cv.__get__(True, None)))
+                   for cv in theano.configparser._config_var_list)
+    optimizer = mode.provided_optimizer
+    if isinstance(optimizer, gof.Query):
+        # The string of a query shows the address of its extra
+        # optimizations, and registering them gives them a name and an
+        # index that change each time they are created: describe them by
+        # their class and their other attributes instead.
+        extra = [(_describe(opt), position)
+                 for opt, position in optimizer.extra_optimizations]
+        optimizer = (sorted(optimizer.include), sorted(optimizer.require),
+                     sorted(optimizer.exclude), sorted(optimizer.subquery),
+                     optimizer.position_cutoff, extra)
+    else:
+        optimizer = str(optimizer)
+    return _digest((theano.__version__, optimizer, _optdb_names(optdb),
+                    flags))
+
+
+def _inner_graph(op):
+    """
+    Return the inner graph of `op` as a tuple (inputs, outputs, other
+    attributes), or None if `op` has no inner graph.
+
+    The pickle of these Ops contains the structural hash of their inner
+    graph and the auto names of its variables, which are not stable across
+    processes.
+
+    """
+    from theano.compile.builders import OpFromGraph
+    from theano.scan_module.scan_op import Scan
+    if isinstance(op, OpFromGraph):
+        return op.new_inputs, op.new_outputs, (op.input_types, op.kwargs)
+    if isinstance(op, Scan):
+        info = sorted((k, v) for k, v in op.info.items() if k != 'gpu_hash')
+        return op.inputs, op.outputs, info
+    return None
+
+
+def graph_key(fgraph, input_specs, mode, accept_inplace=False):
+    """
+    Return a structural hash of `fgraph`, before its optimization by `mode`.
+
+    The hash of each variable is computed from the Op and the hashes of the
+    inputs of its owner, from its type and, for constants, from their data.
+    It thus does not depend on the order in which the graph was built, nor
+    on the identity or names of its variables. As the hash must be stable
+    across processes, Ops, types and constants are hashed through their
+    pickle, not with `hash`, and the inner graphs of Scan and OpFromGraph
+    are hashed like `fgraph`.
+
+    Returns
+    -------
+    str or None
+        The hash, or None if some part of the graph can't be pickled.
+
+    """
+    obj_digests = {}
+
+    def obj_digest(obj):
+        if obj not in obj_digests:
+            inner = _inner_graph(obj)
+            if inner is None:
+                obj_digests[obj] = _digest(obj)
+            else:
+                inputs, outputs, other = inner
+                input_digests = [_digest(('input', i, obj_digest(var.type)))
+                                 for i, var in enumerate(inputs)]
+                obj_digests[obj] = _digest((
+                    type(obj).__module__, type(obj).__name__,
+                    graph_digests(inputs, input_digests, outputs),
+                    _digest(other)))
+        return obj_digests[obj]
+
+    def graph_digests(inputs, input_digests, outputs):
+        # Return the digests of `outputs`.
+        var_digests = dict(zip(inputs, input_digests))
+
+        def leaf_digest(var):
+            if var not in var_digests:
+                if not isinstance(var, gof.Constant):
+                    raise ValueError('Missing input', var)
+                var_digests[var] = _digest(('constant', obj_digest(var.type),
+                                            var.data))
+            return var_digests[var]
+
+        for node in gof.graph.io_toposort(inputs, outputs):
+            node_digest = _digest((obj_digest(node.op),
+                                   [leaf_digest(v) for v in node.inputs]))
+            for i, var in enumerate(node.outputs):
+                var_digests[var] = _digest((node_digest, i,
+                                            obj_digest(var.type)))
+        return [leaf_digest(v) for v in outputs]
+
+    try:
+        input_digests = [_digest(('input', i, obj_digest(var.type),
+                                  bool(spec.mutable)))
+                         for i, (var, spec) in enumerate(zip(fgraph.inputs,
+                                                             input_specs))]
+        return _digest((graph_digests(fgraph.inputs, input_digests,
+                                      fgraph.outputs),
+                        bool(accept_inplace), optimizer_key(mode)))
+    except Exception as e:
+        # Pickling can fail in many ways, we just don't use the cache then.
+        _logger.debug('Could not hash the graph: %s', e)
+        return None
+
+
+class OptimizedGraphCache(object):
+    """
+    Interface to the directory of optimized graphs.
+
+    Several processes can use the same directory: entries are written to a
+    temporary file, then renamed, so no lock is needed.
+
+    Parameters
+    ----------
+    dirname : str
+        The directory where the entries are stored.
+    max_entries : int
+        The maximal number of entries. Defaults to the Theano flag
+        ``cache_optimizations_max_entries``.
+
+    """
+
+    def __init__(self, dirname, max_entries=None):
+        self.dirname = dirname
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.dirname, key + '.pkl')
+
+    def get(self, key):
+        """
+        Return the optimized graph stored for `key`, or None.
+
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        except Exception as e:
+            _logger.warning('Removing broken optimized graph %s: %s',
+                            path, e)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.misses += 1
+            return None
+        # Mark the entry as recently used.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def add(self, key, entry):
+        """
+        Store the optimized graph `entry` for `key`.
+
+        This can be any picklable object, `FunctionMaker` stores the inputs
+        and outputs of the optimized FunctionGraph.
+
+        Returns
+        -------
+        bool
+            Whether the graph could be stored.
+
+        """
+        if not os.path.isdir(self.dirname):
+            try:
+                os.makedirs(self.dirname)
+            except OSError:
+                # Someone else was probably creating it at the same time.
+                if not os.path.isdir(self.dirname):
+                    raise
+        fd, tmp_path = tempfile.mkstemp(dir=self.dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self._entry_path(key))
+        except Exception as e:
+            _logger.debug('Could not store the optimized graph: %s', e)
+            os.remove(tmp_path)
+            return False
+        self.clear_old()
+        return True
+
+    def clear_old(self):
+        """
+        Delete the least recently used entries over the maximal number.
+
+        """
+        max_entries = self.max_entries
+        if max_entries is None:
+            max_entries = config.cache_optimizations_max_entries
+        entries = []
+        for filename in os.listdir(self.dirname):
+            if filename.endswith('.pkl'):
+                path = os.path.join(self.dirname, filename)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    # Deleted by another process.
+                    pass
+        if len(entries) <= max_entries:
+            return
+        entries.sort()
+        for mtime, path in entries[:len(entries) - max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """
+        Delete all the entries.
+
+        """
+        if not os.path.isdir(self.dirname):
+            return
+        for filename in os.listdir(self.dirname):
+            try:
+                os.remove(os.path.join(self.dirname, filename))
+            except OSError:
+                pass
+
+
+_optimized_graph_cache = None
+
+
+def get_optimized_graph_cache():
+    """
+    Return the cache of optimized graphs of the current compilation
+    directory.
+
+    """
+    global _optimized_graph_cache
+    dirname = os.path.join(config.compiledir, 'optimized_graphs')
+    if (_optimized_graph_cache is None or
+            _optimized_graph_cache.dirname != dirname):
+        _optimized_graph_cache = OptimizedGraphCache(dirname)
+    return _optimized_graph_cache
@@ -353,6 +353,59 @@ class Mode(object):
         return new_mode
 
 
+class TieredMode(Mode):
+    """
+    A Mode that compiles functions in two tiers.
+
+    A function is first compiled with the linker and optimizer of this
+    mode, which by default do as little work as `FAST_COMPILE`, so that it
+    can be called right away. Meanwhile, it is compiled again with
+    `full_mode` in a background thread. Once that is done, the next call
+    of the function uses the new version. Both versions share the storage
+    of the inputs, so the shared variables and the values given to the
+    function are the same for both.
+
+    The compilations of all the functions of a process are serialized: a
+    function compiled while the second tier of another one is being
+    compiled waits for it to finish.
+
+    Parameters
+    ----------
+    linker, optimizer
+        The linker and optimizer of the first tier.
+    full_mode : Mode or str
+        The mode of the second tier. Defaults to `FAST_RUN`.
+
+    """
+
+    def __init__(self, linker=None, optimizer='fast_compile',
+                 full_mode='FAST_RUN'):
+        if linker is None:
+            linker = theano.gof.vm.VM_Linker(use_cloop=False, c_thunks=False)
+        self.full_mode = full_mode
+        super(TieredMode, self).__init__(linker, optimizer)
+
+    def __getstate__(self):
+        return (self.provided_linker, self.provided_optimizer,
+                self.full_mode)
+
+    def __setstate__(self, state):
+        linker, optimizer, full_mode = state
+        self.full_mode = full_mode
+        Mode.__setstate__(self, (linker, optimizer))
+
+    def __str__(self):
+        return "%s(linker = %s, optimizer = %s, full_mode = %s)" % (
+            self.__class__.__name__, self.provided_linker,
+            self.provided_optimizer, self.full_mode)
+
+    def clone(self, link_kwargs=None, optimizer="", **kwargs):
+        new_mode = super(TieredMode, self).clone(link_kwargs, optimizer,
+                                                 **kwargs)
+        new_mode.full_mode = self.full_mode
+        return new_mode
+
+
 # If a string is passed as the mode argument in function or
 # FunctionMaker, the Mode will be taken from this dictionary using the
 # string as the key
@@ -364,8 +417,10 @@ if theano.config.cxx:
 else:
     FAST_RUN = Mode('vm', 'fast_run')
 
+
 predefined_modes = {'FAST_COMPILE': FAST_COMPILE,
                     'FAST_RUN': FAST_RUN,
+                    'TIERED': TieredMode(),
                     }
 
 instantiated_default_mode = None
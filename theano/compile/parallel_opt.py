@@ -0,0 +1,204 @@
+"""
+Optimize the inner graphs of a function in a process pool.
+
+Ops like `Scan` and `OpFromGraph` compile a Theano function for their inner
+graph when their thunk is made, so the inner graphs of a function are
+optimized one after the other. When the Theano flag
+``compile.inner_graph_workers`` is greater than 1, the linkers first call
+`optimize_inner_graphs` on the nodes of the function: the inner graphs that
+still have to be compiled are pickled and optimized concurrently in worker
+processes. The optimized graphs are kept, by their structural hash (see
+`theano.compile.graph_cache.graph_key`), until `FunctionMaker` compiles the
+inner function and uses them instead of optimizing the graph again. The
+linkers make the thunks of the nodes inside `optimized_inner_graphs`, which
+drops the graphs that were not used once the thunks are made.
+
+An Op takes part in this by defining a method ``inner_function_args()``
+that returns the arguments with which it will call ``theano.function`` (or
+``orig_function``) for its inner graph, as a tuple ``(inputs, outputs,
+kwargs)``, or None if the inner function is already compiled.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import contextlib
+import logging
+import multiprocessing
+from collections import OrderedDict
+
+import six.moves.cPickle as pickle
+
+import theano
+from theano import config, gof
+from theano.configparser import change_flags, local_flags
+
+_logger = logging.getLogger('theano.compile.parallel_opt')
+
+# graph key -> [optimized graph, number of functions that will use it]
+_optimized_graphs = {}
+
+# True in the worker processes, they can't start a pool of their own.
+_in_worker = False
+
+
+def has_optimized_graphs():
+    return bool(_optimized_graphs)
+
+
+def pop_optimized_graph(key):
+    """
+    Return the graph optimized in advance for `key`, or None.
+
+    The graph is returned as the inputs and outputs of the optimized
+    FunctionGraph, like the entries of the cache of optimized graphs.
+
+    """
+    found = _optimized_graphs.get(key)
+    if found is None:
+        return None
+    found[1] -= 1
+    if not found[1]:
+        del _optimized_graphs[key]
+    return found[0]
+
+
+def _optimize_graph(job):
+    """
+    Optimize the graph of a pickled job, in a worker process.
+
+    Returns the pickled inputs and outputs of the optimized graph, or None
+    if the optimization failed.
+
+    """
+    global _in_worker
+    _in_worker = True
+    from theano.compile.function_module import std_fgraph
+    try:
+        input_specs, output_specs, mode, accept_inplace = pickle.loads(job)
+        fgraph, _ = std_fgraph(input_specs, output_specs, accept_inplace)
+        with change_flags(**{
+                'compute_test_value': config.compute_test_value_opt,
+                'traceback.limit': config.traceback.compile_limit}):
+            mode.optimizer(fgraph)
+        return pickle.dumps(gof.graph.clone(fgraph.inputs, fgraph.outputs),
+                            protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        _logger.debug('Could not optimize an inner graph: %s', e)
+        return None
+
+
+def optimize_inner_graphs(nodes, n_workers=None, keys=None):
+    """
+    Optimize concurrently the inner graphs of `nodes` that are not compiled.
+
+    The following compilations of these inner graphs will use the optimized
+    graphs. The graphs that can't be pickled or optimized in a worker are
+    simply skipped: they will be optimized as usual.
+
+    Parameters
+    ----------
+    nodes
+        The Apply nodes of a function.
+    n_workers : int
+        Number of worker processes. Defaults to the Theano flag
+        ``compile.inner_graph_workers``.
+    keys : list
+        If given, the keys of the optimized graphs that the inner functions
+        of `nodes` will use are appended to it.
+
+    Returns
+    -------
+    int
+        The number of graphs that were optimized.
+
+    """
+    if n_workers is None:
+        n_workers = config.compile.inner_graph_workers
+    if n_workers <= 1 or _in_worker:
+        return 0
+    from theano.compile.function_module import FunctionMaker, std_fgraph
+    from theano.compile.graph_cache import graph_key
+
+    # graph key -> pickled job
+    jobs = OrderedDict()
+    used_keys = []
+    seen_ops = set()
+    for node in nodes:
+        op = node.op
+        if not hasattr(op, 'inner_function_args') or id(op) in seen_ops:
+            continue
+        seen_ops.add(id(op))
+        args = op.inner_function_args()
+        if args is None:
+            continue
+        inputs, outputs, kwargs = args
+        mode = theano.compile.mode.get_mode(kwargs.get('mode'))
+        accept_inplace = kwargs.get('accept_inplace', False)
+        try:
+            input_specs = [FunctionMaker.wrap_in(i) for i in inputs]
+            output_specs = [FunctionMaker.wrap_out(o) for o in outputs]
+            fgraph, _ = std_fgraph(input_specs, output_specs, accept_inplace)
+            # The flags are part of the key, set them like FunctionMaker
+            # does when it optimizes the graph.
+            with local_flags(**{
+                    'compute_test_value': config.compute_test_value_opt,
+                    'traceback.limit': config.traceback.compile_limit}):
+                key = graph_key(fgraph, input_specs, mode, accept_inplace)
+            if key is None:
+                continue
+            used_keys.append(key)
+            if key in jobs or key in _optimized_graphs:
+                continue
+            jobs[key] = pickle.dumps(
+                (input_specs, output_specs, mode, accept_inplace),
+                protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            _logger.debug('Could not pickle an inner graph: %s', e)
+    n_optimized = 0
+    if len(jobs) > 1:
+        pool = multiprocessing.Pool(min(n_workers, len(jobs)))
+        try:
+            results = pool.map(_optimize_graph, list(jobs.values()))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        # Not worth starting the processes.
+        results = [None] * len(jobs)
+
+    for key, result in zip(jobs, results):
+        if result is None:
+            continue
+        try:
+            _optimized_graphs[key] = [pickle.loads(result), 0]
+        except Exception as e:
+            _logger.debug('Could not unpickle an inner graph: %s', e)
+            continue
+        n_optimized += 1
+    for key in used_keys:
+        if key in _optimized_graphs:
+            _optimized_graphs[key][1] += 1
+            if keys is not None:
+                keys.append(key)
+    return n_optimized
+
+
+@contextlib.contextmanager
+def optimized_inner_graphs(nodes):
+    """
+    Call `optimize_inner_graphs` on `nodes`, and drop the graphs it optimized
+    for them on exit.
+
+    The thunks of `nodes` are expected to be made inside the context. A
+    graph is left unused when its inner function is not compiled with the
+    same key, or when making a thunk fails, and `FunctionMaker` would
+    otherwise keep looking for the optimized graphs of every function.
+
+    """
+    keys = []
+    optimize_inner_graphs(nodes, keys=keys)
+    try:
+        yield
+    finally:
+        for key in keys:
+            _optimized_graphs.pop(key, None)
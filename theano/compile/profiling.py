@@ -21,6 +21,7 @@ __docformat__ = "restructuredtext en"
 
 import atexit
 import copy
+import json
 import operator
 import os
 import sys
@@ -32,6 +33,7 @@ import numpy
 import theano
 from six import iteritems
 from theano.gof import graph
+from theano.gof.opt import sub_profile_to_dict
 
 logger = logging.getLogger('theano.compile.profiling')
 
@@ -108,6 +110,83 @@ def _atexit_print_fn():
                     n_ops_to_print=config.profiling.n_ops,
                     n_apply_to_print=config.profiling.n_apply)
 
+    if config.profiling.compile_report:
+        with open(config.profiling.compile_report, 'w') as f:
+            json.dump([ps.compile_report() for ps in _atexit_print_list], f,
+                      indent=1, sort_keys=True)
+
+
+def _flatten_compile_report(report):
+    """
+    Return {path: {metric: value}} for a report of `compile_report`.
+
+    The path of an optimizer is made of its name and the names of the
+    optimizers that contain it, so that the same optimizer can be found in
+    two reports.
+
+    """
+    def add(rows, path, d):
+        metrics = rows.setdefault(path, {})
+        for k, v in iteritems(d):
+            if (isinstance(v, (int, float)) and not isinstance(v, bool)):
+                metrics[k] = metrics.get(k, 0) + v
+
+    def add_optimizer(rows, path, d):
+        add(rows, path, d)
+        # The profiles of the optimizers only add the metrics that their
+        # entry in the profile of the parent optimizer doesn't have. The
+        # profiles of the same optimizer are summed first, as there is one
+        # for each pass of an EquilibriumOptimizer.
+        sub_rows = {}
+        for key in ['optimizers', 'local_optimizers']:
+            for o in d.get(key, []):
+                sub_path = path + '/' + o['name']
+                add(rows, sub_path, o)
+                if o.get('profile'):
+                    add_optimizer(sub_rows, sub_path, o['profile'])
+        for o in d.get('sub_profiles', []):
+            add_optimizer(sub_rows, path + '/' + o['name'], o['profile'])
+        for sub_path, metrics in iteritems(sub_rows):
+            for k, v in iteritems(metrics):
+                rows.setdefault(sub_path, {}).setdefault(k, v)
+
+    rows = {}
+    add(rows, 'function', report)
+    for node, t in report['linker_make_thunk_time']:
+        add(rows, 'linker/' + node, {'time': t})
+    if report['optimizer']:
+        add_optimizer(rows, 'optimizer', report['optimizer'])
+    return rows
+
+
+def diff_compile_reports(report1, report2):
+    """
+    Compare two reports of `ProfileStats.compile_report`.
+
+    Returns
+    -------
+    list
+        The (path, metric, value in report1, value in report2) tuples of
+        the metrics that differ: the times first, then the counts, the
+        biggest differences first. A value is None when the optimizer or
+        the metric is missing from a report.
+
+    """
+    rows1 = _flatten_compile_report(report1)
+    rows2 = _flatten_compile_report(report2)
+    diff = []
+    for path in set(rows1) | set(rows2):
+        metrics1 = rows1.get(path, {})
+        metrics2 = rows2.get(path, {})
+        for metric in set(metrics1) | set(metrics2):
+            v1 = metrics1.get(metric)
+            v2 = metrics2.get(metric)
+            if v1 != v2:
+                diff.append((path, metric, v1, v2))
+    diff.sort(key=lambda d: (not d[1].endswith('time'),
+                             -abs((d[3] or 0) - (d[2] or 0)), d[0], d[1]))
+    return diff
+
 
 class ProfileStats(object):
 
@@ -700,6 +779,35 @@ class ProfileStats(object):
         if self.optimizer_time > 0:
             assert self.validate_time < self.optimizer_time
 
+    def compile_report(self):
+        """
+        Return the compilation profile as a dict that can be saved as JSON.
+
+        It holds the optimizer and linker times of the function and, when
+        the Theano flag profile_optimizer is True, the profile of each
+        optimizer (see `Optimizer.profile_to_dict`). Two reports can be
+        compared with `diff_compile_reports`.
+
+        """
+        if self.optimizer_profile:
+            optimizer = sub_profile_to_dict(*self.optimizer_profile)
+        else:
+            optimizer = None
+        return {'message': (None if self.message is None
+                            else str(self.message)),
+                'compile_time': self.compile_time,
+                'nb_nodes': self.nb_nodes,
+                'optimizer_time': self.optimizer_time,
+                'validate_time': self.validate_time,
+                'linker_time': self.linker_time,
+                'import_time': self.import_time,
+                'linker_node_make_thunks': self.linker_node_make_thunks,
+                'linker_make_thunk_time': sorted(
+                    [[str(node), t] for node, t in
+                     iteritems(self.linker_make_thunk_time)],
+                    key=lambda nt: (-nt[1], nt[0])),
+                'optimizer': optimizer}
+
     def summary_globals(self, file):
         print('Time in all call to theano.grad() %es' %
               theano.gradient.grad_time, file=file)
@@ -747,6 +855,8 @@ class ProfileStats(object):
         # track min peak memory usage
         min_max_peak = 0
         min_peak_time = 0
+        # peak memory usage with the order of the memory scheduler
+        mem_schedule_peak = 0
 
         def count_running_memory(order, fgraph, nodes_mem, ignore_dmap=False):
             """
@@ -1136,6 +1246,14 @@ class ProfileStats(object):
 
                 stats[i] = compute_max_stats(running_memory, stats[i])
 
+            # The order vm.schedule=memory would use with the measured sizes
+            mem_order = theano.gof.sched.memory_schedule(
+                fgraph, size=lambda fgraph, var: var_mem.get(var, 0))
+            running_memory = count_running_memory(mem_order, fgraph,
+                                                  nodes_mem)
+            mem_schedule_peak = max(mem_schedule_peak,
+                                    sum(running_memory[2]))
+
             # Config: whether print min memory peak
             if config.profiling.min_peak_memory:
                 node_list = fgraph.apply_nodes
@@ -1184,6 +1302,8 @@ class ProfileStats(object):
             new_max_node_memory_size[2] / 1024.)), file=file)
         print("        CPU + GPU: %dKB" % int(round(
             new_max_node_memory_size[0] / 1024.)), file=file)
+        print("    Max peak memory with the Theano flag vm.schedule=memory"
+              " is %dKB" % int(round(mem_schedule_peak / 1024.)), file=file)
         print("---", file=file)
 
         if min_max_peak:
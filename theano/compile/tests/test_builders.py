@@ -1,6 +1,8 @@
 from __future__ import absolute_import, print_function, division
 import numpy
 
+import six.moves.cPickle as pickle
+
 from theano import config, shared
 
 from theano.compile import function
@@ -32,6 +34,32 @@ class T_OpFromGraph(unittest_tools.InferShapeTester):
         assert numpy.all(8.0 == fn(xv, yv, zv))
         assert numpy.all(8.0 == fn(xv, yv, zv))
 
+    def test_merge(self):
+        x, y, z = T.matrices('xyz')
+        op1 = OpFromGraph([x, y, z], [x + y * z])
+        a, b, c = T.matrices('abc')
+        op2 = OpFromGraph([a, b, c], [a + b * c])
+        op3 = OpFromGraph([a, b, c], [a * b + c])
+        assert op1 == op2
+        assert hash(op1) == hash(op2)
+        assert op1 != op3
+
+        f = op1(x, y, z) * op2(x, y, z) + op3(x, y, z)
+        fn = function([x, y, z], f)
+        topo = fn.maker.fgraph.toposort()
+        assert len([n for n in topo
+                    if isinstance(n.op, OpFromGraph)]) == 2
+
+    def test_pickle_hash(self):
+        x, y, z = T.matrices('xyz')
+        op = OpFromGraph([x, y, z], [x + y * z])
+        # Simulate a hash computed by another process.
+        op._hash_inner_graph += 1
+        op2 = pickle.loads(pickle.dumps(op, protocol=-1))
+        op._hash_inner_graph -= 1
+        assert op2 == op
+        assert hash(op2) == hash(op)
+
     def test_size_changes(self):
         x, y, z = T.matrices('xyz')
         e = T.dot(x, y)
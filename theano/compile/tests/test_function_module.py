@@ -558,6 +558,45 @@ class T_function(unittest.TestCase):
         y = x * 2
         self.assertRaises(RuntimeError, function, [x], y, givens={x: x + 1})
 
+    def test_fast_call(self):
+        x = T.vector('x')
+        r = T.row('r')
+        s = theano.shared(numpy.ones(2, dtype=config.floatX))
+        f = function([x, r], x + r + s)
+        assert f._fast_checks is not None
+        xv = numpy.ones(2, dtype=config.floatX)
+        rv = numpy.ones((1, 2), dtype=config.floatX)
+        assert f._fast_filter([xv, rv])
+        assert numpy.all(f(xv, rv) == 3)
+        # The other arguments take the usual path.
+        assert not f._fast_filter([[1, 1], rv])
+        assert numpy.all(f([1, 1], rv) == 3)
+        assert numpy.all(f(xv, r=rv) == 3)
+        assert not f._fast_filter([numpy.ones(2, dtype='int8'), rv])
+        assert numpy.all(f(numpy.ones(2, dtype='int8'), rv) == 3)
+        assert not f._fast_filter([xv, rv.T])
+        self.assertRaises(TypeError, f, xv, rv.T)
+        self.assertRaises(TypeError, f, xv.reshape(1, 2), rv)
+        self.assertRaises(TypeError, f, xv)
+
+        # No fast path with optional explicit inputs.
+        y = T.vector('y')
+        f = function([x, In(y, value=xv)], x + y)
+        assert f._fast_checks is None
+        assert numpy.all(f(xv) == 2)
+
+    def test_aliased_inputs(self):
+        # Aliased inputs are copied when an input can be destroyed.
+        x = T.vector('x')
+        y = T.vector('y')
+        f = function([In(x, mutable=True), y], [x + y, (x * 2).sum()],
+                     mode=theano.compile.get_default_mode().including(
+                         'inplace'))
+        xv = numpy.ones(3, dtype=config.floatX)
+        out, total = f(xv, xv)
+        assert numpy.all(out == 2)
+        assert total == 6
+
     def test_free(self):
         """
         Make test on free() function
@@ -1,6 +1,8 @@
 from __future__ import absolute_import, print_function, division
+import numpy as np
+
 import theano
-from theano.compile.mode import Mode, AddFeatureOptimizer
+from theano.compile.mode import Mode, AddFeatureOptimizer, TieredMode
 from theano.gof.toolbox import NoOutputFromInplace
 import theano.tensor as T
 
@@ -31,3 +33,35 @@ def test_no_output_from_implace():
 def test_including():
     mode = theano.Mode(optimizer='merge')
     mode.including('fast_compile')
+
+
+def test_tiered_mode():
+    x = T.vector('x')
+    c = T.scalar('c')
+    w = theano.shared(np.ones(3, dtype=x.dtype), 'w')
+    s = theano.shared(np.asarray(0, dtype=x.dtype), 's')
+    f = theano.function([x, theano.In(c, value=2)],
+                        (T.exp(x) * w).sum() + s + c, updates={s: s + 1},
+                        mode='TIERED')
+    assert isinstance(f.maker.mode, TieredMode)
+    xv = np.ones(3, dtype=x.dtype)
+    e = 3 * np.exp(1)
+    assert np.allclose(f(xv), e + 2)
+    f._tier_thread.join()
+    assert f._next_tier is not None
+    fast_fn = f.fn
+    # The shared variables and the inputs are shared between the tiers.
+    w.set_value(2 * w.get_value())
+    assert np.allclose(f(xv), 2 * e + 3)
+    assert f.fn is not fast_fn
+    assert f._next_tier is None
+    assert f.maker.mode is theano.compile.mode.get_mode('FAST_RUN')
+    assert np.allclose(f(xv, 1), 2 * e + 3)
+    assert np.allclose(f(xv), 2 * e + 5)
+    assert s.get_value() == 4
+
+
+def test_tiered_mode_clone():
+    mode = TieredMode(full_mode='FAST_COMPILE').excluding('fusion')
+    assert isinstance(mode, TieredMode)
+    assert mode.full_mode == 'FAST_COMPILE'
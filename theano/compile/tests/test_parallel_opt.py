@@ -0,0 +1,88 @@
+from __future__ import absolute_import, print_function, division
+import numpy as np
+
+import theano
+from theano import tensor as T
+from theano.compile import parallel_opt
+from theano.compile.builders import OpFromGraph
+from theano.configparser import change_flags
+from theano.tests import unittest_tools as utt
+
+
+class CountHits(object):
+    """Count the graphs optimized in advance that functions use."""
+
+    def __enter__(self):
+        self.hits = 0
+        self.pop_optimized_graph = parallel_opt.pop_optimized_graph
+
+        def pop_optimized_graph(key):
+            found = self.pop_optimized_graph(key)
+            if found is not None:
+                self.hits += 1
+            return found
+        parallel_opt.pop_optimized_graph = pop_optimized_graph
+        return self
+
+    def __exit__(self, *exc_info):
+        parallel_opt.pop_optimized_graph = self.pop_optimized_graph
+
+
+def test_optimize_inner_graphs():
+    x, y = T.matrices('xy')
+    ops = [OpFromGraph([x, y], [T.exp(x) * y + i]) for i in range(3)]
+    # The same op twice: its graph is only optimized once.
+    out = ops[0](x, y) + ops[0](y, x) + ops[1](x, y) * ops[2](y, x)
+    nodes = theano.gof.FunctionGraph([x, y], [out]).toposort()
+    assert parallel_opt.optimize_inner_graphs(nodes, n_workers=1) == 0
+    assert not parallel_opt.has_optimized_graphs()
+
+    with change_flags(**{'compile.inner_graph_workers': 2}):
+        with CountHits() as counter:
+            f = theano.function([x, y], out)
+    # All the optimized graphs were used by the inner functions.
+    assert counter.hits == len(ops)
+    assert all(hasattr(op, "fn") for op in ops)
+
+    rng = np.random.RandomState(utt.fetch_seed())
+    xv, yv = [rng.rand(2, 3).astype(x.dtype) for i in range(2)]
+    g = theano.function([x, y], out)
+    utt.assert_allclose(f(xv, yv), g(xv, yv))
+
+
+def test_scan_inner_graphs():
+    x = T.matrix('x')
+    h = x
+    for i in range(3):
+        h, _ = theano.scan(lambda xt, hp: T.tanh(xt + hp * (i + 2)),
+                           sequences=h, outputs_info=T.zeros_like(h[0]))
+    cost = h.sum()
+    outputs = [cost, T.grad(cost, x)]
+    with change_flags(**{'compile.inner_graph_workers': 2}):
+        with CountHits() as counter:
+            f = theano.function([x], outputs)
+    scans = set(node.op for node in f.maker.fgraph.toposort()
+                if isinstance(node.op, theano.scan_module.scan_op.Scan))
+    assert len(scans) > 1
+    assert counter.hits == len(scans)
+    g = theano.function([x], outputs)
+    xv = np.random.RandomState(utt.fetch_seed()).rand(4, 3).astype(x.dtype)
+    for r, e in zip(f(xv), g(xv)):
+        utt.assert_allclose(r, e)
+
+
+def test_unused_graphs_are_dropped():
+    # The graphs optimized for inner functions that are never compiled
+    # don't stay around once the thunks are made, even if that fails.
+    x, y = T.matrices('xy')
+    ops = [OpFromGraph([x, y], [T.exp(x) * y + i]) for i in range(2)]
+    out = ops[0](x, y) + ops[1](y, x)
+    nodes = theano.gof.FunctionGraph([x, y], [out]).toposort()
+    with change_flags(**{'compile.inner_graph_workers': 2}):
+        try:
+            with parallel_opt.optimized_inner_graphs(nodes):
+                assert parallel_opt.has_optimized_graphs()
+                raise ValueError()
+        except ValueError:
+            pass
+    assert not parallel_opt.has_optimized_graphs()
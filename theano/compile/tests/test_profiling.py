@@ -4,6 +4,8 @@ Test of memory profiling
 """
 from __future__ import absolute_import, print_function, division
 
+import copy
+import json
 import unittest
 
 import numpy
@@ -11,6 +13,8 @@ import numpy
 import theano
 from six.moves import StringIO
 import theano.tensor as T
+from theano.compile.profiling import diff_compile_reports
+from theano.configparser import change_flags
 from theano.ifelse import ifelse
 
 
@@ -61,6 +65,7 @@ class Test_profiling(unittest.TestCase):
                 assert "CPU: 8208KB" in the_string, (lines1, lines2)
                 assert "Minimum peak from all valid apply node order is 4104KB" in the_string, (
                     lines1, lines2)
+                assert "vm.schedule=memory is 4112KB" in the_string
             else:
                 assert "CPU: 16KB (16KB)" in the_string, (lines1, lines2)
                 assert "GPU: 8204KB (8204KB)" in the_string, (lines1, lines2)
@@ -108,6 +113,36 @@ class Test_profiling(unittest.TestCase):
             theano.config.profile = config1
             theano.config.profile_memory = config2
 
+    def test_compile_report(self):
+        x = T.matrix('x')
+        y = T.tanh(T.dot(x, x) * 2 + T.exp(x)).sum()
+
+        p = theano.ProfileStats(False)
+        with change_flags(profile_optimizer=True):
+            theano.function([x], [y, T.grad(y, x)], profile=p,
+                            mode=theano.compile.mode.get_mode('FAST_RUN'))
+        report = json.loads(json.dumps(p.compile_report()))
+        assert report['nb_nodes'] > 0
+        assert report['linker_time'] > 0
+        opt = report['optimizer']
+        assert opt['class'] == 'SeqOptimizer'
+        names = [o['name'] for o in opt['optimizers']]
+        assert 'canonicalize' in names
+        canonicalize = opt['optimizers'][names.index('canonicalize')]
+        assert canonicalize['profile']['class'] == 'EquilibriumOptimizer'
+        assert any(o['applied'] > 0
+                   for o in canonicalize['profile']['optimizers'])
+
+        assert diff_compile_reports(report, report) == []
+        report2 = copy.deepcopy(report)
+        report2['linker_time'] += 1
+        report2['optimizer']['optimizers'].pop(names.index('canonicalize'))
+        diff = diff_compile_reports(report, report2)
+        assert diff[0] == ('function', 'linker_time', report['linker_time'],
+                           report['linker_time'] + 1)
+        assert ('optimizer/canonicalize', 'time', canonicalize['time'],
+                None) in diff
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -407,7 +407,7 @@ AddConfigVar(
     "Default compilation mode",
     EnumStr('Mode', 'DebugMode', 'FAST_RUN',
             'NanGuardMode',
-            'FAST_COMPILE', 'DEBUG_MODE'),
+            'FAST_COMPILE', 'DEBUG_MODE', 'TIERED'),
     in_c_key=False)
 
 param = "g++"
@@ -903,14 +903,20 @@ AddConfigVar(
 
 AddConfigVar(
     'cache_optimizations',
-    "WARNING: work in progress, does not work yet. "
-    "Specify if the optimization cache should be used. This cache will "
-    "any optimized graph and its optimization. Actually slow downs a lot "
-    "the first optimization, and could possibly still contains some bugs. "
-    "Use at your own risks.",
+    "Specify if the optimization cache should be used. This cache stores "
+    "on disk each optimized graph, keyed by a structural hash of the graph "
+    "before optimization, the optimizer and the Theano flags, so that "
+    "compiling the same graph again skips the optimization.",
     BoolParam(False),
     in_c_key=False)
 
+AddConfigVar(
+    'cache_optimizations_max_entries',
+    "Maximal number of graphs in the optimization cache. The least "
+    "recently used graphs are deleted first.",
+    IntParam(1000, lambda i: i > 0),
+    in_c_key=False)
+
 
 def good_seed_param(seed):
     if seed == "random":
@@ -1070,6 +1076,14 @@ AddConfigVar('profiling.destination',
              StrParam('stderr'),
              in_c_key=False)
 
+AddConfigVar('profiling.compile_report',
+             """
+             If not empty, the file where to save at exit, as JSON, the
+             compilation profile of each profiled function.
+             """,
+             StrParam(''),
+             in_c_key=False)
+
 AddConfigVar('profiling.debugprint',
              """
              Do a debugprint of the profiled functions
@@ -1095,6 +1109,13 @@ AddConfigVar('optdb.max_use_ratio',
              FloatParam(5),
              in_c_key=False)
 
+AddConfigVar('optdb.worklist',
+             "If True, after their first pass over the graph, the "
+             "EquilibriumOptimizer only revisit the nodes added to the graph "
+             "or whose inputs changed, instead of all the nodes.",
+             BoolParam(False),
+             in_c_key=False)
+
 AddConfigVar('gcc.cxxflags',
              "Extra compiler flags for gcc",
              StrParam(""),
@@ -1123,14 +1144,50 @@ AddConfigVar('cmodule.compilation_warning',
              BoolParam(False),
              in_c_key=False)
 
+AddConfigVar('cmodule.compilation_workers',
+             "Number of C modules that can be compiled concurrently when "
+             "a function needs many new modules. If 1, modules are compiled "
+             "one after the other.",
+             IntParam(1, lambda i: i > 0),
+             in_c_key=False)
 
 AddConfigVar('cmodule.preload_cache',
              "If set to True, will preload the C module cache at import time",
              BoolParam(False, allow_override=False),
              in_c_key=False)
 
+AddConfigVar('cmodule.shared_compiledirs',
+             "List of read-only compiledirs, separated by os.pathsep, whose "
+             "C modules are used before the ones of config.compiledir, "
+             "e.g. a cache prebuilt on a shared filesystem.",
+             StrParam("", allow_override=False),
+             in_c_key=False)
+
+AddConfigVar('cmodule.use_index',
+             "If True, the content of the key.pkl files of the C module "
+             "cache is also appended to an index file in the compiledir, "
+             "that is read at once when the cache is refreshed instead of "
+             "reading each key.pkl file.",
+             BoolParam(True),
+             in_c_key=False)
 
-def default_blas_ldflags():
+AddConfigVar('cmodule.cache_probes',
+             "If True, the results of the compiler and BLAS probes (the "
+             "-march=native flags, blas.ldflags and the test programs) are "
+             "saved in the compiledir and reused by the next processes that "
+             "use the same compiler on the same kind of computer. Failed "
+             "probes are not saved.",
+             BoolParam(True),
+             in_c_key=False)
+
+
+def find_blas_ldflags():
+    """
+    Return the flags to link with the BLAS library used by NumPy, or "".
+
+    The flags are checked by compiling and running a test program.
+
+    """
     global numpy
     try:
         if (hasattr(numpy.distutils, '__config__') and
@@ -1353,6 +1410,18 @@ def try_blas_flag(flags):
     else:
         return ""
 
+
+def default_blas_ldflags():
+    # Finding the flags compiles test programs, so the result is saved in
+    # the compiledir for the next processes.
+    from theano.gof.cmodule import get_probe_result, set_probe_result
+    ldflags = get_probe_result('blas.ldflags')
+    if ldflags is None:
+        ldflags = find_blas_ldflags()
+        if ldflags:
+            set_probe_result('blas.ldflags', ldflags)
+    return ldflags
+
 AddConfigVar('blas.ldflags',
              "lib[s] to include for [Fortran] level-3 blas implementation",
              StrParam(default_blas_ldflags),
@@ -1400,6 +1469,31 @@ AddConfigVar('vm.lazy',
              ConfigParam('None', filter_vm_lazy),
              in_c_key=False)
 
+AddConfigVar('vm.schedule',
+             "Useful only for the vm linkers. The order in which the Apply"
+             " nodes are executed. 'toposort' uses the order of"
+             " FunctionGraph.toposort(), 'memory' looks for an order that"
+             " lowers the peak memory usage (see"
+             " theano.gof.sched.memory_schedule).",
+             EnumStr('toposort', 'memory'),
+             in_c_key=False)
+
+AddConfigVar('vm.threads',
+             "Useful only for the vm linkers. If more than 1, the Apply"
+             " nodes that don't depend on each other are executed"
+             " concurrently by this number of threads, unless lazy"
+             " evaluation is needed.",
+             IntParam(1, lambda i: i > 0),
+             in_c_key=False)
+
+AddConfigVar('vm.trace_size',
+             "Useful only for the vm linkers. If more than 0, each"
+             " execution of a thunk and each call of a function is"
+             " recorded, and the last events (this number) are kept. See"
+             " theano.gof.trace.",
+             IntParam(0, lambda i: i >= 0),
+             in_c_key=False)
+
 AddConfigVar(
     'warn.identify_1pexp_bug',
     'Warn if Theano versions prior to 7987b51 (2011-12-18) could have '
@@ -1450,6 +1544,32 @@ AddConfigVar('scan.allow_output_prealloc',
              BoolParam(True),
              in_c_key=False)
 
+AddConfigVar('scan.grad_checkpoint',
+             "Default value of the checkpoint argument of scan: the number "
+             "of steps between the states stored for the gradient, 'sqrt' "
+             "for the square root of the number of steps, or 0 to store all "
+             "of them.",
+             StrParam("0", lambda s: s == 'sqrt' or s.isdigit()),
+             in_c_key=False)
+
+AddConfigVar('scan.c_loop',
+             "If True, compile the inner graph of scan with the C linker "
+             "when all its ops have C code, and run the whole loop in C.",
+             BoolParam(False),
+             in_c_key=False)
+
+AddConfigVar('scan.unroll',
+             "Scans with a constant number of steps up to this value are "
+             "replaced by their unrolled inner graph (0 disables it).",
+             IntParam(0, lambda i: i >= 0),
+             in_c_key=False)
+
+AddConfigVar('scan.unroll_max_nodes',
+             "Scans are only unrolled when the unrolled graph has at most "
+             "this number of nodes (see scan.unroll).",
+             IntParam(1000, lambda i: i >= 0),
+             in_c_key=False)
+
 AddConfigVar('scan.debug',
              "If True, enable extra verbose output related to scan",
              BoolParam(False),
@@ -1492,6 +1612,21 @@ AddConfigVar('compile.wait',
              IntParam(5, lambda i: i > 0, allow_override=False),
              in_c_key=False)
 
+AddConfigVar('compile.lock_granularity',
+             """What is locked during compilation. With 'global', only one
+process can compile at a time in a compilation directory. With 'module',
+there is one lock per module (based on fcntl, not available on Windows), so
+that processes compiling different modules do not wait for each other.""",
+             EnumStr('global', 'module'),
+             in_c_key=False)
+
+AddConfigVar('compile.inner_graph_workers',
+             "Number of processes used to optimize concurrently the inner "
+             "graphs (of Scan and OpFromGraph) of a function before they "
+             "are compiled. If 1, they are optimized one after the other.",
+             IntParam(1, lambda i: i > 0),
+             in_c_key=False)
+
 
 def _timeout_default():
     return theano.config.compile.wait * 24
@@ -7,6 +7,7 @@ import logging
 import os
 import shlex
 import sys
+import threading
 import warnings
 from functools import wraps
 
@@ -131,6 +132,53 @@ class change_flags(object):
             v.__set__(None, self.old_vals[k])
 
 
+# Values of the flags changed by `local_flags` in each thread, and the
+# number of `local_flags` contexts that are active in all the threads, so
+# that reading a flag doesn't look at them when there are none.
+_thread_values = threading.local()
+_n_local_flags = 0
+_local_flags_lock = threading.Lock()
+
+
+class local_flags(change_flags):
+    """
+    Like `change_flags`, but the new values are only seen by the current
+    thread. Setting these flags in the context, e.g. with `change_flags`,
+    also only changes the values seen by the current thread.
+
+    The other threads keep seeing the values of the flags, e.g. the user
+    code building graphs while a function is compiled in another thread.
+
+    """
+    def __enter__(self):
+        global _n_local_flags
+        values = getattr(_thread_values, 'values', None)
+        if values is None:
+            values = _thread_values.values = {}
+        new_vals = {}
+        for k, v in iteritems(self.confs):
+            if v.filter:
+                new_vals[k] = v.filter(self.new_vals[k])
+            else:
+                new_vals[k] = self.new_vals[k]
+        self.old_vals = dict((k, values[k]) for k in self.confs
+                             if k in values)
+        values.update(new_vals)
+        with _local_flags_lock:
+            _n_local_flags += 1
+
+    def __exit__(self, *args):
+        global _n_local_flags
+        values = _thread_values.values
+        for k in self.confs:
+            if k in self.old_vals:
+                values[k] = self.old_vals[k]
+            else:
+                del values[k]
+        with _local_flags_lock:
+            _n_local_flags -= 1
+
+
 def fetch_val_for_key(key, delete_key=False):
     """Return the overriding config value for a key.
     A successful search returns a string value.
@@ -318,6 +366,10 @@ class ConfigParam(object):
     def __get__(self, cls, type_, delete_key=False):
         if cls is None:
             return self
+        if _n_local_flags:
+            values = getattr(_thread_values, 'values', None)
+            if values and self.fullname in values:
+                return values[self.fullname]
         if not hasattr(self, 'val'):
             try:
                 val_str = fetch_val_for_key(self.fullname,
@@ -339,9 +391,15 @@ class ConfigParam(object):
                 "after initialization!")
         # print "SETTING PARAM", self.fullname,(cls), val
         if self.filter:
-            self.val = self.filter(val)
-        else:
-            self.val = val
+            val = self.filter(val)
+        if _n_local_flags:
+            values = getattr(_thread_values, 'values', None)
+            if values and self.fullname in values:
+                # The flag is changed by `local_flags` in this thread, the
+                # other threads keep seeing the same value.
+                values[self.fullname] = val
+                return
+        self.val = val
 
 
 class EnumStr(ConfigParam):
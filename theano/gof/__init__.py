@@ -72,7 +72,8 @@ from theano.gof.optdb import \
 from theano.gof.toolbox import \
     Feature, \
     Bookkeeper, History, Validator, ReplaceValidate, NodeFinder,\
-    PrintListener, ReplacementDidntRemovedError, NoOutputFromInplace
+    PrintListener, ReplacementDidntRemovedError, NoOutputFromInplace, \
+    StructuralHasher
 
 from theano.gof.type import \
     Type, Generic, generic
@@ -25,7 +25,7 @@ from theano.gof import graph
 from theano.gof import link
 from theano.gof import utils
 from theano.gof import cmodule
-from theano.gof.compilelock import get_lock, release_lock
+from theano.gof.compilelock import get_lock, release_lock, use_module_locks
 from theano.gof.callcache import CallCache
 
 
@@ -1473,30 +1473,60 @@ class CLinker(link.Linker):
         """
         if location is None:
             location = cmodule.dlimport_workdir(config.compiledir)
-        mod = self.get_dynamic_module()
-        c_compiler = self.c_compiler()
-        libs = self.libraries()
-        preargs = self.compile_args()
         # We want to compute the code without the lock
-        src_code = mod.code()
-        get_lock()
+        compile_kwargs = self.compile_str_kwargs()
+        # With per-module locks, `location` is private to this compilation,
+        # and the caller holds the lock of the module if it is cached.
+        global_lock = not use_module_locks()
+        if global_lock:
+            get_lock()
         try:
             _logger.debug("LOCATION %s", str(location))
-            module = c_compiler.compile_str(
-                module_name=mod.code_hash,
-                src_code=src_code,
-                location=location,
-                include_dirs=self.header_dirs(),
-                lib_dirs=self.lib_dirs(),
-                libs=libs,
-                preargs=preargs)
+            module = self.c_compiler().compile_str(location=location,
+                                                   **compile_kwargs)
         except Exception as e:
             e.args += (str(self.fgraph),)
             raise
         finally:
-            release_lock()
+            if global_lock:
+                release_lock()
         return module
 
+    def build_cmodule(self, location):
+        """
+        Compile the shared library of this linker in `location`, without
+        importing it. Return the path of the shared library.
+
+        The caller must hold the compilation lock. This does not touch
+        any global state, so it can run in parallel for several linkers
+        (see `ModuleCache.precompile`).
+
+        """
+        compile_kwargs = self.compile_str_kwargs()
+        try:
+            self.c_compiler().compile_str(location=location,
+                                          py_module=False,
+                                          **compile_kwargs)
+        except Exception as e:
+            e.args += (str(self.fgraph),)
+            raise
+        return os.path.join(location, '%s.%s' % (
+            compile_kwargs['module_name'], cmodule.get_lib_extension()))
+
+    def compile_str_kwargs(self):
+        """
+        Return the keyword arguments to pass to the `compile_str` method of
+        the C compiler, except for `location`.
+
+        """
+        mod = self.get_dynamic_module()
+        return dict(module_name=mod.code_hash,
+                    src_code=mod.code(),
+                    include_dirs=self.header_dirs(),
+                    lib_dirs=self.lib_dirs(),
+                    libs=self.libraries(),
+                    preargs=self.compile_args())
+
     def get_dynamic_module(self):
         """
         Return a cmodule.DynamicModule instance full of the code for our fgraph.
@@ -1680,25 +1710,101 @@ class _CThunk(object):
     def __call__(self):
         failure = run_cthunk(self.cthunk)
         if failure:
-            task, taskname, id = self.find_task(failure)
-            try:
-                trace = task.trace
-            except AttributeError:
-                trace = ()
-            try:
-                exc_type, _exc_value, exc_trace = self.error_storage
-                if task in self.nodes:
-                    self.position_of_error = self.nodes.index(task)
-                # this can be used to retrieve the location the Op was declared
-                exc_value = exc_type(_exc_value)
-                exc_value.__thunk_trace__ = trace
-            except Exception:
-                print(('ERROR retrieving error_storage.'
-                       'Was the error set in the c code?'),
-                      end=' ', file=sys.stderr)
-                print(self.error_storage, file=sys.stderr)
-                raise
-            reraise(exc_type, exc_value, exc_trace)
+            self.raise_failure(failure)
+
+    def raise_failure(self, failure):
+        """
+        Raise the error stored by the cthunk when it returned `failure`.
+
+        """
+        task, taskname, id = self.find_task(failure)
+        try:
+            trace = task.trace
+        except AttributeError:
+            trace = ()
+        try:
+            exc_type, _exc_value, exc_trace = self.error_storage
+            if task in self.nodes:
+                self.position_of_error = self.nodes.index(task)
+            # this can be used to retrieve the location the Op was declared
+            exc_value = exc_type(_exc_value)
+            exc_value.__thunk_trace__ = trace
+        except Exception:
+            print(('ERROR retrieving error_storage.'
+                   'Was the error set in the c code?'),
+                  end=' ', file=sys.stderr)
+            print(self.error_storage, file=sys.stderr)
+            raise
+        reraise(exc_type, exc_value, exc_trace)
+
+
+def _uses_default_c_thunk(op):
+    """
+    Return True if `op` builds its C thunk with `Op.make_c_thunk`, i.e. with
+    one CLinker per Apply node.
+
+    """
+    from theano.gof.op import Op
+    for name in ('make_thunk', 'make_c_thunk'):
+        meth = getattr(type(op), name, None)
+        if getattr(meth, '__func__', meth) is not getattr(
+                getattr(Op, name), '__func__', getattr(Op, name)):
+            return False
+    return True
+
+
+def precompile_nodes(nodes, no_recycling=(), n_workers=None):
+    """
+    Compile in parallel the C modules of `nodes` that are not in the cache.
+
+    This builds the same per-node CLinker as `Op.make_c_thunk`, so the
+    following calls to `make_thunk` on these nodes will find their module in
+    the cache. Nodes without C code, or with Ops that make their own thunks,
+    are skipped.
+
+    Parameters
+    ----------
+    nodes
+        The Apply nodes, usually in the order they will be executed.
+    no_recycling
+        The variables that must not be recycled, as given to `make_thunk`.
+    n_workers : int
+        Number of concurrent compilations. Defaults to the Theano flag
+        ``cmodule.compilation_workers``.
+
+    Returns
+    -------
+    int
+        The number of modules that were compiled.
+
+    """
+    if n_workers is None:
+        n_workers = config.cmodule.compilation_workers
+    if n_workers <= 1 or not config.cxx:
+        return 0
+    key_lnk_pairs = []
+    for node in nodes:
+        op = node.op
+        if not _uses_default_c_thunk(op):
+            continue
+        if (not getattr(op, '_f16_ok', False) and
+                any(getattr(v.type, 'dtype', '') == 'float16'
+                    for v in node.inputs + node.outputs)):
+            continue
+        try:
+            op.prepare_node(node, storage_map=None, compute_map=None,
+                            impl='c')
+            fgraph = theano.gof.fg.FunctionGraph(node.inputs, node.outputs)
+            fgraph_no_recycling = [
+                new_o for (new_o, old_o) in zip(fgraph.outputs, node.outputs)
+                if old_o in no_recycling]
+            cl = CLinker().accept(fgraph, no_recycling=fgraph_no_recycling)
+            key = cl.cmodule_key()
+        except (KeyError, NotImplementedError, utils.MethodNotDefined):
+            continue
+        if key is not None:
+            key_lnk_pairs.append((key, cl))
+    return get_module_cache().precompile(key_lnk_pairs, n_workers=n_workers)
 
 
 class OpWiseCLinker(link.LocalLinker):
@@ -1785,16 +1891,18 @@ class OpWiseCLinker(link.LocalLinker):
             for k in storage_map:
                 compute_map[k] = [k.owner is None]
 
+            precompile_nodes(order, no_recycling)
             thunks = []
-            for node in order:
-                # make_thunk will try by default C code, otherwise
-                # it fall back to python.
-                thunks += [node.op.make_thunk(node,
-                                              storage_map,
-                                              compute_map,
-                                              no_recycling)]
-                thunks[-1].inputs = [storage_map[v] for v in node.inputs]
-                thunks[-1].outputs = [storage_map[v] for v in node.outputs]
+            with theano.compile.parallel_opt.optimized_inner_graphs(order):
+                for node in order:
+                    # make_thunk will try by default C code, otherwise
+                    # it fall back to python.
+                    thunks += [node.op.make_thunk(node,
+                                                  storage_map,
+                                                  compute_map,
+                                                  no_recycling)]
+                    thunks[-1].inputs = [storage_map[v] for v in node.inputs]
+                    thunks[-1].outputs = [storage_map[v] for v in node.outputs]
 
             for node in order:
                 if self.allow_gc:
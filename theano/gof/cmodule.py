@@ -12,21 +12,25 @@ import os
 import re
 import shutil
 import stat
+import struct
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import platform
 import distutils.sysconfig
 import warnings
+import zlib
+from multiprocessing.pool import ThreadPool
 
 import numpy.distutils  # TODO: TensorType should handle this
 
 import theano
-from theano.compat import PY3, decode, decode_iter
+from theano.compat import OrderedDict, PY3, decode, decode_iter
 from six import b, BytesIO, StringIO, string_types, iteritems
 from six.moves import xrange
-from theano.gof.utils import flatten
+from theano.gof.utils import flatten, MethodNotDefined
 from theano.configparser import config
 from theano.gof.utils import hash_from_code
 from theano.misc.windows import (subprocess_Popen,
@@ -503,14 +507,25 @@ class KeyData(object):
 
         """
         # Note that writing in binary mode is important under Windows.
+        # Other processes may read this file while we hold only the lock of
+        # this module, so in that case it must be replaced atomically.
+        atomic = compilelock.use_module_locks()
+        if atomic:
+            pkl_file = self.key_pkl + '.tmp'
+        else:
+            pkl_file = self.key_pkl
         try:
-            with open(self.key_pkl, 'wb') as f:
-                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            data = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
         except pickle.PicklingError:
             _logger.warning("Cache leak due to unpickle-able key data %s",
                             self.keys)
-            os.remove(self.key_pkl)
             raise
+        with open(pkl_file, 'wb') as f:
+            f.write(data)
+        if atomic:
+            os.rename(pkl_file, self.key_pkl)
+        ModuleIndex.append(self.key_pkl, self.get_entry(), self.module_hash,
+                           data)
 
     def get_entry(self):
         """
@@ -555,6 +570,209 @@ class KeyData(object):
                     pass
 
 
+class ModuleIndex(object):
+    """
+    Append-only index of the key.pkl files of a cache directory.
+
+    Each time a key.pkl file is saved, a record with its content, its size
+    and mtime, the name of the module file and the module hash is appended
+    to the ``index.pkl`` file of the cache directory. `ModuleCache.refresh`
+    reads the index once, then the records that were appended since, instead
+    of listing each module directory and reading its key.pkl file. The
+    KeyData of an indexed module is only unpickled when a module with its
+    hash is needed. A record is only used if the key.pkl file still has the
+    same size and mtime, so the index doesn't have to be kept exactly in
+    sync with the cache: a record that is missing or outdated only means
+    that the key.pkl file is read.
+
+    Each record starts with a marker, its length and a checksum. A record
+    that can't be read is skipped if valid records follow it, and the index
+    is then marked `dirty` so that `ModuleCache.refresh` rewrites it. If it
+    is the last record of the file, it may still be being appended, and it
+    is read again by the next call to `load`.
+
+    Parameters
+    ----------
+    dirname
+        The cache directory.
+
+    """
+
+    filename = 'index.pkl'
+    # Marker, then length and CRC32 of the pickled record.
+    magic = b'TIX1'
+    header = struct.Struct('<II')
+
+    def __init__(self, dirname):
+        self.path = os.path.join(dirname, self.filename)
+        # module directory name -> (key.pkl (size, mtime), module file name,
+        #                           module hash, pickled KeyData)
+        self.records = {}
+        self.n_records = 0
+        self.offset = 0
+        self.file_id = None
+        # True when records that can't be read were skipped.
+        self.dirty = False
+
+    @staticmethod
+    def stat_key(key_pkl):
+        st = os.stat(key_pkl)
+        return (st.st_size, st.st_mtime)
+
+    @classmethod
+    def pack(cls, record):
+        """
+        Return the bytes of a record, as written in the index.
+
+        """
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        return (cls.magic +
+                cls.header.pack(len(data), zlib.crc32(data) & 0xffffffff) +
+                data)
+
+    @classmethod
+    def unpack(cls, data, pos):
+        """
+        Read the record that starts at `pos` in `data`.
+
+        Return the position of the end of the record and the record, which
+        is None if it can't be unpickled. Return (None, None) if there is no
+        complete and valid record at `pos`.
+
+        """
+        start = pos + len(cls.magic) + cls.header.size
+        if (len(data) < start or
+                data[pos:pos + len(cls.magic)] != cls.magic):
+            return None, None
+        length, crc = cls.header.unpack(data[pos + len(cls.magic):start])
+        end = start + length
+        if (len(data) < end or
+                zlib.crc32(data[start:end]) & 0xffffffff != crc):
+            return None, None
+        try:
+            return end, pickle.loads(data[start:end])
+        except Exception:
+            return end, None
+
+    @classmethod
+    def append(cls, key_pkl, entry, module_hash, data):
+        """
+        Append the record of a key.pkl file and its content `data`.
+
+        The record is written with a single write to a file opened in
+        append mode, so records appended concurrently are not mixed.
+
+        """
+        if not config.cmodule.use_index:
+            return
+        root = os.path.dirname(key_pkl)
+        path = os.path.join(os.path.dirname(root), cls.filename)
+        try:
+            record = cls.pack(
+                (os.path.basename(root), cls.stat_key(key_pkl),
+                 os.path.basename(entry), module_hash, data))
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+            try:
+                os.write(fd, record)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            _logger.info('Could not update the index %s: %s', path, e)
+
+    def load(self):
+        """
+        Read the records appended since the last call.
+
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None
+        file_id = st and (st.st_dev, st.st_ino)
+        if st is None or file_id != self.file_id or st.st_size < self.offset:
+            # No index yet, or it was rewritten by `compact`.
+            self.records = {}
+            self.n_records = 0
+            self.offset = 0
+            self.file_id = file_id
+            self.dirty = False
+        if st is None or st.st_size == self.offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        pos = 0
+        while pos < len(data):
+            end, record = self.unpack(data, pos)
+            if end is None:
+                # Look for a valid record after this one.
+                nxt = data.find(self.magic, pos + 1)
+                while nxt != -1 and self.unpack(data, nxt)[0] is None:
+                    nxt = data.find(self.magic, nxt + 1)
+                if nxt == -1:
+                    # The end of the file, or a record that is being
+                    # appended by another process: the next call will read
+                    # it.
+                    break
+                # A torn or corrupted record, e.g. after a crash or a full
+                # disk.
+                self.dirty = True
+                pos = nxt
+                continue
+            # Skip the records written by other versions of Theano.
+            if isinstance(record, tuple) and len(record) == 5:
+                self.records[record[0]] = record[1:]
+            self.n_records += 1
+            pos = end
+        self.offset += pos
+
+    def get(self, subdir, key_pkl):
+        """
+        Return the module file, the module hash and the pickled KeyData of a
+        module directory.
+
+        Return None if that directory has no up-to-date record in the index,
+        if it is marked for deletion or if the module file is missing. The
+        directory is then checked like the ones that are not indexed.
+
+        """
+        record = self.records.get(subdir)
+        if record is None:
+            return None
+        stat_key, module, module_hash, data = record
+        root = os.path.dirname(key_pkl)
+        try:
+            if self.stat_key(key_pkl) != stat_key:
+                return None
+        except OSError:
+            return None
+        entry = os.path.join(root, module)
+        if (os.path.exists(os.path.join(root, 'delete.me')) or
+                not os.path.exists(entry)):
+            return None
+        return entry, module_hash, data
+
+    def compact(self, subdirs):
+        """
+        Rewrite the index with only the last records of `subdirs`.
+
+        """
+        dirname = os.path.dirname(self.path)
+        with compilelock.lock_ctx():
+            # Keep the records appended since the last call to `load`.
+            self.load()
+            records = [(subdir, ) + self.records[subdir]
+                       for subdir in subdirs if subdir in self.records]
+            fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                for record in records:
+                    f.write(self.pack(record))
+            if sys.platform == 'win32' and os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+        self.load()
+
+
 class ModuleCache(object):
     """
     Interface to the cache of dynamically compiled modules on disk.
@@ -576,6 +794,16 @@ class ModuleCache(object):
     associated with that module,
     - possibly a delete.me file, meaning this directory has been marked
     for deletion.
+    The cache directory also contains an index of the key.pkl files, see
+    `ModuleIndex`.
+
+    Other cache directories can be used as read-only layers, for example
+    a cache that is prebuilt on a shared filesystem. Their modules are used
+    before the ones of the cache directory and imported from where they
+    are, without taking the compilation lock. Nothing is written or deleted
+    in these directories: the new modules are compiled in the cache
+    directory, and the new keys of the shared modules are only kept in
+    memory.
 
     Keys should be tuples of length 2: (version, rest). The
     ``rest`` can be anything hashable and picklable, that uniquely
@@ -615,6 +843,9 @@ class ModuleCache(object):
     do_refresh : bool
         If True, then the ``refresh`` method will be called
         in the constructor.
+    shared_dirnames
+        The read-only cache directories. Defaults to the Theano flag
+        ``cmodule.shared_compiledirs``.
 
     """
 
@@ -622,6 +853,11 @@ class ModuleCache(object):
     """
     The working directory that is managed by this interface.
 
+    """
+    shared_dirnames = []
+    """
+    The read-only cache directories, in the order they are searched.
+
     """
     module_from_name = {}
     """
@@ -654,9 +890,24 @@ class ModuleCache(object):
     Set of all key.pkl files that have been loaded.
 
     """
+    lazy_key_data = {}
+    """
+    Maps the hash of a module found in the index to its key.pkl file, its
+    module file and its pickled KeyData, until that KeyData is needed.
 
-    def __init__(self, dirname, check_for_broken_eq=True, do_refresh=True):
+    """
+
+    def __init__(self, dirname, check_for_broken_eq=True, do_refresh=True,
+                 shared_dirnames=None):
         self.dirname = dirname
+        if shared_dirnames is None:
+            shared_dirnames = [
+                os.path.abspath(os.path.expanduser(d))
+                for d in config.cmodule.shared_compiledirs.split(os.pathsep)
+                if d]
+        self.shared_dirnames = [
+            d for d in shared_dirnames
+            if os.path.realpath(d) != os.path.realpath(dirname)]
         self.module_from_name = dict(self.module_from_name)
         self.entry_from_key = dict(self.entry_from_key)
         self.module_hash_to_key_data = dict(self.module_hash_to_key_data)
@@ -664,7 +915,15 @@ class ModuleCache(object):
         self.stats = [0, 0, 0]
         self.check_for_broken_eq = check_for_broken_eq
         self.loaded_key_pkl = set()
+        self.lazy_key_data = {}
+        # The modules of the read-only cache directories.
+        self.read_only_entries = set()
         self.time_spent_in_check_key = 0
+        self.index = ModuleIndex(dirname)
+        self.shared_indexes = [ModuleIndex(d) for d in self.shared_dirnames]
+        # Functions can be compiled in several threads (e.g. the second tier
+        # of a TieredMode), and the cache is not thread-safe.
+        self._lock = threading.RLock()
 
         if do_refresh:
             self.refresh()
@@ -700,6 +959,9 @@ class ModuleCache(object):
         Remove entries which have been removed from the filesystem.
         Also, remove malformed cache directories.
 
+        The read-only cache directories are walked first. Their modules are
+        used whatever their age, and nothing is removed from them.
+
         Parameters
         ----------
         age_thresh_use
@@ -727,63 +989,109 @@ class ModuleCache(object):
         to_delete = []
         to_delete_empty = []
 
+        # Nothing is removed from the read-only cache directories. These are
+        # only called on the directory being walked, `read_only` is its flag.
         def rmtree(*args, **kwargs):
-            if cleanup:
+            if cleanup and not read_only:
                 to_delete.append((args, kwargs))
 
         def rmtree_empty(*args, **kwargs):
-            if cleanup:
+            if cleanup and not read_only:
                 to_delete_empty.append((args, kwargs))
 
         # add entries that are not in the entry_from_key dictionary
         time_now = time.time()
+        use_index = config.cmodule.use_index
+        layers = list(zip(self.shared_dirnames, self.shared_indexes))
+        layers.append((self.dirname, self.index))
+        if use_index:
+            for dirname, index in layers:
+                index.load()
+        # Hashes of the modules found in this call.
+        new_hashes = set()
         # Go through directories in alphabetical order to ensure consistent
         # behavior.
-        subdirs = sorted(os.listdir(self.dirname))
+        local_subdirs = sorted(os.listdir(self.dirname))
+        subdirs = []
+        for dirname, index in layers[:-1]:
+            try:
+                subdirs.extend((dirname, index, subdirs_elem)
+                               for subdirs_elem in sorted(os.listdir(dirname)))
+            except OSError as e:
+                _logger.warning('Could not read the shared cache %s: %s',
+                                dirname, e)
+        subdirs.extend((self.dirname, self.index, subdirs_elem)
+                       for subdirs_elem in local_subdirs)
         files, root = None, None  # To make sure the "del" below works
-        for subdirs_elem in subdirs:
-            # Never clean/remove lock_dir
-            if subdirs_elem == 'lock_dir':
+        for dirname, index, subdirs_elem in subdirs:
+            # Never clean/remove lock_dir and module_locks
+            if subdirs_elem in ('lock_dir', 'module_locks'):
                 continue
-            root = os.path.join(self.dirname, subdirs_elem)
+            read_only = dirname != self.dirname
+            root = os.path.join(dirname, subdirs_elem)
             key_pkl = os.path.join(root, 'key.pkl')
             if key_pkl in self.loaded_key_pkl:
                 continue
-            if not os.path.isdir(root):
-                continue
-            files = os.listdir(root)
-            if not files:
-                rmtree_empty(root, ignore_nocleanup=True,
-                             msg="empty dir")
-                continue
-            if 'delete.me' in files:
-                rmtree(root, ignore_nocleanup=True,
-                       msg="delete.me found in dir")
-                continue
-            elif 'key.pkl' in files:
-                try:
-                    entry = module_name_from_dir(root, files=files)
-                except ValueError:  # there is a key but no dll!
-                    if not root.startswith("/tmp"):
-                        # Under /tmp, file are removed periodically by the
-                        # os. So it is normal that this happens from time
-                        # to time.
-                        _logger.warning("ModuleCache.refresh() Found key "
-                                        "without dll in cache, deleting it. %s",
-                                        key_pkl)
+            indexed = None
+            if use_index:
+                indexed = index.get(subdirs_elem, key_pkl)
+            if indexed is None:
+                if not os.path.isdir(root):
+                    continue
+                files = os.listdir(root)
+                if not files:
+                    rmtree_empty(root, ignore_nocleanup=True,
+                                 msg="empty dir")
+                    continue
+                if 'delete.me' in files:
                     rmtree(root, ignore_nocleanup=True,
-                           msg="missing module file", level=logging.INFO)
+                           msg="delete.me found in dir")
                     continue
-                if (time_now - last_access_time(entry)) < age_thresh_use:
+            if indexed is not None or 'key.pkl' in files:
+                if indexed is not None:
+                    entry, indexed_hash, key_data_pkl = indexed
+                else:
+                    key_data_pkl = None
+                    try:
+                        entry = module_name_from_dir(root, files=files)
+                    except ValueError:  # there is a key but no dll!
+                        if not root.startswith("/tmp"):
+                            # Under /tmp, file are removed periodically by
+                            # the os. So it is normal that this happens from
+                            # time to time.
+                            _logger.warning("ModuleCache.refresh() Found key "
+                                            "without dll in cache, deleting "
+                                            "it. %s", key_pkl)
+                        rmtree(root, ignore_nocleanup=True,
+                               msg="missing module file", level=logging.INFO)
+                        continue
+                if (read_only or
+                        (time_now - last_access_time(entry)) < age_thresh_use):
                     _logger.debug('refresh adding %s', key_pkl)
+                    if read_only:
+                        self.read_only_entries.add(entry)
+
+                    if (key_data_pkl is not None and
+                            indexed_hash not in self.module_hash_to_key_data and
+                            indexed_hash not in self.lazy_key_data):
+                        # It is unpickled by `_get_from_hash` if needed.
+                        self.lazy_key_data[indexed_hash] = (
+                            key_pkl, entry, key_data_pkl)
+                        new_hashes.add(indexed_hash)
+                        self.loaded_key_pkl.add(key_pkl)
+                        continue
 
                     def unpickle_failure():
                         _logger.info("ModuleCache.refresh() Failed to "
                                      "unpickle cache file %s", key_pkl)
 
                     try:
-                        with open(key_pkl, 'rb') as f:
-                            key_data = pickle.load(f)
+                        if key_data_pkl is None:
+                            with open(key_pkl, 'rb') as f:
+                                data = f.read()
+                        else:
+                            data = key_data_pkl
+                        key_data = pickle.loads(data)
                     except EOFError:
                         # Happened once... not sure why (would be worth
                         # investigating if it ever happens again).
@@ -869,7 +1177,8 @@ class ModuleCache(object):
                         continue
 
                     mod_hash = key_data.module_hash
-                    if mod_hash in self.module_hash_to_key_data:
+                    if (mod_hash in self.module_hash_to_key_data or
+                            mod_hash in self.lazy_key_data):
                         # This may happen when two processes running
                         # simultaneously compiled the same module, one
                         # after the other. We delete one once it is old
@@ -894,6 +1203,7 @@ class ModuleCache(object):
                     # Remember the map from a module's hash to the KeyData
                     # object associated with it.
                     self.module_hash_to_key_data[mod_hash] = key_data
+                    new_hashes.add(mod_hash)
 
                     for key in key_data.keys:
                         if key not in self.entry_from_key:
@@ -920,6 +1230,9 @@ class ModuleCache(object):
                     if key_data.keys:
                         del key
                     self.loaded_key_pkl.add(key_pkl)
+                    if use_index and key_data_pkl is None and not read_only:
+                        # Not in the index yet, or the record was outdated.
+                        ModuleIndex.append(key_pkl, entry, mod_hash, data)
                 else:
                     too_old_to_use.append(entry)
 
@@ -927,12 +1240,30 @@ class ModuleCache(object):
             # directory, but a mod.* should be there.
             # We do nothing here.
 
+        if use_index and (self.index.dirty or
+                          self.index.n_records > 2 * len(local_subdirs) + 100):
+            # Remove the outdated records, those of deleted modules and the
+            # ones that can't be read.
+            try:
+                self.index.compact(local_subdirs)
+            except (OSError, IOError) as e:
+                _logger.info('Could not compact the index %s: %s',
+                             self.index.path, e)
+
         # Clean up the name space to prevent bug.
-        del root, files, subdirs
+        del root, files, subdirs, local_subdirs
 
         # Remove entries that are not in the filesystem.
+        for module_hash, (key_pkl, entry, _) in list(
+                self.lazy_key_data.items()):
+            if module_hash not in new_hashes and not os.path.exists(entry):
+                del self.lazy_key_data[module_hash]
+                self.loaded_key_pkl.discard(key_pkl)
         items_copy = list(self.module_hash_to_key_data.items())
         for module_hash, key_data in items_copy:
+            if module_hash in new_hashes:
+                # We just found its module file.
+                continue
             entry = key_data.get_entry()
             try:
                 # Test to see that the file is [present and] readable.
@@ -979,7 +1310,13 @@ class ModuleCache(object):
                     _rmtree(*a, **kw)
                 for a, kw in to_delete_empty:
                     files = os.listdir(a[0])
-                    if not files:
+                    # With per-module locks, a process may have just
+                    # created this directory to compile a module in it,
+                    # without holding the global lock.
+                    if (not files and
+                        not (compilelock.use_module_locks() and
+                             time.time() - os.path.getmtime(a[0]) <
+                             config.compile.timeout)):
                         _rmtree(*a, **kw)
 
         _logger.debug('Time needed to refresh cache: %s',
@@ -1012,11 +1349,54 @@ class ModuleCache(object):
             return None
         return self._get_module(name)
 
+    def _load_lazy_key_data(self, module_hash):
+        """
+        Unpickle the KeyData of a module that `refresh` found in the index.
+
+        Its keys are added to the cache. Return None if the KeyData can't be
+        unpickled now: like in `refresh`, this is often because the classes
+        it refers to are not imported yet.
+
+        """
+        key_pkl, entry, data = self.lazy_key_data.pop(module_hash)
+        try:
+            key_data = pickle.loads(data)
+        except ValueError:
+            # See `refresh`.
+            raise
+        except Exception:
+            _logger.info("ModuleCache: Failed to unpickle the index record "
+                         "of %s", key_pkl)
+            # The next refresh will try again.
+            self.loaded_key_pkl.discard(key_pkl)
+            return None
+        key_data.entry = entry
+        key_data.key_pkl = key_pkl
+        self.module_hash_to_key_data[module_hash] = key_data
+        for key in key_data.keys:
+            if key not in self.entry_from_key:
+                self.entry_from_key[key] = entry
+                self.similar_keys.setdefault(get_safe_part(key),
+                                             []).append(key)
+        return key_data
+
     def _get_from_hash(self, module_hash, key, keep_lock=False):
+        if module_hash in self.lazy_key_data:
+            self._load_lazy_key_data(module_hash)
+            if key in self.entry_from_key:
+                return self._get_from_key(key)
         if module_hash in self.module_hash_to_key_data:
             key_data = self.module_hash_to_key_data[module_hash]
             module = self._get_from_key(None, key_data)
-            with compilelock.lock_ctx(keep_lock=keep_lock):
+            if key_data.get_entry() in self.read_only_entries:
+                # The module of a read-only cache: its new key is only
+                # kept in memory.
+                key_data.add_key(key, save_pkl=False)
+                self._update_mappings(key, key_data, module.__file__,
+                                      check_in_keys=True)
+                return module
+            with compilelock.module_lock_ctx(module_hash,
+                                             keep_lock=keep_lock):
                 try:
                     key_data.add_key(key, save_pkl=bool(key[0]))
                     key_broken = False
@@ -1110,6 +1490,10 @@ class ModuleCache(object):
             If True, the compilation lock will not be released if taken.
 
         """
+        with self._lock:
+            return self._module_from_key(key, lnk, keep_lock)
+
+    def _module_from_key(self, key, lnk, keep_lock):
         # Is the module in the cache?
         module = self._get_from_key(key)
         if module is not None:
@@ -1122,7 +1506,7 @@ class ModuleCache(object):
         if module is not None:
             return module
 
-        with compilelock.lock_ctx(keep_lock=keep_lock):
+        with compilelock.module_lock_ctx(module_hash, keep_lock=keep_lock):
             # 1) Maybe somebody else compiled it for us while we
             #    where waiting for the lock. Try to load it again.
             # 2) If other repo that import Theano have Theano ops defined,
@@ -1180,6 +1564,105 @@ class ModuleCache(object):
         self.stats[2] += 1
         return module
 
+    def precompile(self, key_lnk_pairs, n_workers=None):
+        """
+        Compile concurrently the modules that are missing from the cache.
+
+        This is an optional step to call before `module_from_key` when
+        many modules are needed at once (e.g. one per Apply node of a
+        graph). The source code of all missing modules is generated up
+        front, then the compiler is run on them in a pool of
+        ``n_workers`` threads while the compilation lock is held. The
+        compiled modules are then imported and added to the cache, so
+        that the following calls to `module_from_key` are cache hits.
+
+        Modules that fail to compile are simply skipped: the error will
+        be raised by the usual sequential path in `module_from_key`.
+
+        Parameters
+        ----------
+        key_lnk_pairs
+            Iterable of (key, lnk) pairs, with the same meaning as the
+            arguments of `module_from_key`. The linkers must also define
+            a `build_cmodule(location)` method, like `CLinker`.
+        n_workers : int
+            Number of concurrent compilations. Defaults to the Theano flag
+            ``cmodule.compilation_workers``.
+
+        Returns
+        -------
+        int
+            The number of modules that were compiled.
+
+        """
+        if n_workers is None:
+            n_workers = config.cmodule.compilation_workers
+        # module_hash -> (key, lnk), to compile each module only once.
+        todo = OrderedDict()
+        seen_keys = set()
+        for key, lnk in key_lnk_pairs:
+            if key in seen_keys or self._get_from_key(key) is not None:
+                continue
+            seen_keys.add(key)
+            try:
+                src_code = lnk.get_src_code()
+            except (NotImplementedError, MethodNotDefined):
+                # No C code, `module_from_key` will never be called.
+                continue
+            module_hash = get_module_hash(src_code, key)
+            if (module_hash in self.module_hash_to_key_data or
+                    module_hash in self.lazy_key_data or
+                    module_hash in todo):
+                continue
+            todo[module_hash] = (key, lnk)
+        if n_workers <= 1 or not todo:
+            return 0
+
+        n_compiled = 0
+        with self._lock, compilelock.module_lock_ctx(list(todo)):
+            # Somebody else may have compiled some of them for us while we
+            # were waiting for the lock.
+            self.refresh(cleanup=False)
+            jobs = [(module_hash, key, lnk)
+                    for module_hash, (key, lnk) in iteritems(todo)
+                    if (key not in self.entry_from_key and
+                        module_hash not in self.module_hash_to_key_data and
+                        module_hash not in self.lazy_key_data)]
+            if not jobs:
+                return 0
+            locations = [dlimport_workdir(self.dirname) for job in jobs]
+
+            def build(i):
+                try:
+                    return jobs[i][2].build_cmodule(locations[i])
+                except Exception as e:
+                    _logger.debug('Parallel compilation failed: %s', e)
+                    return None
+
+            pool = ThreadPool(min(n_workers, len(jobs)))
+            try:
+                lib_filenames = pool.map(build, range(len(jobs)))
+            finally:
+                pool.close()
+                pool.join()
+
+            # Importing modules and updating the cache is not thread-safe,
+            # so we do it sequentially.
+            for (module_hash, key, lnk), location, lib_filename in zip(
+                    jobs, locations, lib_filenames):
+                if lib_filename is None:
+                    _rmtree(location, ignore_if_missing=True,
+                            msg='exception during compilation')
+                    continue
+                open(os.path.join(location, "__init__.py"), 'w').close()
+                module = dlimport(lib_filename)
+                self.module_from_name[module.__file__] = module
+                key_data = self._add_to_cache(module, key, module_hash)
+                self.module_hash_to_key_data[module_hash] = key_data
+                self.stats[2] += 1
+                n_compiled += 1
+        return n_compiled
+
     def check_key(self, key, key_pkl):
         """
         Perform checks to detect broken __eq__ / __hash__ implementations.
@@ -1715,6 +2198,160 @@ def gcc_llvm():
 gcc_llvm.is_llvm = None
 
 
+def _cpu_id():
+    """
+    Describe the CPU, as the results of the probes depend on it.
+
+    """
+    if _cpu_id.cpu_id is None:
+        cpu_id = [platform.machine(), platform.processor()]
+        try:
+            with open('/proc/cpuinfo') as f:
+                fields = {}
+                for line in f:
+                    name, _, value = line.partition(':')
+                    name = name.strip()
+                    if (name in ('model name', 'flags', 'Features') and
+                            name not in fields):
+                        fields[name] = value.strip()
+            cpu_id.extend(sorted(fields.items()))
+        except IOError:
+            pass
+        _cpu_id.cpu_id = tuple(cpu_id)
+    return _cpu_id.cpu_id
+
+
+_cpu_id.cpu_id = None
+
+
+def probe_key():
+    """
+    Return what the results of the compiler and BLAS probes depend on.
+
+    The compiledir can be shared by different computers and be used with
+    different compilers, so the saved results are only used by the
+    processes that have the same key.
+
+    """
+    cxx = theano.config.cxx
+    try:
+        st = os.stat(os.path.realpath(cxx))
+        cxx_stat = (st.st_size, st.st_mtime)
+    except OSError:
+        cxx_stat = None
+    env = tuple(os.environ.get(var) for var in (
+        'LD_LIBRARY_PATH', 'LIBRARY_PATH', 'CPATH', 'C_INCLUDE_PATH',
+        'CPLUS_INCLUDE_PATH'))
+    return (cxx, cxx_stat, gcc_version_str, theano.config.gcc.cxxflags,
+            _cpu_id(), sys.prefix, sys.version, numpy.__version__, env)
+
+
+# (compiledir, key hash) -> {probe: result}, the results saved in the
+# compiledir for the current key.
+_probe_results = {}
+
+
+def _probe_results_file(compiledir=None):
+    if compiledir is None:
+        compiledir = config.compiledir
+    key = probe_key()
+    key_hash = hash_from_code(repr(key))
+    path = os.path.join(compiledir, 'probes', key_hash + '.pkl')
+    return key, path
+
+
+def get_probe_result(probe, compiledir=None):
+    """
+    Return the result of the probe saved in the compiledir, or None.
+
+    Parameters
+    ----------
+    probe
+        Hashable description of the probe, like its name and its arguments.
+    compiledir
+        Directory where the results are saved. Defaults to
+        `config.compiledir`.
+
+    """
+    if not config.cmodule.cache_probes:
+        return None
+    key, path = _probe_results_file(compiledir)
+    if path not in _probe_results:
+        results = {}
+        try:
+            with open(path, 'rb') as f:
+                saved_key, saved_results = pickle.load(f)
+            # Guard against hash collisions.
+            if saved_key == key:
+                results = saved_results
+        except Exception:
+            # No results yet, or a file that can't be read: the probes
+            # will be run again and the file replaced.
+            pass
+        _probe_results[path] = results
+    return _probe_results[path].get(probe)
+
+
+def probe_succeeded(result, try_run=False):
+    """
+    Return True if `result`, returned by `GCC_compiler.try_compile_tmp` or
+    `GCC_compiler.try_flags`, tells that the test program compiled (and ran,
+    if `try_run` is True).
+
+    """
+    if isinstance(result, bool):
+        return result
+    return bool(result[0] and (not try_run or result[1]))
+
+
+def set_probe_result(probe, result, compiledir=None):
+    """
+    Save the result of a probe in the compiledir.
+
+    Only successful results should be saved: a failure can come from a
+    library or a header that is not installed yet, or not found with the
+    current paths (see `probe_succeeded`).
+
+    The file is replaced atomically, so processes that read it concurrently
+    see the old or the new results. If processes run different probes
+    concurrently, the results of one of them can be lost: it will just be
+    run again later. `compiledir` is like for `get_probe_result`.
+
+    """
+    if not config.cmodule.cache_probes:
+        return
+    key, path = _probe_results_file(compiledir)
+    get_probe_result(probe, compiledir)
+    results = _probe_results[path]
+    results[probe] = result
+    try:
+        # Reload the file, to keep the results saved by other processes.
+        with open(path, 'rb') as f:
+            saved_key, saved_results = pickle.load(f)
+        if saved_key == key:
+            for k, v in iteritems(saved_results):
+                results.setdefault(k, v)
+    except Exception:
+        pass
+    try:
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Another process created it.
+                assert os.path.isdir(dirname)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((key, results), f, protocol=pickle.HIGHEST_PROTOCOL)
+        if sys.platform == 'win32' and os.path.exists(path):
+            # os.rename doesn't replace files on Windows.
+            os.remove(path)
+        os.rename(tmp_path, path)
+    except (OSError, IOError) as e:
+        _logger.info('Could not save the probe results in %s: %s', path, e)
+
+
 class Compiler(object):
     """
     Meta compiler that offer some generic function.
@@ -1907,6 +2544,13 @@ class GCC_compiler(Compiler):
             )
             detect_march = False
 
+        if detect_march:
+            march_flags_cache = get_probe_result('march_flags')
+            if march_flags_cache is not None:
+                GCC_compiler.march_flags = list(march_flags_cache)
+                detect_march = False
+        save_march_flags = detect_march
+
         if detect_march:
             GCC_compiler.march_flags = []
 
@@ -2126,6 +2770,9 @@ class GCC_compiler(Compiler):
                 if not march_success:
                     GCC_compiler.march_flags = []
 
+        if save_march_flags and GCC_compiler.march_flags:
+            set_probe_result('march_flags', GCC_compiler.march_flags)
+
         # Add the detected -march=native equivalent flags
         if march_flags and GCC_compiler.march_flags:
             cxxflags.extend(GCC_compiler.march_flags)
@@ -2183,15 +2830,29 @@ class GCC_compiler(Compiler):
     @classmethod
     def try_compile_tmp(cls, src_code, tmp_prefix='', flags=(),
                         try_run=False, output=False, comp_args=True):
-        return cls._try_compile_tmp(src_code, tmp_prefix, flags,
-                                    try_run, output, theano.config.cxx,
-                                    comp_args)
+        probe = ('try_compile_tmp', src_code, tuple(flags), try_run, output,
+                 comp_args)
+        res = get_probe_result(probe)
+        if res is None:
+            res = cls._try_compile_tmp(src_code, tmp_prefix, flags,
+                                       try_run, output, theano.config.cxx,
+                                       comp_args)
+            if probe_succeeded(res, try_run):
+                set_probe_result(probe, res)
+        return res
 
     @classmethod
     def try_flags(cls, flag_list, preambule="", body="",
                   try_run=False, output=False, comp_args=True):
-        return cls._try_flags(flag_list, preambule, body, try_run, output,
-                              theano.config.cxx, comp_args)
+        probe = ('try_flags', tuple(flag_list), preambule, body, try_run,
+                 output, comp_args)
+        res = get_probe_result(probe)
+        if res is None:
+            res = cls._try_flags(flag_list, preambule, body, try_run, output,
+                                 theano.config.cxx, comp_args)
+            if probe_succeeded(res, try_run):
+                set_probe_result(probe, res)
+        return res
 
     @staticmethod
     def compile_str(module_name, src_code, location=None,
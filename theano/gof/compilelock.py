@@ -11,9 +11,16 @@ import logging
 from contextlib import contextmanager
 
 import numpy as np
+from six import string_types
 
 from theano import config
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, we always use the global lock there.
+    fcntl = None
+
 random = np.random.RandomState([2015, 8, 2])
 
 _logger = logging.getLogger("theano.gof.compilelock")
@@ -42,6 +49,121 @@ def lock_ctx(lock_dir=None, keep_lock=False, **kw):
         release_lock()
 
 
+def use_module_locks():
+    """
+    Return True if compilations are locked per module instead of globally.
+
+    This is the case when the Theano flag ``compile.lock_granularity`` is
+    'module', the lock is enabled and `fcntl` is available.
+
+    """
+    return (fcntl is not None and
+            config.compile.lock_granularity == 'module' and
+            getattr(get_lock, 'lock_is_enabled', True))
+
+
+@contextmanager
+def module_lock_ctx(module_hashes, keep_lock=False):
+    """
+    Lock the compilation of the modules with the given hashes.
+
+    With per-module locks (see `use_module_locks`), only the given modules
+    are locked, so that other processes can compile other modules in
+    parallel. The locks are always released when leaving the context, so
+    `keep_lock` is ignored. Otherwise, this takes the global lock on the
+    compilation directory, like `lock_ctx`.
+
+    Parameters
+    ----------
+    module_hashes : str or list of str
+        The hash(es) of the module(s) to lock.
+
+    """
+    if not use_module_locks():
+        with lock_ctx(keep_lock=keep_lock):
+            yield
+        return
+    if isinstance(module_hashes, string_types):
+        module_hashes = [module_hashes]
+    locked = []
+    try:
+        # Always lock in the same order to avoid deadlocks.
+        for module_hash in sorted(set(module_hashes)):
+            lock_module(module_hash)
+            locked.append(module_hash)
+        yield
+    finally:
+        for module_hash in reversed(locked):
+            release_module_lock(module_hash)
+
+
+# Maps the path of a module lock file to [file object, number of requests].
+_module_locks = {}
+
+
+def _module_lock_file(module_hash, lock_dir=None):
+    if lock_dir is None:
+        lock_dir = os.path.join(config.compiledir, 'module_locks')
+    return os.path.join(lock_dir, module_hash + '.lock')
+
+
+def lock_module(module_hash, lock_dir=None):
+    """
+    Obtain the lock on the compilation of one module.
+
+    The lock is an exclusive `fcntl.flock` on a file named after the module
+    hash in `lock_dir` (by default 'module_locks' in the compilation
+    directory). Waiting processes are woken up as soon as the lock is
+    released, and the lock is released by the OS if its owner dies. The lock
+    is re-entrant within a process.
+
+    Lock files are never deleted, as this would let two processes lock
+    different files for the same module.
+
+    """
+    lock_file = _module_lock_file(module_hash, lock_dir)
+    if lock_file in _module_locks:
+        _module_locks[lock_file][1] += 1
+        return
+    base_lock = os.path.dirname(lock_file)
+    if not os.path.isdir(base_lock):
+        try:
+            os.makedirs(base_lock)
+        except OSError:
+            # Someone else was probably trying to create it at the same time.
+            if not os.path.isdir(base_lock):
+                raise
+    f = open(lock_file, 'a')
+    try:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            _logger.info("Waiting for the lock on module %s (I am process "
+                         "'%s')", module_hash, os.getpid())
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    except Exception:
+        f.close()
+        raise
+    _module_locks[lock_file] = [f, 1]
+
+
+def release_module_lock(module_hash, lock_dir=None):
+    """
+    Release the lock on the compilation of one module.
+
+    """
+    lock_file = _module_lock_file(module_hash, lock_dir)
+    lock_info = _module_locks[lock_file]
+    lock_info[1] -= 1
+    if lock_info[1] == 0:
+        del _module_locks[lock_file]
+        f = lock_info[0]
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+
 # We define this name with an underscore so that python shutdown
 # deletes this before non-underscore names (like os).  We need to do
 # it this way to avoid errors on shutdown.
@@ -180,6 +180,136 @@ def _contains_cycle(fgraph, orderings):
     return visited != len(parent_counts)
 
 
+class _TopoOrder(object):
+    """
+    Topological order of the Apply nodes of a graph, maintained while edges
+    are added and removed.
+
+    This is the algorithm of Pearce and Kelly ("A dynamic topological sort
+    algorithm for directed acyclic graphs", 2006). Each node has an index,
+    and for each edge u -> v, ord[u] < ord[v]. Removing an edge keeps the
+    order valid. When adding an edge u -> v with ord[u] > ord[v], only the
+    nodes with an index between ord[v] and ord[u] that are reachable from v,
+    or that reach u, are visited and reordered. If u is reachable from v,
+    the edge would make a cycle: it is kept aside in `pending` until it is
+    removed, or until the edges making the cycle are.
+
+    Several edges can link the same nodes (e.g. a node using the same
+    variable twice), so the edges are counted.
+
+    """
+
+    def __init__(self):
+        self.ord = {}
+        # node -> {successor: number of edges}
+        self.succ = {}
+        # node -> set of predecessors
+        self.pred = {}
+        # (u, v) -> number of edges, for the edges that make a cycle
+        self.pending = OrderedDict()
+        self.next_ord = 0
+
+    def add_node(self, node):
+        self.ord[node] = self.next_ord
+        self.next_ord += 1
+        self.succ[node] = {}
+        self.pred[node] = set()
+
+    def remove_node(self, node):
+        for p in self.pred.pop(node):
+            del self.succ[p][node]
+        for s in self.succ.pop(node):
+            self.pred[s].discard(node)
+        del self.ord[node]
+        if self.pending:
+            for e in [e for e in self.pending if node in e]:
+                del self.pending[e]
+
+    def add_edge(self, u, v):
+        """
+        Add the edge u -> v. Return False if it makes a cycle.
+
+        """
+        succ_u = self.succ[u]
+        if v in succ_u:
+            succ_u[v] += 1
+            return True
+        if (u, v) in self.pending:
+            self.pending[(u, v)] += 1
+            return False
+        if not self._insert(u, v, 1):
+            self.pending[(u, v)] = 1
+            return False
+        return True
+
+    def remove_edge(self, u, v):
+        if (u, v) in self.pending:
+            self.pending[(u, v)] -= 1
+            if not self.pending[(u, v)]:
+                del self.pending[(u, v)]
+            return
+        succ_u = self.succ.get(u)
+        if succ_u is None or v not in succ_u:
+            # One of the nodes was already removed.
+            return
+        succ_u[v] -= 1
+        if not succ_u[v]:
+            del succ_u[v]
+            self.pred[v].discard(u)
+
+    def retry_pending(self):
+        """
+        Try again to add the edges that made a cycle. Return False if some
+        still do.
+
+        """
+        for (u, v), count in list(self.pending.items()):
+            if self._insert(u, v, count):
+                del self.pending[(u, v)]
+        return not self.pending
+
+    def _insert(self, u, v, count):
+        if u is v:
+            return False
+        ord = self.ord
+        lb = ord[v]
+        ub = ord[u]
+        if lb < ub:
+            # The nodes reachable from v that must move after u.
+            forward = []
+            seen = set([v])
+            stack = [v]
+            while stack:
+                n = stack.pop()
+                forward.append(n)
+                for s in self.succ[n]:
+                    if s is u:
+                        return False
+                    if s not in seen and ord[s] < ub:
+                        seen.add(s)
+                        stack.append(s)
+            # The nodes that reach u and must move before v.
+            backward = []
+            seen = set([u])
+            stack = [u]
+            while stack:
+                n = stack.pop()
+                backward.append(n)
+                for p in self.pred[n]:
+                    if p not in seen and ord[p] > lb:
+                        seen.add(p)
+                        stack.append(p)
+            backward.sort(key=ord.get)
+            forward.sort(key=ord.get)
+            nodes = backward + forward
+            indices = sorted(ord[n] for n in nodes)
+            for n, i in zip(nodes, indices):
+                ord[n] = i
+        self.succ[u][v] = count
+        self.pred[v].add(u)
+        return True
+
+
 def _build_droot_impact(destroy_handler):
     droot = {}   # destroyed view + nonview variables -> foundation
     impact = {}  # destroyed nonview variable -> it + all views of it
@@ -653,7 +783,8 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
 
     It is a work in progress. The following data structures have been
     converted to use the incremental strategy:
-        <none>
+        the topological order of the nodes (with the orderings) used to
+        detect cycles (see `_TopoOrder`)
 
     The following data structures remain to be converted:
         <unknown>
@@ -738,6 +869,11 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
         # clients: how many times does an apply use a given variable
         self.clients = OrderedDict()  # variable -> apply -> ninputs
         self.stale_droot = True
+        # Topological order of the nodes, with the edges of the orderings
+        # of the last validation.
+        self.topo_order = _TopoOrder()
+        self.order_edges = OrderedSet()
+        self.order_nodes = set()
 
         self.debug_all_apps = OrderedSet()
         if self.do_imports_on_attach:
@@ -772,6 +908,9 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
         del self.view_o
         del self.clients
         del self.stale_droot
+        del self.topo_order
+        del self.order_edges
+        del self.order_nodes
         assert self.fgraph.destroyer_handler is self
         delattr(self.fgraph, 'destroyers')
         delattr(self.fgraph, 'destroy_handler')
@@ -811,6 +950,12 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
         for i, output in enumerate(app.outputs):
             self.clients.setdefault(output, OrderedDict())
 
+        # update self.topo_order
+        self.topo_order.add_node(app)
+        for input in app.inputs:
+            if input.owner:
+                self.topo_order.add_edge(input.owner, app)
+
         self.stale_droot = True
 
     def on_prune(self, fgraph, app, reason):
@@ -822,6 +967,13 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
             raise ProtocolError("prune without import")
         self.debug_all_apps.remove(app)
 
+        # UPDATE self.topo_order
+        self.topo_order.remove_node(app)
+        if app in self.order_nodes:
+            self.order_edges = OrderedSet(e for e in self.order_edges
+                                          if app not in e)
+            self.order_nodes.discard(app)
+
         # UPDATE self.clients
         for i, input in enumerate(OrderedSet(app.inputs)):
             del self.clients[input][app]
@@ -871,6 +1023,12 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
             self.clients.setdefault(new_r, OrderedDict()).setdefault(app, 0)
             self.clients[new_r][app] += 1
 
+            # UPDATE self.topo_order
+            if old_r.owner:
+                self.topo_order.remove_edge(old_r.owner, app)
+            if new_r.owner:
+                self.topo_order.add_edge(new_r.owner, app)
+
             # UPDATE self.view_i, self.view_o
             for o_idx, i_idx_list in iteritems(getattr(app.op, 'view_map',
                                                        OrderedDict())):
@@ -904,8 +1062,13 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
         """
         if self.destroyers:
             ords = self.orderings(fgraph)
+        else:
+            ords = {}
+        self._update_order_edges(ords)
 
-            if _contains_cycle(fgraph, ords):
+        if self.destroyers:
+            topo_order = self.topo_order
+            if topo_order.pending and not topo_order.retry_pending():
                 raise InconsistencyError("Dependency graph contains cycles")
         else:
             # James's Conjecture:
@@ -921,6 +1084,30 @@ class DestroyHandler(toolbox.Bookkeeper):  # noqa
             pass
         return True
 
+    def _update_order_edges(self, ords):
+        """
+        Replace the edges of the previous orderings by those of `ords` in
+        self.topo_order.
+
+        """
+        new_edges = OrderedSet()
+        for app, prereqs in iteritems(ords):
+            for prereq in prereqs:
+                new_edges.add((prereq, app))
+        old_edges = self.order_edges
+        topo_order = self.topo_order
+        for u, v in old_edges:
+            if (u, v) not in new_edges:
+                topo_order.remove_edge(u, v)
+        for u, v in new_edges:
+            if (u, v) not in old_edges:
+                topo_order.add_edge(u, v)
+        self.order_edges = new_edges
+        self.order_nodes = set()
+        for u, v in new_edges:
+            self.order_nodes.add(u)
+            self.order_nodes.add(v)
+
     def orderings(self, fgraph):
         """
         Return orderings induced by destructive operations.
@@ -670,6 +670,24 @@ class FunctionGraph(utils.object2):
             ords[node] = list(OrderedSet(prereqs))
         return ords
 
+    def structural_hash(self):
+        """
+        Return a structural hash of the graph.
+
+        Two graphs that compute the same thing from their inputs, in the
+        sense of `theano.scan_module.scan_utils.equal_computations`, have
+        the same hash, whatever the identity or the names of their
+        variables. See `theano.gof.graph.graph_hash`.
+
+        The first call attaches a `toolbox.StructuralHasher` that keeps the
+        hashes up to date while the graph is modified, so the next calls
+        are cheap.
+
+        """
+        if not hasattr(self, 'structural_hasher'):
+            self.attach_feature(toolbox.StructuralHasher())
+        return self.structural_hasher.graph_hash(self)
+
     def check_integrity(self):
         """
         Call this for a diagnosis if things go awry.
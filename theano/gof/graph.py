@@ -1105,6 +1105,67 @@ def io_connection_pattern(inputs, outputs):
     return global_connection_pattern
 
 
+def leaf_hash(variable, index=None):
+    """
+    Return the structural hash of a Variable without owner.
+
+    Inputs of the graph are hashed from their position `index` and their
+    type, constants from their signature and other orphans from their type
+    only.
+
+    """
+    if index is not None:
+        return hash(('input', index, variable.type))
+    if isinstance(variable, Constant):
+        try:
+            return hash(('constant', variable.signature()))
+        except TypeError:
+            # Not all signatures are hashable.
+            return hash(('constant', variable.type))
+    return hash(('orphan', variable.type))
+
+
+def apply_hash(node, input_hashes):
+    """
+    Return the structural hashes of the outputs of `node`, given the
+    structural hashes of its inputs.
+
+    """
+    h = hash((node.op, tuple(input_hashes)))
+    return [hash((h, i, out.type)) for i, out in enumerate(node.outputs)]
+
+
+def graph_hash(inputs, outputs):
+    """
+    Return a structural hash of the computation of `outputs` from `inputs`.
+
+    The hash of a variable only depends on the Op and the hashes of the
+    inputs of its owner, on its type and, for constants, on their
+    signature. It does thus not depend on the identity, the names or the
+    creation order of the variables, and two graphs for which
+    `theano.scan_module.scan_utils.equal_computations` returns True have
+    the same hash. The reverse is not true, so this is meant to quickly
+    tell graphs apart, not to prove that they are the same.
+
+    Like `hash`, the result is not stable across processes.
+
+    See Also
+    --------
+    FunctionGraph.structural_hash : the incremental version.
+
+    """
+    hashes = dict((var, leaf_hash(var, i)) for i, var in enumerate(inputs))
+    for node in io_toposort(inputs, outputs):
+        for var in node.inputs:
+            if var not in hashes:
+                hashes[var] = leaf_hash(var)
+        for out, h in zip(node.outputs,
+                          apply_hash(node, [hashes[v] for v in node.inputs])):
+            hashes[out] = h
+    return hash(tuple(hashes[o] if o in hashes else leaf_hash(o)
+                      for o in outputs))
+
+
 def is_same_graph(var1, var2, givens=None, debug=False):
     """
     Return True iff Variables `var1` and `var2` perform the same computation.
@@ -36,6 +36,38 @@ def _list_of_nodes(fgraph):
     return list(graph.io_toposort(fgraph.inputs, fgraph.outputs))
 
 
+def _profile_name(opt):
+    """
+    Return the name under which `opt` appears in the profile dicts.
+
+    """
+    name = getattr(opt, '__name__', None) or getattr(opt, 'name', None)
+    if name:
+        return str(name)
+    return opt.__class__.__name__
+
+
+def _callbacks_dict(callbacks_time):
+    """
+    Return the time spent in each feature callback, keyed by the feature.
+
+    """
+    return dict((str(k), v) for k, v in iteritems(callbacks_time) if v > 0)
+
+
+def sub_profile_to_dict(opt, prof):
+    """
+    Return the profile of `opt` as a dict, or None if `opt` can't convert it.
+
+    """
+    if not prof:
+        return None
+    try:
+        return opt.profile_to_dict(prof)
+    except NotImplementedError:
+        return None
+
+
 class Optimizer(object):
     """
 
@@ -121,6 +153,18 @@ class Optimizer(object):
                 "The function print_profile must be overrided if the"
                 " optimizer return profiling information.")
 
+    @staticmethod
+    def profile_to_dict(prof):
+        """
+        Return the profile returned by `apply` as a dict of numbers,
+        strings, lists and dicts, that can be saved as JSON.
+
+        """
+        if prof is not None:
+            raise NotImplementedError(
+                "The function profile_to_dict must be overrided if the"
+                " optimizer return profiling information.")
+
 
 class FromFunctionOptimizer(Optimizer):
     """
@@ -339,6 +383,36 @@ class SeqOptimizer(Optimizer, list):
                                       level=level + 1)
         print(file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        (opts, prof, validate_time, callback_time,
+         nb_node_before, nb_node_after, sub_profs, sub_validate_time,
+         nb_nodes, callbacks_time) = prof
+        optimizers = []
+        for i, (opt, t, nb_n, sub_prof) in enumerate(zip(opts, prof, nb_nodes,
+                                                         sub_profs)):
+            if sub_validate_time:
+                val_time = sub_validate_time[i + 1] - sub_validate_time[i]
+            else:
+                val_time = None
+            optimizers.append({
+                'name': _profile_name(opt),
+                'class': opt.__class__.__name__,
+                'time': t,
+                'nodes_before': nb_n[0],
+                'nodes_after': nb_n[1],
+                'validate_time': val_time,
+                'profile': sub_profile_to_dict(opt, sub_prof)})
+        return {'class': 'SeqOptimizer',
+                'name': _profile_name(opts),
+                'time': sum(prof),
+                'nodes_before': nb_node_before,
+                'nodes_after': nb_node_after,
+                'validate_time': validate_time,
+                'callback_time': callback_time,
+                'callbacks_time': _callbacks_dict(callbacks_time),
+                'optimizers': optimizers}
+
     @staticmethod
     def merge_profile(prof1, prof2):
         """
@@ -908,6 +982,19 @@ class MergeOptimizer(Optimizer):
                     # just print i.
                     print(blanc, "      ", i[0], ',', i[1], file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        (nb_fail, replace_time, validate_time,
+         callback_time, callbacks_time, nb_merged, nb_constant) = prof
+        return {'class': 'MergeOptimizer',
+                'time': replace_time,
+                'nb_fail': nb_fail,
+                'nb_merged': nb_merged,
+                'nb_constant': nb_constant,
+                'validate_time': validate_time,
+                'callback_time': callback_time,
+                'callbacks_time': _callbacks_dict(callbacks_time)}
+
     @staticmethod
     def merge_profile(prof1, prof2):
         def merge_none_number(v1, v2):
@@ -1368,6 +1455,22 @@ class LocalOptGroup(LocalOptimizer):
 
         print(file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        (time_opts, process_count, applied_true, node_created, profile) = prof
+        if not profile:
+            return None
+        local_optimizers = [{'name': str(o),
+                             'time': time_opts[o],
+                             'applied': applied_true[o],
+                             'tried': count,
+                             'node_created': node_created[o]}
+                            for o, count in iteritems(process_count)]
+        local_optimizers.sort(key=lambda lo: (-lo['time'], lo['name']))
+        return {'class': 'LocalOptGroup',
+                'time': sum(time_opts.values()),
+                'local_optimizers': local_optimizers}
+
     def merge_profile(prof1, prof2):
         raise NotImplementedError
 
@@ -2070,6 +2173,27 @@ class TopoOptimizer(NavigatorOptimizer):
                                             lopt.profile),
                                    level=level + 1)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        if prof is None:
+            return None
+        (opt, nb, nb_nodes_start, nb_nodes_end,
+         io_t, loop_t, callback_time, lopt) = prof
+        rval = {'class': 'TopoOptimizer',
+                'name': _profile_name(opt),
+                'time': io_t + loop_t,
+                'nodes_before': nb_nodes_start,
+                'nodes_after': nb_nodes_end,
+                'nb_changed': nb,
+                'io_toposort_time': io_t,
+                'loop_time': loop_t,
+                'callback_time': callback_time}
+        if isinstance(lopt, LocalOptGroup) and lopt.profile:
+            rval['local_optimizers'] = lopt.profile_to_dict(
+                (lopt.time_opts, lopt.process_count, lopt.applied_true,
+                 lopt.node_created, lopt.profile))['local_optimizers']
+        return rval
+
     def __str__(self):
         return getattr(self, '__name__',
                        '<TopoOptimizer instance>')
@@ -2227,6 +2351,11 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         They must not traverse the graph as they are called very frequently.
         The MergeOptimizer is one example of optimization that respect this.
         They are applied after all global optimizer, then when one local optimizer is applied, then after all final optimizer.
+    worklist
+        If True, the local optimizers are applied on all the nodes only
+        during the first iteration. After that, they are only applied on
+        the nodes that were added to the graph, or whose inputs changed,
+        since they were last visited. If None, use config.optdb.worklist.
 
     """
 
@@ -2237,7 +2366,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                  tracks_on_change_inputs=False,
                  max_use_ratio=None,
                  final_optimizers=None,
-                 cleanup_optimizers=None):
+                 cleanup_optimizers=None,
+                 worklist=None):
         super(EquilibriumOptimizer, self).__init__(
             None,
             ignore_newtrees=ignore_newtrees,
@@ -2265,6 +2395,9 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         self.max_use_ratio = max_use_ratio
         assert self.max_use_ratio is not None, (
             'max_use_ratio has to be a number')
+        if worklist is None:
+            worklist = config.optdb.worklist
+        self.worklist = worklist
 
     def get_local_optimizers(self):
         for opt in self.local_optimizers_all:
@@ -2312,6 +2445,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         io_toposort_timing = []
         nb_nodes = []
         node_created = {}
+        node_tried = {}
         global_sub_profs = []
         final_sub_profs = []
         cleanup_sub_profs = []
@@ -2322,6 +2456,62 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             global_process_count.setdefault(opt, 0)
             time_opts.setdefault(opt, 0)
             node_created.setdefault(opt, 0)
+            node_tried.setdefault(opt, 0)
+
+        if self.worklist:
+            # The nodes added or whose inputs changed since the local
+            # optimizers were last applied on them. Only those are visited
+            # after the first iteration.
+            worklist = OrderedSet()
+            # A label of each node, greater than the labels of the owners of
+            # its inputs. Sorting the worklist by label thus gives a
+            # topological order, without sorting the whole graph.
+            depth = {}
+
+            def set_depth(node):
+                depth[node] = 1 + max([depth.get(i.owner, 0)
+                                       for i in node.inputs] or [0])
+
+            def raise_depth(node):
+                # Restore the order after an input of node changed.
+                stack = [node]
+                while stack:
+                    n = stack.pop()
+                    for output in n.outputs:
+                        for client, i in output.clients:
+                            if (client != 'output' and
+                                    depth.get(client, 0) <= depth[n]):
+                                depth[client] = depth[n] + 1
+                                stack.append(client)
+
+            def worklist_add(node):
+                # The local optimizers also look at the inputs and the
+                # clients of the node they are applied on, so these nodes
+                # are visited again too.
+                set_depth(node)
+                worklist.add(node)
+                for input in node.inputs:
+                    if input.owner:
+                        worklist.add(input.owner)
+                for output in node.outputs:
+                    for client, i in output.clients:
+                        if client != 'output':
+                            worklist.add(client)
+
+            def worklist_prune(node):
+                worklist.discard(node)
+                depth.pop(node, None)
+
+            def worklist_chin(node, i, r, new_r, reason):
+                if not isinstance(node, str):
+                    worklist_add(node)
+                    raise_depth(node)
+                    if r.owner and r.owner in fgraph.apply_nodes:
+                        worklist.add(r.owner)
+            worklist_updater = Updater(worklist_add, worklist_prune,
+                                       worklist_chin,
+                                       name=getattr(self, 'name', None))
+            fgraph.attach_feature(worklist_updater)
 
         def apply_cleanup(profs_dict):
             changed = False
@@ -2377,28 +2567,44 @@ class EquilibriumOptimizer(NavigatorOptimizer):
 
             # apply local optimizer
             topo_t0 = time.time()
-            q = deque(graph.io_toposort(fgraph.inputs, start_from))
-            io_toposort_timing.append(time.time() - topo_t0)
+            if self.worklist and loop_timing:
+                # Visit the nodes of the worklist in topological order.
+                q = sorted(worklist, key=lambda n: depth.get(n, 0))
+                max_nb_nodes = max(max_nb_nodes, len(fgraph.apply_nodes))
+            else:
+                q = graph.io_toposort(fgraph.inputs, start_from)
+                max_nb_nodes = max(max_nb_nodes, len(q))
+                if self.worklist:
+                    for node in q:
+                        set_depth(node)
+            max_use = max_nb_nodes * self.max_use_ratio
+            if self.worklist:
+                q = OrderedSet(q)
+                push = q.add
 
+                def pruner(node):
+                    q.discard(node)
+            else:
+                q = deque(q)
+                push = q.append
+
+                def pruner(node):
+                    if node is not current_node:
+                        try:
+                            q.remove(node)
+                        except ValueError:
+                            pass
+            io_toposort_timing.append(time.time() - topo_t0)
             nb_nodes.append(len(q))
-            max_nb_nodes = max(max_nb_nodes, len(q))
-            max_use = max_nb_nodes * self.max_use_ratio
 
             def importer(node):
                 if node is not current_node:
-                    q.append(node)
-
-            def pruner(node):
-                if node is not current_node:
-                    try:
-                        q.remove(node)
-                    except ValueError:
-                        pass
+                    push(node)
             chin = None
             if self.tracks_on_change_inputs:
                 def chin(node, i, r, new_r, reason):
                     if node is not current_node and not isinstance(node, str):
-                        q.append(node)
+                        push(node)
             u = self.attach_updater(fgraph, importer, pruner,
                                     chin=chin,
                                     name=getattr(self, 'name', None))
@@ -2406,6 +2612,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                 while q:
                     node = q.pop()
                     current_node = node
+                    if self.worklist:
+                        worklist.discard(node)
 
                     for lopt in (self.local_optimizers_all +
                                  self.local_optimizers_map.get(type(node.op), []) +
@@ -2414,6 +2622,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                         t_opt = time.time()
                         lopt_change = self.process_node(fgraph, node, lopt)
                         time_opts[lopt] += time.time() - t_opt
+                        node_tried[lopt] += 1
                         if not lopt_change:
                             continue
                         process_count.setdefault(lopt, 0)
@@ -2472,6 +2681,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
 
         end_nb_nodes = len(fgraph.apply_nodes)
 
+        if self.worklist:
+            fgraph.remove_feature(worklist_updater)
         if max_use_abort:
             _logger.error("EquilibriumOptimizer max'ed out by '%s'" % opt_name +
                           ". You can safely raise the current threshold of " +
@@ -2489,7 +2700,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                 (start_nb_nodes, end_nb_nodes, max_nb_nodes),
                 global_opt_timing, nb_nodes, time_opts, io_toposort_timing,
                 node_created, global_sub_profs, final_sub_profs,
-                cleanup_sub_profs)
+                cleanup_sub_profs, node_tried)
 
     def print_summary(self, stream=sys.stdout, level=0, depth=-1):
         name = getattr(self, 'name', None)
@@ -2506,7 +2717,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
          (start_nb_nodes, end_nb_nodes, max_nb_nodes),
          global_opt_timing, nb_nodes, time_opts, io_toposort_timing,
          node_created, global_sub_profs, final_sub_profs,
-         cleanup_sub_profs) = prof
+         cleanup_sub_profs, node_tried) = prof
 
         blanc = ('    ' * level)
         print(blanc, "EquilibriumOptimizer", end=' ', file=stream)
@@ -2514,6 +2725,9 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                              getattr(opt, "__name__", "")), file=stream)
         print(blanc, "  time %.3fs for %d passes" % (
             sum(loop_timing), len(loop_timing)), file=stream)
+        if getattr(opt, 'worklist', False):
+            print(blanc, "  worklist: %d nodes visited" % sum(nb_nodes),
+                  file=stream)
         print(blanc, "  nb nodes (start, end,  max) %d %d %d" % (
             start_nb_nodes, end_nb_nodes, max_nb_nodes), file=stream)
         print(blanc, "  time io_toposort %.3fs" % sum(
@@ -2558,26 +2772,29 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         for o, count in iteritems(process_count):
             if count > 0:
                 count_opt.append((time_opts[o], count,
+                                  node_tried.get(o, 0),
                                   node_created[o], o))
             else:
-                not_used.append((time_opts[o], o))
+                not_used.append((time_opts[o], node_tried.get(o, 0), o))
                 not_used_time += time_opts[o]
 
         if count_opt:
             print(blanc,
-                  '  times - times applied - nb node created - name:',
+                  '  times - times applied - nodes tried - nb node created'
+                  ' - name:',
                   file=stream)
-            count_opt.sort()
-            for (t, count, n_created, o) in count_opt[::-1]:
-                print(blanc, '  %.3fs - %d - %d - %s' % (
-                    t, count, n_created, o), file=stream)
+            count_opt.sort(key=lambda co: (co[:4], str(co[4])))
+            for (t, count, n_tried, n_created, o) in count_opt[::-1]:
+                print(blanc, '  %.3fs - %d - %d - %d - %s' % (
+                    t, count, n_tried, n_created, o), file=stream)
             print(blanc, '  %.3fs - in %d optimization that were not used (display only those with a runtime > 0)' % (
                 not_used_time, len(not_used)), file=stream)
-            not_used.sort(key=lambda nu: (nu[0], str(nu[1])))
-            for (t, o) in not_used[::-1]:
+            not_used.sort(key=lambda nu: (nu[0], nu[1], str(nu[2])))
+            for (t, n_tried, o) in not_used[::-1]:
                 if t > 0:
                     # Skip opt that have 0 times, they probably wasn't even tried.
-                    print(blanc + "  ", '  %.3fs - %s' % (t, o), file=stream)
+                    print(blanc + "  ", '  %.3fs - %d - %s' % (
+                        t, n_tried, o), file=stream)
             print(file=stream)
         gf_opts = [o for o in (opt.global_optimizers +
                                list(opt.final_optimizers) +
@@ -2605,6 +2822,62 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                 except NotImplementedError:
                     print(blanc, "merge not implemented for ", o)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        (opt, loop_timing, loop_process_count,
+         (start_nb_nodes, end_nb_nodes, max_nb_nodes),
+         global_opt_timing, nb_nodes, time_opts, io_toposort_timing,
+         node_created, global_sub_profs, final_sub_profs,
+         cleanup_sub_profs, node_tried) = prof
+
+        process_count = {}
+        for count in loop_process_count:
+            for o, v in iteritems(count):
+                process_count[o] = process_count.get(o, 0) + v
+        optimizers = []
+        for kind, opts in [('local', opt.get_local_optimizers()),
+                           ('global', opt.global_optimizers),
+                           ('final', opt.final_optimizers),
+                           ('cleanup', opt.cleanup_optimizers)]:
+            for o in opts:
+                optimizers.append({'name': str(o),
+                                   'kind': kind,
+                                   'time': time_opts.get(o, 0),
+                                   'applied': process_count.get(o, 0),
+                                   'tried': node_tried.get(o, 0),
+                                   'node_created': node_created.get(o, 0)})
+        optimizers.sort(key=lambda o: (-o['time'], o['name']))
+
+        sub_profiles = []
+        for kind, opts, sub_profs in [
+                ('global', opt.global_optimizers, global_sub_profs),
+                ('final', opt.final_optimizers, final_sub_profs),
+                ('cleanup', opt.cleanup_optimizers, cleanup_sub_profs)]:
+            for i, profs in enumerate(sub_profs):
+                for o, sub_prof in zip(opts, profs):
+                    d = sub_profile_to_dict(o, sub_prof)
+                    if d is not None:
+                        sub_profiles.append({'name': _profile_name(o),
+                                             'kind': kind,
+                                             'iteration': i,
+                                             'profile': d})
+        return {'class': 'EquilibriumOptimizer',
+                'name': _profile_name(opt),
+                'time': sum(loop_timing),
+                'worklist': bool(getattr(opt, 'worklist', False)),
+                'nodes_before': start_nb_nodes,
+                'nodes_after': end_nb_nodes,
+                'nodes_max': max_nb_nodes,
+                'io_toposort_time': sum(io_toposort_timing),
+                'loops': [{'time': loop_timing[i],
+                           'applied': sum(loop_process_count[i].values()),
+                           'global_opt_time': global_opt_timing[i],
+                           'io_toposort_time': io_toposort_timing[i],
+                           'nodes': nb_nodes[i]}
+                          for i in range(len(loop_timing))],
+                'optimizers': optimizers,
+                'sub_profiles': sub_profiles}
+
     @staticmethod
     def merge_profile(prof1, prof2):
         # (opt, loop_timing, loop_process_count, max_nb_nodes,
@@ -2621,7 +2894,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             local_optimizers.union(global_optimizers),
             max_use_ratio=1,
             final_optimizers=final_optimizers,
-            cleanup_optimizers=cleanup_optimizers)
+            cleanup_optimizers=cleanup_optimizers,
+            worklist=prof1[0].worklist and prof2[0].worklist)
 
         def add_append_list(l1, l2):
             l = copy.copy(l1)
@@ -2692,6 +2966,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         assert len(loop_timing) == max(len(prof1[1]), len(prof2[1]))
 
         node_created = merge_dict(prof1[8], prof2[8])
+        node_tried = merge_dict(prof1[12], prof2[12])
         return (new_opt,
                 loop_timing,
                 loop_process_count,
@@ -2703,7 +2978,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                 node_created,
                 global_sub_profs,
                 final_sub_profs,
-                cleanup_sub_profs)
+                cleanup_sub_profs,
+                node_tried)
 
 #################
 #   Utilities   #
@@ -1,7 +1,8 @@
 from __future__ import absolute_import, print_function, division
 from collections import defaultdict
+import numpy
 from six import iteritems
-from theano.gof.graph import list_of_nodes
+from theano.gof.graph import Constant, list_of_nodes
 from theano.compat import cmp
 
 # {{{ http://code.activestate.com/recipes/578231/ (r1)
@@ -274,3 +275,125 @@ def key_to_cmp(key):
     def key_cmp(a, b):
         return cmp(key(a), key(b))
     return key_cmp
+
+
+def estimate_size(fgraph, var, unknown_dim=100):
+    """
+    Guess the size in bytes of the value of `var`.
+
+    The shape is taken from the ShapeFeature of `fgraph` when it is
+    constant. The dimensions of unknown length are supposed to be of length
+    `unknown_dim`. Variables without dtype or ndim count as 0 bytes.
+
+    """
+    dtype = getattr(var.type, 'dtype', None)
+    ndim = getattr(var.type, 'ndim', None)
+    if dtype is None or ndim is None:
+        return 0
+    try:
+        size = numpy.dtype(dtype).itemsize
+    except TypeError:
+        return 0
+    shape = None
+    shape_feature = getattr(fgraph, 'shape_feature', None)
+    if shape_feature is not None:
+        shape = shape_feature.shape_of.get(var)
+    broadcastable = getattr(var.type, 'broadcastable', (False,) * ndim)
+    for i in range(ndim):
+        if broadcastable[i]:
+            continue
+        if shape is not None and isinstance(shape[i], Constant):
+            size *= int(shape[i].data)
+        else:
+            size *= unknown_dim
+    return size
+
+
+def memory_schedule(fgraph, size=estimate_size):
+    """
+    Order the nodes of `fgraph` so as to keep the peak memory usage low.
+
+    This is a greedy list scheduling: among the nodes whose inputs are
+    computed, execute first the one that increases the allocated memory the
+    least, counting the memory it allocates for its outputs minus the memory
+    of its inputs that it is the last one to use. Views and inplace outputs
+    don't allocate memory and keep the memory they alias alive. Ties are
+    broken by the order of `fgraph.toposort()`, so that graphs without
+    anything to gain keep their usual order.
+
+    Unlike the search done by the profiler for the minimal peak, this is
+    linear in the number of nodes times the number of nodes that can be
+    executed at each step, so it can be used on big graphs.
+
+    Parameters
+    ----------
+    fgraph
+        The FunctionGraph to schedule. The orderings of its features, like
+        the DestroyHandler, are respected.
+    size
+        Function taking `fgraph` and a variable and returning the estimated
+        size of its value in bytes.
+
+    """
+    default_order = fgraph.toposort()
+    position = dict((node, i) for i, node in enumerate(default_order))
+    ords = fgraph.orderings()
+    outputs = set(fgraph.outputs)
+
+    n_missing = {}
+    successors = defaultdict(list)
+    for node in default_order:
+        preds = set(var.owner for var in node.inputs if var.owner)
+        preds.update(ords.get(node, []))
+        n_missing[node] = len(preds)
+        for pred in preds:
+            successors[pred].append(node)
+
+    # Map each variable to the variables owning the memory it uses, and
+    # count the nodes that still have to use the memory of each variable.
+    origins = {}
+    n_users = defaultdict(int)
+    allocated = {}
+    for node in default_order:
+        dmap = getattr(node.op, 'destroy_map', None) or {}
+        vmap = getattr(node.op, 'view_map', None) or {}
+        for i, out in enumerate(node.outputs):
+            aliased = list(dmap.get(i, [])) + list(vmap.get(i, []))
+            if aliased:
+                origins[out] = set()
+                for j in aliased:
+                    var = node.inputs[j]
+                    origins[out].update(origins.get(var, [var]))
+            else:
+                origins[out] = set([out])
+                allocated[out] = size(fgraph, out)
+        for origin in set(o for var in node.inputs
+                          for o in origins.get(var, [])):
+            n_users[origin] += 1
+    # The memory of outputs and what they alias is never freed.
+    for out in outputs:
+        for origin in origins.get(out, []):
+            n_users[origin] += 1
+
+    def cost(node):
+        freed = sum(allocated.get(origin, 0)
+                    for origin in set(o for var in node.inputs
+                                      for o in origins.get(var, []))
+                    if n_users[origin] == 1)
+        return sum(allocated.get(out, 0) for out in node.outputs) - freed
+
+    ready = [node for node in default_order if not n_missing[node]]
+    order = []
+    while ready:
+        node = min(ready, key=lambda n: (cost(n), position[n]))
+        ready.remove(node)
+        order.append(node)
+        for origin in set(o for var in node.inputs
+                          for o in origins.get(var, [])):
+            n_users[origin] -= 1
+        for succ in successors[node]:
+            n_missing[succ] -= 1
+            if not n_missing[succ]:
+                ready.append(succ)
+    assert len(order) == len(default_order)
+    return order
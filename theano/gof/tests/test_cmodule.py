@@ -6,9 +6,18 @@ deterministic based on the input type and the op.
 """
 from __future__ import absolute_import, print_function, division
 
+import os
+import shutil
+import tempfile
+import uuid
+
 import numpy
+from nose.plugins.skip import SkipTest
 
 import theano
+from theano.configparser import change_flags
+from theano.gof.cc import get_module_cache, precompile_nodes
+from theano.gof import cmodule
 from theano.gof.cmodule import GCC_compiler
 
 
@@ -69,3 +78,248 @@ def test_flag_detection():
     # but was not detected because that path is not usually taken,
     # so we test it here directly.
     GCC_compiler.try_flags(["-lblas"])
+
+
+def test_probe_cache():
+    compiledir = tempfile.mkdtemp()
+    cmodule._probe_results.clear()
+    try:
+        probe = ('test_probe_cache', uuid.uuid4().hex)
+        assert cmodule.get_probe_result(probe, compiledir) is None
+        cmodule.set_probe_result(probe, [1, 2], compiledir)
+        assert cmodule.get_probe_result(probe, compiledir) == [1, 2]
+        assert cmodule.get_probe_result(probe) is None
+        # Read the saved results again, like a new process does.
+        cmodule._probe_results.clear()
+        assert cmodule.get_probe_result(probe, compiledir) == [1, 2]
+        # The results are not used by processes with another key.
+        with change_flags(**{'gcc.cxxflags': '-DTEST_PROBE_CACHE'}):
+            assert cmodule.get_probe_result(probe, compiledir) is None
+        with change_flags(**{'cmodule.cache_probes': False}):
+            assert cmodule.get_probe_result(probe, compiledir) is None
+    finally:
+        cmodule._probe_results.clear()
+        shutil.rmtree(compiledir)
+
+
+def test_failed_probe_not_saved():
+    if not theano.config.cxx:
+        raise SkipTest("G++ not available, so we need to skip this test.")
+    flags = ['-DTEST_FAILED_PROBE_%s' % uuid.uuid4().hex]
+    preambule = '#error "This probe fails"'
+    assert not cmodule.GCC_compiler.try_flags(flags, preambule=preambule)
+    probe = ('try_flags', tuple(flags), preambule, "", False, False, True)
+    assert cmodule.get_probe_result(probe) is None
+
+
+def test_module_index():
+    dirname = tempfile.mkdtemp()
+    try:
+        keys = []
+        key_pkls = []
+        for i in range(3):
+            root = os.path.join(dirname, 'tmp%d' % i)
+            os.mkdir(root)
+            entry = os.path.join(root, 'mod%d.so' % i)
+            open(entry, 'w').close()
+            key = ((1,), ('CLinker.cmodule_key', 'md5:%d' % i))
+            key_pkl = os.path.join(root, 'key.pkl')
+            cmodule.KeyData(set([key]), 'hash%d' % i, key_pkl,
+                            entry).save_pkl()
+            keys.append(key)
+            key_pkls.append(key_pkl)
+
+        cache = cmodule.ModuleCache(dirname, do_refresh=False)
+        cache.refresh(cleanup=False)
+        assert len(cache.index.records) == 3
+        # The keys are only unpickled when their module is needed.
+        assert sorted(cache.lazy_key_data) == ['hash0', 'hash1', 'hash2']
+        assert not cache.entry_from_key
+        key_data = cache._load_lazy_key_data('hash1')
+        assert key_data.keys == set([keys[1]])
+        assert cache.entry_from_key == {keys[1]: key_data.get_entry()}
+
+        # Overwrite a key.pkl file without changing its size and mtime: the
+        # record of the index is used instead.
+        st = os.stat(key_pkls[0])
+        with open(key_pkls[0], 'wb') as f:
+            f.write(b'x' * st.st_size)
+        os.utime(key_pkls[0], (st.st_atime, st.st_mtime))
+        # Change another one: its record is outdated.
+        with open(key_pkls[1], 'wb') as f:
+            f.write(b'x')
+        cache = cmodule.ModuleCache(dirname, do_refresh=False)
+        cache.refresh(cleanup=False)
+        assert sorted(cache.lazy_key_data) == ['hash0', 'hash2']
+        assert cache._load_lazy_key_data('hash0').keys == set([keys[0]])
+        with change_flags(**{'cmodule.use_index': False}):
+            cache = cmodule.ModuleCache(dirname, do_refresh=False)
+            cache.refresh(cleanup=False)
+            assert list(cache.module_hash_to_key_data) == ['hash2']
+    finally:
+        shutil.rmtree(dirname)
+
+
+def test_module_index_bad_record():
+    dirname = tempfile.mkdtemp()
+
+    def add_module(i):
+        root = os.path.join(dirname, 'tmp%d' % i)
+        os.mkdir(root)
+        entry = os.path.join(root, 'mod%d.so' % i)
+        open(entry, 'w').close()
+        key = ((1,), ('CLinker.cmodule_key', 'md5:%d' % i))
+        cmodule.KeyData(set([key]), 'hash%d' % i,
+                        os.path.join(root, 'key.pkl'), entry).save_pkl()
+    try:
+        for i in range(2):
+            add_module(i)
+        index = cmodule.ModuleIndex(dirname)
+        # Garbage at the end of the index, like a torn write, could be a
+        # record being appended: it is just read again later.
+        with open(index.path, 'ab') as f:
+            f.write(b'garbage')
+        index.load()
+        assert len(index.records) == 2
+        assert not index.dirty
+        # Once records are appended after it, it is skipped.
+        for i in range(2, 4):
+            add_module(i)
+        index.load()
+        assert len(index.records) == 4
+        assert index.dirty
+
+        # refresh rewrites the index without the garbage.
+        cache = cmodule.ModuleCache(dirname, do_refresh=False)
+        cache.refresh(cleanup=False)
+        assert sorted(cache.lazy_key_data) == ['hash%d' % i for i in range(4)]
+        index = cmodule.ModuleIndex(dirname)
+        index.load()
+        assert index.n_records == 4
+        assert not index.dirty
+    finally:
+        shutil.rmtree(dirname)
+
+
+def test_shared_compiledirs():
+    x = theano.tensor.dvector('x')
+    fgraph = theano.gof.FunctionGraph([x], [theano.tensor.exp(x) * 3])
+    lnk = theano.gof.CLinker().accept(fgraph)
+    key = lnk.cmodule_key()
+    shared_dir = tempfile.mkdtemp()
+    local_dir = tempfile.mkdtemp()
+
+    def listing(dirname):
+        return sorted((os.path.join(root, name),
+                       os.stat(os.path.join(root, name)).st_mtime)
+                      for root, dirs, files in os.walk(dirname)
+                      for name in dirs + files)
+    try:
+        shared = cmodule.ModuleCache(shared_dir, shared_dirnames=[])
+        module = shared.module_from_key(key, lnk)
+        assert module.__file__.startswith(shared_dir)
+        # Old empty directories are removed from the local cache only.
+        for dirname in [shared_dir, local_dir]:
+            empty_dir = os.path.join(dirname, 'tmpempty')
+            os.mkdir(empty_dir)
+            os.utime(empty_dir, (0, 0))
+        before = listing(shared_dir)
+        for use_index in [True, False]:
+            with change_flags(**{'cmodule.use_index': use_index}):
+                # The path of the local cache need not be normalized.
+                cache = cmodule.ModuleCache(local_dir + os.sep,
+                                            shared_dirnames=[shared_dir])
+                assert cache.module_from_key(key, lnk) is module
+                # It was not compiled again.
+                assert cache.stats[2] == 0
+        assert listing(shared_dir) == before
+        assert not [d for d in os.listdir(local_dir) if d.startswith('tmp')]
+    finally:
+        shutil.rmtree(shared_dir)
+        shutil.rmtree(local_dir)
+
+
+class TaggedCopy(theano.Op):
+    """Copy op whose C code depends on `tag`, to force new modules."""
+    __props__ = ('tag',)
+
+    def __init__(self, tag):
+        self.tag = tag
+
+    def make_node(self, x):
+        x = theano.tensor.as_tensor_variable(x)
+        return theano.Apply(self, [x], [x.type()])
+
+    def perform(self, node, inputs, outputs):
+        outputs[0][0] = inputs[0].copy()
+
+    def c_code_cache_version(self):
+        return ()
+
+    def c_code(self, node, name, inames, onames, sub):
+        iname, = inames
+        oname, = onames
+        fail = sub['fail']
+        tag = self.tag
+        return """
+        /* %(tag)s */
+        Py_XDECREF(%(oname)s);
+        %(oname)s = (PyArrayObject*)PyArray_NewCopy(%(iname)s, NPY_ANYORDER);
+        if (!%(oname)s)
+            %(fail)s;
+        """ % locals()
+
+
+def test_precompile_nodes():
+    if not theano.config.cxx:
+        raise SkipTest("G++ not available, so we need to skip this test.")
+    tag = str(numpy.random.rand())
+    x = theano.tensor.dvector('x')
+    outs = [TaggedCopy('%s_%d' % (tag, i))(x) for i in range(3)]
+    fgraph = theano.gof.FunctionGraph([x], outs)
+    cache = get_module_cache()
+    n_compiled = cache.stats[2]
+    assert precompile_nodes(fgraph.toposort(), n_workers=1) == 0
+    assert precompile_nodes(fgraph.toposort(), n_workers=2) == 3
+    assert cache.stats[2] == n_compiled + 3
+    # Everything is in the cache now.
+    assert precompile_nodes(fgraph.toposort(), n_workers=2) == 0
+
+    mode = theano.compile.Mode(linker='cvm', optimizer=None)
+    with change_flags(**{'cmodule.compilation_workers': 2}):
+        f = theano.function([x], outs, mode=mode)
+    assert precompile_nodes(f.maker.fgraph.toposort(), n_workers=2) == 0
+    val = numpy.arange(5.)
+    for out in f(val):
+        assert numpy.all(out == val)
+
+
+class VersionedTaggedCopy(TaggedCopy):
+    """TaggedCopy whose modules are kept in the cache directory."""
+
+    def c_code_cache_version(self):
+        return (1,)
+
+
+def test_precompile_built_by_other_process():
+    # The modules are compiled in the cache directory by another process
+    # while this one waits for the lock: there is nothing left to compile.
+    if not theano.config.cxx:
+        raise SkipTest("G++ not available, so we need to skip this test.")
+    tag = str(numpy.random.rand())
+    x = theano.tensor.dvector('x')
+    pairs = []
+    for i in range(2):
+        out = VersionedTaggedCopy('%s_%d' % (tag, i))(x)
+        lnk = theano.gof.CLinker().accept(
+            theano.gof.FunctionGraph([x], [out]))
+        pairs.append((lnk.cmodule_key(), lnk))
+    dirname = tempfile.mkdtemp()
+    try:
+        cache = cmodule.ModuleCache(dirname, shared_dirnames=[])
+        other = cmodule.ModuleCache(dirname, shared_dirnames=[])
+        assert other.precompile(pairs, n_workers=2) == 2
+        assert cache.precompile(pairs, n_workers=2) == 0
+        assert cache.stats[2] == 0
+    finally:
+        shutil.rmtree(dirname)
@@ -0,0 +1,64 @@
+from __future__ import absolute_import, print_function, division
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy
+from nose.plugins.skip import SkipTest
+
+import theano
+from theano.configparser import change_flags
+from theano.gof import compilelock
+
+
+def locked_by_other_process(lock_file):
+    # Return True if another process cannot take the lock on `lock_file`.
+    code = ("import fcntl, sys\n"
+            "f = open(sys.argv[1], 'a')\n"
+            "try:\n"
+            "    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)\n"
+            "except (IOError, OSError):\n"
+            "    sys.exit(1)\n")
+    return subprocess.call([sys.executable, '-c', code, lock_file]) == 1
+
+
+def test_module_lock():
+    if compilelock.fcntl is None:
+        raise SkipTest("fcntl is not available.")
+    lock_dir = tempfile.mkdtemp()
+    try:
+        lock_file = os.path.join(lock_dir, 'm1234.lock')
+        compilelock.lock_module('m1234', lock_dir=lock_dir)
+        # The lock is re-entrant.
+        compilelock.lock_module('m1234', lock_dir=lock_dir)
+        assert locked_by_other_process(lock_file)
+        compilelock.release_module_lock('m1234', lock_dir=lock_dir)
+        assert locked_by_other_process(lock_file)
+        # Other modules are not locked.
+        compilelock.lock_module('m5678', lock_dir=lock_dir)
+        compilelock.release_module_lock('m5678', lock_dir=lock_dir)
+        compilelock.release_module_lock('m1234', lock_dir=lock_dir)
+        assert not locked_by_other_process(lock_file)
+    finally:
+        shutil.rmtree(lock_dir)
+
+
+def test_module_lock_compilation():
+    if compilelock.fcntl is None:
+        raise SkipTest("fcntl is not available.")
+    if not theano.config.cxx:
+        raise SkipTest("G++ not available, so we need to skip this test.")
+    x = theano.tensor.dvector('x')
+    # A new constant gives a new key, to go through the cache.
+    c = numpy.random.rand()
+    with change_flags(**{'compile.lock_granularity': 'module'}):
+        assert compilelock.use_module_locks()
+        n_lock = getattr(compilelock.get_lock, 'n_lock', 0)
+        f = theano.function([x], x * c + 1,
+                            mode=theano.compile.Mode(linker='cvm'))
+        assert getattr(compilelock.get_lock, 'n_lock', 0) == n_lock
+        assert not compilelock._module_locks
+    assert numpy.allclose(f(numpy.arange(3.)), numpy.arange(3.) * c + 1)
@@ -13,6 +13,7 @@ from theano.gof.fg import FunctionGraph, InconsistencyError
 from theano.gof.toolbox import ReplaceValidate
 
 from copy import copy
+import random
 
 
 def PatternOptimizer(p1, p2, ign=True):
@@ -433,3 +434,68 @@ def test_value_repl_2():
     consistent(g)
     g.replace(sy, transpose_view(MyConstant("abc")))
     consistent(g)
+
+
+def check_topo_order(g):
+    # The incremental order must agree with the edges of the graph and of
+    # the orderings, and detect the same cycles as _contains_cycle.
+    dh = g.destroy_handler
+    topo_order = dh.topo_order
+    assert set(topo_order.ord) == set(g.apply_nodes)
+    for node in g.apply_nodes:
+        for i in node.inputs:
+            if i.owner and (i.owner, node) not in topo_order.pending:
+                assert topo_order.ord[i.owner] < topo_order.ord[node]
+    ords = dh.orderings(g) if dh.destroyers else {}
+    has_cycle = destroyhandler._contains_cycle(g, ords)
+    try:
+        g.validate()
+    except InconsistencyError:
+        assert has_cycle or not dh.destroyers
+    else:
+        assert not has_cycle
+        for node, prereqs in ords.items():
+            for p in prereqs:
+                assert topo_order.ord[p] < topo_order.ord[node]
+
+
+def test_topo_order():
+    x, y, z = inputs()
+    e1 = add(x, y)
+    e2 = add(y, x)
+    g = Env([x, y, z], [e1, e2])
+    check_topo_order(g)
+    g.replace_validate(e1, add_in_place(x, y))
+    check_topo_order(g)
+    # This makes a cycle, the replacement is reverted.
+    try:
+        g.replace_validate(e2, add_in_place(y, x))
+        raise Exception("Shouldn't have reached this point.")
+    except InconsistencyError:
+        pass
+    check_topo_order(g)
+    assert not g.destroy_handler.topo_order.pending
+
+
+def test_topo_order_random_replacements():
+    rng = random.Random(2345)
+    ops = [sigmoid, transpose_view, add, add_in_place, dot]
+    for trial in xrange(10):
+        x, y, z = inputs()
+        outs = [add(sigmoid(x), y), dot(transpose_view(y), z),
+                add(x, sigmoid(z))]
+        g = Env([x, y, z], outs, False)
+        for step in xrange(30):
+            nodes = list(g.apply_nodes)
+            variables = list(g.inputs) + [o for n in nodes for o in n.outputs]
+            r = rng.choice([o for n in nodes for o in n.outputs])
+            # Only the orderings can make a cycle.
+            variables = [v for v in variables
+                         if r not in graph.ancestors([v])]
+            op = rng.choice(ops)
+            new_r = op(*[rng.choice(variables) for i in xrange(op.nin)])
+            try:
+                g.replace_validate(r, new_r)
+            except InconsistencyError:
+                pass
+            check_topo_order(g)
@@ -44,3 +44,31 @@ class TFunctionGraph(unittest.TestCase):
                 u = CompatUnpickler(f)
             d = u.load()
         f = theano.function(**d)
+
+    def test_structural_hash(self):
+        x, y = tt.vectors('xy')
+        fg1 = FunctionGraph([x, y], [tt.exp(x) + y * 2])
+        x2, y2 = tt.vectors('uv')
+        fg2 = FunctionGraph([x2, y2], [tt.exp(x2) + y2 * 2])
+        fg3 = FunctionGraph([x, y], [tt.exp(y) + x * 2])
+        fg4 = FunctionGraph([x, y], [tt.exp(x) + y * 3])
+        h = fg1.structural_hash()
+        assert h == fg2.structural_hash()
+        assert h != fg3.structural_hash()
+        assert h != fg4.structural_hash()
+        assert h == theano.gof.graph.graph_hash(fg1.inputs, fg1.outputs)
+
+        # The hash is updated when the graph is modified.
+        out = fg1.outputs[0]
+        exp_x = out.owner.inputs[0]
+        fg1.replace(exp_x, tt.log(fg1.inputs[0]))
+        assert h != fg1.structural_hash()
+        assert fg1.structural_hash() == theano.gof.graph.graph_hash(
+            fg1.inputs, fg1.outputs)
+        fg1.replace(fg1.outputs[0].owner.inputs[0],
+                    tt.exp(fg1.inputs[0]))
+        assert h == fg1.structural_hash()
+
+        # Also after pickling.
+        fg5 = pickle.loads(pickle.dumps(fg1))
+        assert fg5.structural_hash() == fg2.structural_hash()
@@ -1,41 +1,105 @@
 from __future__ import absolute_import, print_function, division
 import os
+import subprocess
+import sys
+
 import numpy
 import theano
 import theano.tensor as T
+from theano.compile.function_module import FunctionMaker, std_fgraph
+from theano.compile import graph_cache
+from theano.compile.graph_cache import get_optimized_graph_cache, graph_key
+from theano.configparser import change_flags
 
 floatX = 'float32'
 
 
 def test_graph_opt_caching():
-    opt_db_file = theano.config.compiledir + '/optimized_graphs.pkl'
-    os.system('rm %s' % opt_db_file)
+    cache = get_optimized_graph_cache()
+    cache.clear()
 
     mode = theano.config.mode
     if mode in ["DEBUG_MODE", "DebugMode"]:
         mode = "FAST_RUN"
-    default = theano.config.cache_optimizations
-    try:
-        theano.config.cache_optimizations = True
+    with change_flags(cache_optimizations=True):
+        misses, hits = cache.misses, cache.hits
         a = T.fmatrix('a')
         b = T.fmatrix('b')
         c = theano.shared(numpy.ones((10, 10), dtype=floatX))
         d = theano.shared(numpy.ones((10, 10), dtype=floatX))
         e = T.sum(T.sum(T.sum(a ** 2 + b) + c) + d)
         f1 = theano.function([a, b], e, mode=mode)
+        assert cache.misses == misses + 1
+        assert cache.hits == hits
 
+        # Same structure, but different variables.
         m = T.fmatrix('x1')
         n = T.fmatrix('x2')
         p = theano.shared(numpy.ones((10, 10), dtype=floatX))
         q = theano.shared(numpy.ones((10, 10), dtype=floatX))
         j = T.sum(T.sum(T.sum(m ** 2 + n) + p) + q)
         f2 = theano.function([m, n], j, mode=mode)
+        assert cache.hits == hits + 1
+
+        # A different constant makes a different graph.
+        k = T.sum(T.sum(T.sum(m ** 3 + n) + p) + q)
+        f3 = theano.function([m, n], k, mode=mode)
+        assert cache.misses == misses + 2
 
         in1 = numpy.ones((10, 10), dtype=floatX)
         in2 = numpy.ones((10, 10), dtype=floatX)
         assert f1(in1, in2) == f2(in1, in2)
+        assert f1(in1, in2) == f3(in1, in2)
+        # The shared variables of f2 are used, not those of f1.
+        p.set_value(numpy.zeros((10, 10), dtype=floatX))
+        assert f1(in1, in2) == f2(in1, in2) + 10000
+
+
+def test_graph_opt_caching_lru():
+    cache = get_optimized_graph_cache()
+    cache.clear()
+    x = T.dvector('x')
+    with change_flags(cache_optimizations=True,
+                      cache_optimizations_max_entries=2):
+        for i in range(3):
+            theano.function([x], x + i)
+    assert len(os.listdir(cache.dirname)) == 2
+
+
+def scan_graph_key():
+    # Return the key of a graph containing a Scan and an OpFromGraph. The
+    # optimizations registered depend on the modules imported, so they are
+    # left out.
+    a = T.dscalar('a')
+    b = T.dscalar('b')
+    op = theano.OpFromGraph([a, b], [a * b + 1])
+    x = T.dvector('x')
+    out, _ = theano.scan(lambda x_t: op(x_t, x_t), sequences=x)
+    input_specs = [FunctionMaker.wrap_in(x)]
+    fgraph, _ = std_fgraph(input_specs, [FunctionMaker.wrap_out(out)], False)
+    optimizer_key = graph_cache.optimizer_key
+    graph_cache.optimizer_key = lambda mode: ''
+    try:
+        return graph_key(fgraph, input_specs,
+                         theano.compile.mode.get_mode(None))
     finally:
-        theano.config.cache_optimizations = default
+        graph_cache.optimizer_key = optimizer_key
+
+
+def test_graph_key_other_process():
+    key = scan_graph_key()
+    assert key is not None
+    assert scan_graph_key() == key
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(theano.__file__))] +
+        [p for p in [env.get('PYTHONPATH')] if p])
+    code = ("from theano.gof.tests.test_graph_opt_caching import "
+            "scan_graph_key\n"
+            "print(scan_graph_key())\n")
+    out = subprocess.check_output([sys.executable, '-c', code], env=env)
+    assert out.decode().strip().splitlines()[-1] == key
+
 
 if __name__ == '__main__':
     test_graph_opt_caching()
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, print_function, division
 
 from theano.gof.type import Type
+from theano.gof import graph
 from theano.gof.graph import Variable, Apply, Constant
 from theano.gof.op import Op
 from theano.gof.opt import (OpKeyOptimizer, PatternSub, TopoOptimizer, OpSub,
@@ -10,6 +11,8 @@ from theano.gof.opt import (OpKeyOptimizer, PatternSub, TopoOptimizer, OpSub,
 from theano.gof.fg import FunctionGraph
 
 from theano import tensor as T
+from six import StringIO
+from theano.configparser import change_flags
 
 
 def as_variable(x):
@@ -570,6 +573,55 @@ class TestEquilibrium(object):
         # print 'after', g
         assert str(g) == '[Op1(x, y)]'
 
+    def test_worklist(self):
+        x, y, z = map(MyVariable, 'xyz')
+        e = op3(op4(x, y))
+        g = FunctionGraph([x, y, z], [op1(op1(op1(op1(e)))), op2(e, z)])
+        opt = EquilibriumOptimizer(
+            [PatternSub((op1, 'x', 'y'), (op2, 'x', 'y')),
+             PatternSub((op4, 'x', 'y'), (op1, 'x', 'y')),
+             PatternSub((op3, (op2, 'x', 'y')), (op4, 'x', 'y'))
+             ],
+            max_use_ratio=10, worklist=True)
+        sorted_graphs = []
+        io_toposort = graph.io_toposort
+
+        def counting_io_toposort(inputs, outputs, *args):
+            if inputs is g.inputs and not args:
+                sorted_graphs.append(outputs)
+            return io_toposort(inputs, outputs, *args)
+        graph.io_toposort = counting_io_toposort
+        try:
+            prof = opt.optimize(g)
+        finally:
+            graph.io_toposort = io_toposort
+        assert str(g) == ('[Op1(Op1(Op1(Op1(*1 -> Op2(x, y))))), '
+                          'Op2(*1, z)]'), str(g)
+        # After the first pass, only the nodes changed are revisited, and
+        # the whole graph is not sorted again.
+        nb_nodes = prof[5]
+        assert nb_nodes[0] >= 7
+        assert all(n < 7 for n in nb_nodes[1:]), nb_nodes
+        assert len(nb_nodes) > 1
+        assert len(sorted_graphs) == 1, sorted_graphs
+        assert prof[12][opt.local_optimizers_map[op4][0]] >= 1
+        out = StringIO()
+        opt.print_profile(out, prof)
+        assert 'nodes visited' in out.getvalue()
+        opt.print_profile(out, opt.merge_profile(prof, prof))
+
+    def test_worklist_same_result(self):
+        x = T.matrix('x')
+        y = T.vector('y')
+        e = T.exp(x * 2 + y) * 1 + T.log(1 - T.nnet.sigmoid(x)) - x / 2
+        e = T.sum(e) + (y * 0).sum()
+        graphs = []
+        for worklist in (False, True):
+            with change_flags(**{'optdb.worklist': worklist}):
+                f = theano.function([x, y], e, mode='FAST_RUN')
+            graphs.append(theano.printing.debugprint(f, file='str'))
+        assert graphs[0] == graphs[1], graphs
+
 
 def test_pre_constant_merge_slice():
     ms = theano.tensor.type_other.MakeSlice()(1)
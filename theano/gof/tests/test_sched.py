@@ -1,10 +1,18 @@
 from __future__ import absolute_import, print_function, division
+import numpy
+
+import theano
 from theano.gof.sched import (make_dependence_cmp, sort_apply_nodes,
-                              reverse_dict, _toposort, posort)
+                              reverse_dict, _toposort, posort,
+                              memory_schedule)
 
 from theano import tensor
+from theano.compile import Mode
+from theano.gof import FunctionGraph
 from theano.gof.graph import io_toposort
+from theano.gof.vm import VM_Linker
 from theano.compat import cmp
+from theano.tests import unittest_tools as utt
 
 
 def test_dependence():
@@ -68,3 +76,40 @@ def test_posort():
             lambda a, b: a - b]
     assert (posort(l, *cmps) ==
             [10, 1, 11, 2, 12, 3, 13, 4, 14, 5, 15, 6, 16, 7, 17, 8, 18, 9, 19])
+
+
+def test_memory_schedule():
+    x = tensor.vector('x')
+    s1 = tensor.outer(x, x).sum()
+    s2 = tensor.outer(x, x + 1).sum()
+    fgraph = FunctionGraph([x], [s1 + s2])
+    order = memory_schedule(fgraph)
+    assert set(order) == fgraph.apply_nodes
+    for i, node in enumerate(order):
+        for var in node.inputs:
+            assert var.owner is None or var.owner in order[:i]
+
+    # Each outer product is reduced before the other one is computed.
+    outers = [i for i, node in enumerate(order)
+              if node.outputs[0].ndim == 2 and
+              not getattr(node.op, 'view_map', None)]
+    assert len(outers) == 2
+    assert any(node.outputs[0].ndim == 0
+               for node in order[outers[0]:outers[1]])
+
+
+def test_memory_schedule_function():
+    x = tensor.vector('x')
+    y = tensor.outer(x, x).sum() + tensor.outer(x, x * 2).sum()
+    mode = Mode(linker=VM_Linker(schedule=memory_schedule))
+    f = theano.function([x], y, mode=mode)
+    xv = numpy.arange(3).astype(theano.config.floatX)
+    utt.assert_allclose(f(xv), 3 * numpy.outer(xv, xv).sum())
+
+
+def test_memory_schedule_flag():
+    with theano.configparser.change_flags(**{'vm.schedule': 'memory'}):
+        linker = VM_Linker()
+    assert linker.schedule is memory_schedule
+    with theano.configparser.change_flags(**{'vm.schedule': 'toposort'}):
+        assert VM_Linker().schedule != memory_schedule
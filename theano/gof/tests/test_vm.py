@@ -1,16 +1,19 @@
 from __future__ import absolute_import, print_function, division
 import gc
+import json
 import sys
 import time
 import unittest
 
 from nose.plugins.skip import SkipTest
 import numpy
+import six
 from six import itervalues
 
 from theano import function
 from theano.gof import vm
 from theano.gof import OpWiseCLinker
+from theano.gof.trace import Tracer
 from six.moves import xrange
 from theano.compile import Mode
 
@@ -422,8 +425,10 @@ def test_reallocation():
     y = tensor.scalar('y')
     z = tensor.tanh(3 * x + y) + tensor.cosh(x + 5 * y)
     # The functinality is currently implement for non lazy and non c VM only.
-    for l in [vm.VM_Linker(allow_gc=False, lazy=False, use_cloop=False),
-              vm.VM_Linker(allow_gc=True, lazy=False, use_cloop=False)]:
+    for l in [vm.VM_Linker(allow_gc=False, lazy=False, use_cloop=False,
+                           n_threads=1),
+              vm.VM_Linker(allow_gc=True, lazy=False, use_cloop=False,
+                           n_threads=1)]:
         m = theano.compile.get_mode(theano.Mode(linker=l))
         m = m.excluding('fusion', 'inplace')
 
@@ -445,6 +450,172 @@ def test_reallocation():
                             return [True, storage_map[o][0]]
             return [False, None]
 
-        assert check_storage(storage_map)[0]
+        if not l.allow_gc:
+            # With allow_gc, the storage is emptied at the end of the call.
+            assert check_storage(storage_map)[0]
         assert len(set(id(v) for v in
                        itervalues(storage_map))) < len(storage_map)
+
+
+def test_reallocation_matrix():
+    from theano.tests import unittest_tools as utt
+    x = tensor.matrix('x')
+    a = tensor.exp(x)
+    b = a * 2
+    c = tensor.tanh(b)
+    d = c + a
+    z = (d * b).sum()
+    for l in [vm.VM_Linker(allow_gc=False, lazy=False, use_cloop=False,
+                           n_threads=1),
+              vm.VM_Linker(allow_gc=True, lazy=False, use_cloop=False,
+                           n_threads=1)]:
+        m = theano.compile.get_mode(theano.Mode(linker=l))
+        m = m.excluding('fusion', 'inplace')
+        f = theano.function([x], z, mode=m)
+        storage_map = f.fn.storage_map
+        matrices = [var for var in storage_map
+                    if var.owner and getattr(var, 'ndim', None) == 2]
+        # The buffer of exp(x) can be reused by tanh(2 * exp(x)) + exp(x).
+        assert len(set(id(storage_map[var]) for var in matrices)) < \
+            len(matrices)
+
+        xv = numpy.random.rand(3, 4).astype(theano.config.floatX)
+        av = numpy.exp(xv)
+        expected = ((numpy.tanh(av * 2) + av) * av * 2).sum()
+        for i in range(3):
+            utt.assert_allclose(f(xv), expected)
+
+
+class SleepOp(theano.Op):
+    """Copy its input after sleeping, and count the concurrent calls."""
+
+    __props__ = ()
+
+    def __init__(self):
+        import threading
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def make_node(self, x):
+        return theano.Apply(self, [x], [x.type()])
+
+    def perform(self, node, inputs, outputs):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        outputs[0][0] = inputs[0].copy()
+
+
+def test_parallel():
+    x = tensor.vector('x')
+    sleep = SleepOp()
+    branches = [sleep(x * i) for i in range(4)]
+    # Some inplace nodes, that must wait for the other clients of their
+    # inputs.
+    y = tensor.add(*[b.sum() for b in branches]) + branches[0] * 2
+    for allow_gc in [True, False]:
+        linker = vm.VM_Linker(allow_gc=allow_gc, use_cloop=False,
+                              n_threads=4)
+        f = theano.function([x], y, mode=Mode(linker=linker,
+                                              optimizer='fast_run'))
+        assert isinstance(f.fn, vm.Parallel)
+        f_ref = theano.function([x], y,
+                                mode=Mode(linker='py', optimizer='fast_run'))
+        xv = numpy.arange(5).astype(theano.config.floatX)
+        sleep.max_running = 0
+        for i in range(3):
+            assert numpy.allclose(f(xv), f_ref(xv))
+        assert sleep.max_running > 1
+
+
+def test_parallel_error():
+    x = tensor.vector('x')
+    y = tensor.vector('y')
+    z = (x + y) * 2 + (x - y).sum()
+    linker = vm.VM_Linker(use_cloop=False, n_threads=2)
+    f = theano.function([x, y], z, mode=Mode(linker=linker))
+    try:
+        f(numpy.ones(2, dtype=theano.config.floatX),
+          numpy.ones(3, dtype=theano.config.floatX))
+    except ValueError as e:
+        assert 'Apply node that caused the error' in str(e)
+    else:
+        assert False
+    # The function can still be used.
+    assert f(numpy.ones(2, dtype=theano.config.floatX),
+             numpy.ones(2, dtype=theano.config.floatX)).shape == (2,)
+
+
+class Interrupt(BaseException):
+    pass
+
+
+class InterruptOp(theano.Op):
+    """Raise an exception that does not derive from Exception."""
+
+    __props__ = ()
+
+    def make_node(self, x):
+        return theano.Apply(self, [x], [x.type()])
+
+    def perform(self, node, inputs, outputs):
+        raise Interrupt()
+
+
+def test_parallel_interrupt():
+    x = tensor.vector('x')
+    z = InterruptOp()(x * 2) + SleepOp()(x - 1)
+    linker = vm.VM_Linker(use_cloop=False, n_threads=2)
+    f = theano.function([x], z, mode=Mode(linker=linker))
+    assert isinstance(f.fn, vm.Parallel)
+    try:
+        f(numpy.ones(2, dtype=theano.config.floatX))
+    except Interrupt:
+        pass
+    else:
+        assert False
+
+
+def test_trace():
+    x = tensor.matrix('x')
+    y = tensor.exp(x).sum() + x.T
+    xv = numpy.ones((2, 3), dtype=theano.config.floatX)
+    for use_cloop, lazy in [(True, None), (False, False), (False, True)]:
+        if use_cloop and not theano.config.cxx:
+            continue
+        tracer = Tracer(100)
+        linker = vm.VM_Linker(use_cloop=use_cloop, lazy=lazy, tracer=tracer)
+        f = function([x], y, mode=Mode(linker=linker, optimizer='fast_run'),
+                     name='f')
+        assert f.fn.tracer is tracer
+        n_nodes = len(f.maker.fgraph.apply_nodes)
+        f(xv)
+        f(xv)
+        events = tracer.to_chrome_trace()['traceEvents']
+        thunk_events = [e for e in events if e['cat'] == 'thunk']
+        assert len(thunk_events) == 2 * n_nodes
+        assert [e['name'] for e in events if e['cat'] == 'call'] == ['f', 'f']
+        assert len([e for e in events if e['cat'] == 'vm']) == 2
+        for e in thunk_events:
+            assert e['dur'] >= 0
+            assert e['ph'] == 'X'
+        assert any(e['args']['input_shapes'] == [(2, 3)] and
+                   e['args']['output_bytes'] == xv.nbytes
+                   for e in thunk_events)
+        # The dump is valid JSON.
+        buf = six.StringIO()
+        tracer.dump(buf)
+        assert len(json.loads(buf.getvalue())['traceEvents']) == len(events)
+
+    # Only the last events are kept.
+    tracer = Tracer(3)
+    linker = vm.VM_Linker(tracer=tracer)
+    f = function([x], y, mode=Mode(linker=linker, optimizer='fast_run'))
+    for i in range(3):
+        f(xv)
+    assert len(tracer) == 3
+    assert tracer.events[-1][1] == 'vm'
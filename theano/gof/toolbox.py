@@ -483,6 +483,114 @@ class NodeFinder(Bookkeeper):
         return all
 
 
+class StructuralHasher(Feature):
+    """
+    Keep the structural hash of every variable of a FunctionGraph up to
+    date as the graph is modified.
+
+    The hashes are computed as in `theano.gof.graph.graph_hash`. When an
+    input of a node changes, the hashes of its outputs are recomputed and
+    the change is propagated to their clients until the hashes stop
+    changing, so the cost of a replacement is proportional to the part of
+    the graph that it really changes.
+
+    Use `FunctionGraph.structural_hash` rather than attaching this feature
+    directly.
+
+    """
+    pickle_rm_attr = ["structural_hasher"]
+
+    def __init__(self):
+        self.hashes = {}
+
+    def on_attach(self, fgraph):
+        if hasattr(fgraph, 'structural_hasher'):
+            raise AlreadyThere("StructuralHasher is already present or in"
+                               " conflict with another plugin.")
+        fgraph.structural_hasher = self
+        self.hashes[fgraph] = {}
+        for node in graph.io_toposort(fgraph.inputs, fgraph.outputs):
+            self.on_import(fgraph, node, "on_attach")
+
+    def __getstate__(self):
+        # The hashes are not stable across processes, they are recomputed
+        # by unpickle.
+        d = self.__dict__.copy()
+        d['hashes'] = {}
+        return d
+
+    def unpickle(self, fgraph):
+        self.on_attach(fgraph)
+
+    def on_detach(self, fgraph):
+        """
+        Should remove any dynamically added functionality
+        that it installed into the function_graph
+        """
+        del fgraph.structural_hasher
+        del self.hashes[fgraph]
+
+    def variable_hash(self, fgraph, var):
+        """
+        Return the structural hash of `var`, a variable of `fgraph`.
+
+        """
+        hashes = self.hashes[fgraph]
+        if var not in hashes:
+            assert var.owner is None
+            index = None
+            if var in fgraph.inputs:
+                index = fgraph.inputs.index(var)
+            hashes[var] = graph.leaf_hash(var, index)
+        return hashes[var]
+
+    def graph_hash(self, fgraph):
+        """
+        Return the structural hash of the outputs of `fgraph`.
+
+        """
+        return hash(tuple(self.variable_hash(fgraph, out)
+                          for out in fgraph.outputs))
+
+    def _update(self, fgraph, node):
+        """
+        Recompute the hashes of the outputs of `node` and return whether
+        they changed.
+
+        """
+        hashes = self.hashes[fgraph]
+        new_hashes = graph.apply_hash(
+            node, [self.variable_hash(fgraph, var) for var in node.inputs])
+        changed = False
+        for out, h in zip(node.outputs, new_hashes):
+            if hashes.get(out) != h:
+                hashes[out] = h
+                changed = True
+        return changed
+
+    def on_import(self, fgraph, node, reason):
+        self._update(fgraph, node)
+
+    def on_prune(self, fgraph, node, reason):
+        hashes = self.hashes[fgraph]
+        for out in node.outputs:
+            hashes.pop(out, None)
+        for var in node.inputs:
+            if var.owner is None and not getattr(var, 'clients', None):
+                hashes.pop(var, None)
+
+    def on_change_input(self, fgraph, node, i, r, new_r, reason=None):
+        if node == 'output':
+            return
+        todo = [node]
+        while todo:
+            node = todo.pop()
+            if self._update(fgraph, node):
+                for out in node.outputs:
+                    todo.extend(client for client, _ in out.clients
+                                if client != 'output')
+
+
 class PrintListener(Feature):
 
     def __init__(self, active=True):
@@ -0,0 +1,168 @@
+"""
+Tracing of the execution of the thunks by the VMs.
+
+The profiler (`theano.compile.profiling.ProfileStats`) sums the time spent
+in each Apply node over all the calls. A trace instead keeps one event per
+execution of a thunk, with its start time, duration, thread and the shapes
+of its inputs, so that the stalls of a single call, the time spent between
+the thunks (garbage collection, VM overhead) and the interleaving of the
+threads can be seen.
+
+The events are kept in a ring buffer: only the last ones are kept, so a
+trace can be left enabled on a long running process. They can be exported
+in the Chrome trace-event format, that can be opened in chrome://tracing or
+Perfetto.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+from collections import deque
+import json
+import os
+import threading
+import time
+
+from six import string_types
+
+from theano.configparser import config
+
+
+class Tracer(object):
+    """
+    Ring buffer of the thunk executions.
+
+    Parameters
+    ----------
+    size : int
+        The number of events kept. When the buffer is full, the oldest
+        events are dropped.
+
+    Notes
+    -----
+    Recording an event is thread safe: the VM of each thread can use the
+    same Tracer.
+
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.events = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.events)
+
+    def record(self, name, category, start, end, args=None):
+        """
+        Record an event that started at time `start` and ended at `end`,
+        in seconds since the epoch, in the current thread.
+
+        """
+        self.events.append((name, category, start, end,
+                            threading.current_thread().ident, args))
+
+    def clear(self):
+        self.events.clear()
+
+    def to_chrome_trace(self):
+        """
+        Return the events as a dict in the Chrome trace-event format.
+
+        """
+        pid = os.getpid()
+        events = []
+        for name, category, start, end, tid, args in list(self.events):
+            event = {'name': name,
+                     'cat': category,
+                     'ph': 'X',
+                     'ts': start * 1e6,
+                     'dur': (end - start) * 1e6,
+                     'pid': pid,
+                     'tid': tid}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, file):
+        """
+        Write the events in the Chrome trace-event format to `file`, a file
+        name or a file object.
+
+        """
+        trace = self.to_chrome_trace()
+        if isinstance(file, string_types):
+            with open(file, 'w') as f:
+                json.dump(trace, f)
+        else:
+            json.dump(trace, file)
+
+
+_default_tracer = None
+
+
+def get_default_tracer():
+    """
+    Return the Tracer shared by the VMs, or None if the Theano flag
+    vm.trace_size is 0.
+
+    """
+    global _default_tracer
+    size = config.vm.trace_size
+    if size <= 0:
+        return None
+    if _default_tracer is None or _default_tracer.size != size:
+        _default_tracer = Tracer(size)
+    return _default_tracer
+
+
+class TracedThunk(object):
+    """
+    Wrap a thunk to record each of its executions in a Tracer.
+
+    The attributes of the thunk are available on the wrapper, except
+    `cthunk`: the CVM calls the wrapper instead of the C function, so the
+    executions of C thunks are traced too.
+
+    Parameters
+    ----------
+    thunk
+        The thunk to wrap. Its `inputs` and `outputs` attributes must be
+        set.
+    node
+        The Apply node of the thunk.
+    index : int
+        The position of the node in the order of execution.
+    tracer : Tracer
+        Where to record the executions.
+
+    """
+
+    def __init__(self, thunk, node, index, tracer):
+        self.thunk = thunk
+        self.node = node
+        self.index = index
+        self.tracer = tracer
+        self.name = str(node.op)
+        self.lazy = thunk.lazy
+        self.inputs = thunk.inputs
+        self.outputs = thunk.outputs
+
+    def __getattr__(self, name):
+        # Only called for the attributes not found on the wrapper.
+        if name in ('cthunk', 'thunk') or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.thunk, name)
+
+    def __call__(self):
+        shapes = [getattr(s[0], 'shape', None) for s in self.inputs]
+        t0 = time.time()
+        try:
+            return self.thunk()
+        finally:
+            t1 = time.time()
+            self.tracer.record(
+                self.name, 'thunk', t0, t1,
+                {'node': self.index,
+                 'input_shapes': shapes,
+                 'output_bytes': sum(getattr(s[0], 'nbytes', 0) or 0
+                                     for s in self.outputs)})
@@ -8,108 +8,130 @@ VM was a better name at some point.
 from __future__ import absolute_import, print_function, division
 
 from . import link
-from collections import defaultdict
+from collections import OrderedDict
 import logging
+from multiprocessing.pool import ThreadPool
 import os
 import sys
+import threading
 import time
 import warnings
 
-from theano.configparser import (config, _config_var_list)
+from theano.configparser import config
 
+import theano.gof.cc
 import theano.gof.cmodule
+import theano.gof.sched
+import theano.gof.trace
 
 from six import iteritems, itervalues
-from six.moves import xrange
+from six.moves import queue, xrange
 
 logger = logging.getLogger(__name__)
 
 
-def calculate_reallocate_info(order, fgraph, storage_map, compute_map_re,
-                              dependencies):
+def _same_shape(fgraph, x, y):
     """
-    WRITEME : explain the parameters
+    Return True if we know that `x` and `y` always have the same shape.
+
     """
-    reallocated_info = {}
-    viewed_by = {}
-    for var in fgraph.variables:
-        viewed_by[var] = []
-    view_of = {}
-    pre_allocated = set([])
-    allocated = set([])
+    if getattr(x, 'ndim', None) == 0:
+        return True
+    shape_feature = getattr(fgraph, 'shape_feature', None)
+    if (shape_feature is None or
+            x not in shape_feature.shape_of or
+            y not in shape_feature.shape_of):
+        return False
+    return shape_feature.same_shape(x, y)
 
-    for idx in range(len(order)):
-        node = order[idx]
-        dmap = getattr(node.op, 'destroy_map', None)
-        vmap = getattr(node.op, 'view_map', None)
 
-        idx_o = 0
+def calculate_reallocate_info(order, fgraph, storage_map, no_recycling=()):
+    """
+    Plan the reuse of the storage of intermediate results.
+
+    The lifetime of the buffer of a variable goes from the node that
+    computes it to the last node that uses it or one of its views (or
+    variables that destroyed it). When a node computes a variable and the
+    buffer of a variable of the same type and shape is not used anymore,
+    the two variables can share the same storage: the Op will then find a
+    buffer of the right shape in its output storage and reuse it instead of
+    allocating a new one. The buffers are assigned to the variables in the
+    order of execution, which is a greedy colouring of the interval graph
+    of the lifetimes.
+
+    Parameters
+    ----------
+    order
+        The list of Apply nodes in the order they will be executed.
+    fgraph
+        The FunctionGraph. If it has a ShapeFeature, it is used to know
+        which variables have the same shape, otherwise only the storage of
+        scalars is reused.
+    storage_map
+        Map variables to their storage. Variables that already have a
+        value are left alone.
+    no_recycling
+        Variables whose storage must not be reused.
+
+    Returns
+    -------
+    OrderedDict
+        Map each variable that can reuse the storage of a previous variable
+        to that variable, in the order of execution.
+
+    """
+    reallocated_info = OrderedDict()
+    excluded = set(fgraph.outputs)
+    excluded.update(no_recycling)
+
+    # Variables that share the memory of each buffer, indexed by the
+    # variable that owns the buffer.
+    view_of = {}
+    viewed_by = {}
+    last_use = {}
+    for idx, node in enumerate(order):
+        for var in node.inputs:
+            last_use[var] = idx
+        dmap = getattr(node.op, 'destroy_map', None) or {}
+        vmap = getattr(node.op, 'view_map', None) or {}
+        for idx_o, out in enumerate(node.outputs):
+            aliased = list(dmap.get(idx_o, [])) + list(vmap.get(idx_o, []))
+            if aliased:
+                origins = set()
+                for idx_i in aliased:
+                    ins = node.inputs[idx_i]
+                    origins.update(view_of.get(ins, [ins]))
+                view_of[out] = origins
+                for origin in origins:
+                    viewed_by.setdefault(origin, []).append(out)
+
+    # Index of the node after which each buffer can be reused.
+    release = {}
+    for idx, node in enumerate(order):
         for out in node.outputs:
-            for var in node.outputs:
-                compute_map_re[var][0] = 1
-            ins = None
-            if dmap and idx_o in dmap:
-                idx_v = dmap[idx_o]
-                assert len(idx_v) == 1, ("Here we only support the possibility"
-                                         " to destroy one input")
-                ins = node.inputs[idx_v[0]]
-            if vmap and idx_o in vmap:
-                assert ins is None
-                idx_v = vmap[idx_o]
-                assert len(idx_v) == 1, ("Here we only support the possibility"
-                                         " to view one input")
-                ins = node.inputs[idx_v[0]]
-            if ins is not None:
-                assert isinstance(ins, theano.Variable)
-                origin = view_of.get(ins, ins)
-                view_of[out] = origin
-                viewed_by[origin].append(out)
-            idx_o += 1
-
-        for ins in node.inputs:
-            assert not (ins in view_of and viewed_by[ins])
-            if (getattr(ins, 'ndim', None) == 0 and not storage_map[ins][0] and
-                    ins not in fgraph.outputs and ins.owner and
-                    all([compute_map_re[v][0]
-                         for v in dependencies.get(ins, [])]) and
-                    ins not in allocated):
-                # Constant Memory cannot be changed
-                # Constant and shared variables' storage_map value is not empty
-                reuse_out = None
-                if ins not in view_of and not viewed_by.get(ins, []):
-                    # where gc
-                    for i in range(idx + 1, len(order)):
-                        if reuse_out is not None:
-                            break
-                        for out in order[i].outputs:
-                            if (getattr(out, 'ndim', None) == 0 and
-                                    out not in pre_allocated and
-                                    ins.type == out.type):
-                                reuse_out = out
-                                pre_allocated.add(out)
-                                allocated.add(ins)
-                                break
-                elif ins in view_of:
-                    origin = view_of[ins]
-                    if ins in viewed_by[origin]:
-                        viewed_by[origin].remove(ins)
-                    if (not viewed_by[origin] and
-                            origin not in fgraph.inputs and
-                            not isinstance(origin, theano.Constant)):
-                        # where gc
-                        for i in range(idx + 1, len(order)):
-                            if reuse_out is not None:
-                                break
-                            for out in order[i].outputs:
-                                if (getattr(out, 'ndim', None) == 0 and
-                                        out not in pre_allocated and
-                                        ins.type == out.type):
-                                    reuse_out = out
-                                    pre_allocated.add(out)
-                                    allocated.add(ins)
-                                    break
-                if reuse_out is not None:
-                    reallocated_info[ins] = [ins, reuse_out]
+            if out in view_of or out in excluded or storage_map[out][0]:
+                continue
+            users = [out] + viewed_by.get(out, [])
+            if any(var in excluded for var in users):
+                continue
+            release[out] = max(last_use.get(var, idx) for var in users)
+
+    # Assign the buffers to the variables in the order of execution.
+    free_buffers = {}
+    released_after = {}
+    for idx, node in enumerate(order):
+        for out in node.outputs:
+            if out not in release:
+                continue
+            candidates = free_buffers.get(out.type, [])
+            for i, holder in enumerate(candidates):
+                if _same_shape(fgraph, holder, out):
+                    reallocated_info[out] = holder
+                    del candidates[i]
+                    break
+            released_after.setdefault(release[out], []).append(out)
+        for var in released_after.pop(idx, []):
+            free_buffers.setdefault(var.type, []).append(var)
 
     return reallocated_info
 
@@ -304,6 +326,163 @@ class LoopGC(VM):
                 link.raise_with_op(node, thunk)
 
 
+_thread_pools = {}
+_pool_thread = threading.local()
+
+
+def _mark_pool_thread():
+    _pool_thread.in_pool = True
+
+
+def get_thread_pool(n_threads):
+    """
+    Return the pool of `n_threads` threads shared by the Parallel VMs.
+
+    """
+    key = (os.getpid(), n_threads)
+    if key not in _thread_pools:
+        _thread_pools[key] = ThreadPool(n_threads,
+                                        initializer=_mark_pool_thread)
+    return _thread_pools[key]
+
+
+class Parallel(VM):
+    """
+    Execute the thunks concurrently in a pool of threads.
+
+    A node is dispatched to the pool as soon as the nodes computing its
+    inputs, and the nodes it must follow according to `fgraph.orderings()`
+    (e.g. because it destroys a variable that they read), are done. So the
+    independent branches of the graph are computed at the same time, as
+    long as their thunks release the GIL.
+
+    The intermediate results are freed when all the nodes using them are
+    done, as the order of execution is not fixed.
+
+    When there is only one thread, or when called from one of the threads
+    of the pool (e.g. by the inner function of a Scan), the thunks are
+    executed one at a time in the order of `nodes`.
+
+    Parameters
+    ----------
+    nodes
+        A list of nodes in toposort order.
+    thunks
+        A list of thunks to execute those nodes, in toposort order.
+    pre_call_clear
+        A list of containers to empty at the beginning of each call.
+    post_thunk_clear
+        As for LoopGC, the containers to empty after each thunk when they
+        are executed in order, or None to keep the intermediate results.
+    fgraph
+        The FunctionGraph, used to get the orderings between the nodes.
+    n_threads
+        The number of threads.
+
+    """
+
+    def __init__(self, nodes, thunks, pre_call_clear, post_thunk_clear,
+                 fgraph, n_threads):
+        super(Parallel, self).__init__(nodes, thunks, pre_call_clear)
+        self.post_thunk_clear = post_thunk_clear
+        # Some other part of Theano query that information
+        self.allow_gc = post_thunk_clear is not None
+        self.n_threads = n_threads
+
+        node_idx = dict((node, i) for i, node in enumerate(nodes))
+        ords = fgraph.orderings()
+        self.successors = [[] for node in nodes]
+        self.n_predecessors = []
+        for i, node in enumerate(nodes):
+            preds = set(node_idx[var.owner] for var in node.inputs
+                        if var.owner in node_idx)
+            preds.update(node_idx[pred] for pred in ords.get(node, []))
+            self.n_predecessors.append(len(preds))
+            for pred in preds:
+                self.successors[pred].append(i)
+        self.ready = [i for i, n in enumerate(self.n_predecessors) if not n]
+
+        # The containers that can be emptied, and the number of nodes
+        # using each of them.
+        self.n_users = {}
+        self.gc_inputs = [[] for node in nodes]
+        if self.allow_gc:
+            collected = dict((id(cont), cont) for conts in post_thunk_clear
+                             for cont in conts)
+            for i, thunk in enumerate(thunks):
+                for cont_id in set(id(cont) for cont in thunk.inputs):
+                    if cont_id in collected:
+                        self.gc_inputs[i].append(collected[cont_id])
+                        self.n_users[cont_id] = (
+                            self.n_users.get(cont_id, 0) + 1)
+
+    def run_node(self, i):
+        """
+        Run the i-th thunk, and return i and the exception info if it fails.
+
+        Any exception is returned, even the ones that don't derive from
+        Exception, as the caller would otherwise wait for the thunk forever.
+
+        """
+        try:
+            if self.time_thunks:
+                t0 = time.time()
+                self.thunks[i]()
+                t1 = time.time()
+                self.call_counts[i] += 1
+                self.call_times[i] += t1 - t0
+            else:
+                self.thunks[i]()
+        except BaseException:
+            return i, sys.exc_info()
+        return i, None
+
+    def __call__(self, output_subset=None):
+        # All the outputs are computed, Function selects those requested.
+        for cont in self.pre_call_clear:
+            cont[0] = None
+        if self.n_threads <= 1 or getattr(_pool_thread, 'in_pool', False):
+            for i in xrange(len(self.thunks)):
+                exc_info = self.run_node(i)[1]
+                if exc_info is not None:
+                    link.raise_with_op(self.nodes[i], self.thunks[i],
+                                       exc_info)
+                if self.allow_gc:
+                    for old_s in self.post_thunk_clear[i]:
+                        old_s[0] = None
+            return
+
+        pool = get_thread_pool(self.n_threads)
+        done = queue.Queue()
+        n_predecessors = list(self.n_predecessors)
+        n_users = self.n_users.copy()
+        for i in self.ready:
+            pool.apply_async(self.run_node, (i,), callback=done.put)
+        n_running = len(self.ready)
+        error = None
+        while n_running:
+            i, exc_info = done.get()
+            n_running -= 1
+            if error is not None:
+                # Wait for the running thunks before raising the error.
+                continue
+            if exc_info is not None:
+                error = i, exc_info
+                continue
+            for cont in self.gc_inputs[i]:
+                n_users[id(cont)] -= 1
+                if not n_users[id(cont)]:
+                    cont[0] = None
+            for j in self.successors[i]:
+                n_predecessors[j] -= 1
+                if not n_predecessors[j]:
+                    pool.apply_async(self.run_node, (j,), callback=done.put)
+                    n_running += 1
+        if error is not None:
+            i, exc_info = error
+            link.raise_with_op(self.nodes[i], self.thunks[i], exc_info)
+
+
 class Stack(VM):
     """
     Finish-to-start evalution order of thunks.
@@ -655,24 +834,28 @@ class Stack(VM):
         self.node_cleared_order.append(final_index)
 
 
-try:
-    from . import lazylinker_c
+CVM = None
+
+
+def import_cvm():
+    """
+    Return the CVM class, a VM whose loop is implemented in C.
+
+    The C code is in the lazylinker_c module, which compiles it the first
+    time it is imported. This is why it is only imported when the first
+    CVM is made and not when Theano is imported.
+
+    """
+    global CVM
+    if CVM is None:
+        from . import lazylinker_c
 
-    class CVM(lazylinker_c.CLazyLinker, VM):
+        class CVM(lazylinker_c.CLazyLinker, VM):
 
-        def __init__(self, *args, **kwargs):
-            lazylinker_c.CLazyLinker.__init__(self, *args, **kwargs)
-            # skip VM.__init__
-except ImportError:
-    pass
-except (OSError, theano.gof.cmodule.MissingGXX) as e:
-    # OSError happens when g++ is not installed.  In that case, we
-    # already changed the default linker to something else then CVM.
-    # Currently this is the py linker.
-    # Here we assert that the default linker is not cvm.
-    assert not [x for x in _config_var_list
-                if x.fullname == 'linker'][0].default.startswith('cvm'), e
-    pass
+            def __init__(self, *args, **kwargs):
+                lazylinker_c.CLazyLinker.__init__(self, *args, **kwargs)
+                # skip VM.__init__
+    return CVM
 
 
 class VM_Linker(link.LocalLinker):
@@ -709,12 +892,25 @@ class VM_Linker(link.LocalLinker):
     allow_partial_eval
         If True, enforces usage of Stack or CVM, to allow for partial
         evaluation of functions (calculating a subset of outputs).
+    schedule
+        Function taking the FunctionGraph and returning its Apply nodes in
+        the order to execute them. If None, use the Theano flag
+        vm.schedule.
+    n_threads
+        If more than 1, and there is no lazy thunk, use the Parallel VM
+        with this number of threads. If None, use the Theano flag
+        vm.threads.
+    tracer
+        A `theano.gof.trace.Tracer` recording the executions of the thunks.
+        If None, use the one of `theano.gof.trace.get_default_tracer`,
+        which depends on the Theano flag vm.trace_size.
 
     """
 
     def __init__(self, allow_gc=None, use_cloop=False, callback=None,
                  callback_input=None, lazy=None, schedule=None,
-                 c_thunks=None, allow_partial_eval=None):
+                 c_thunks=None, allow_partial_eval=None, n_threads=None,
+                 tracer=None):
         # Note: if more parameters are added to __init__, make sure to forward
         # them in the "type(self)(...)" call in the "accept" method below.
         if allow_gc is None:
@@ -727,9 +923,15 @@ class VM_Linker(link.LocalLinker):
         self.lazy = lazy
         self.c_thunks = c_thunks
         self.allow_partial_eval = allow_partial_eval
+        if n_threads is None:
+            n_threads = config.vm.threads
+        self.n_threads = n_threads
+        self.tracer = tracer
         self.updated_vars = {}
         if schedule:
             self.schedule = schedule
+        elif config.vm.schedule == 'memory':
+            self.schedule = theano.gof.sched.memory_schedule
 
     def accept(self, fgraph, no_recycling=None, profile=None):
         """
@@ -780,7 +982,9 @@ class VM_Linker(link.LocalLinker):
                 lazy=self.lazy,
                 schedule=self.schedule,
                 c_thunks=self.c_thunks,
-                allow_partial_eval=self.allow_partial_eval
+                allow_partial_eval=self.allow_partial_eval,
+                n_threads=self.n_threads,
+                tracer=self.tracer
             ).accept(fgraph, no_recycling, profile)
         self.fgraph = fgraph
         self.no_recycling = no_recycling
@@ -849,6 +1053,12 @@ class VM_Linker(link.LocalLinker):
 
         pre_call_clear = [storage_map[v] for v in self.no_recycling]
 
+        lazy = self.lazy
+        if lazy is None:
+            lazy = config.vm.lazy
+        if lazy is None:
+            lazy = not all([(not th.lazy) for th in thunks])
+
         if (self.callback is not None or self.callback_input is not None or
                 (config.profile and config.profile_memory) or
                 (self.allow_partial_eval and not self.use_cloop)):
@@ -873,6 +1083,16 @@ class VM_Linker(link.LocalLinker):
                 dependencies=deps,
                 callback=self.callback,
                 callback_input=self.callback_input)
+        elif (self.n_threads > 1 and not lazy and
+                not self.allow_partial_eval):
+            vm = Parallel(
+                nodes,
+                thunks,
+                pre_call_clear,
+                post_thunk_clear,
+                self.fgraph,
+                self.n_threads,
+            )
         elif self.use_cloop:
             # create a map from nodes to ints and vars to ints
             nodes_idx = {}
@@ -959,7 +1179,7 @@ class VM_Linker(link.LocalLinker):
                     update_storage.append(update_in_from_out[oidx])
 
             c0 = sys.getrefcount(node_n_inputs)
-            vm = CVM(
+            vm = import_cvm()(
                 nodes,
                 thunks,
                 pre_call_clear,
@@ -983,11 +1203,6 @@ class VM_Linker(link.LocalLinker):
             )
             assert c0 == sys.getrefcount(node_n_inputs)
         else:
-            lazy = self.lazy
-            if lazy is None:
-                lazy = config.vm.lazy
-            if lazy is None:
-                lazy = not all([(not th.lazy) for th in thunks])
             if not lazy:
                 # there is no conditional in the graph
                 if self.allow_gc:
@@ -1030,43 +1245,68 @@ class VM_Linker(link.LocalLinker):
 
         thunks = []
 
-        # Collect Reallocation Info
-        compute_map_re = defaultdict(lambda: [0])
-        for var in fgraph.inputs:
-            compute_map_re[var][0] = 1
-
-        if getattr(fgraph.profile, 'dependencies', None):
-            dependencies = getattr(fgraph.profile, 'dependencies')
-        else:
-            dependencies = self.compute_gc_dependencies(storage_map)
+        # The storage can only be reused if the nodes are executed in the
+        # order of the schedule. This is not the case with the CVM, the
+        # Parallel VM and when some thunks are lazy, in which case we undo
+        # the reallocation below.
+        reallocated_info = {}
+        if not (self.lazy or (self.lazy is None and config.vm.lazy) or
+                (config.profile and config.profile_memory) or
+                self.use_cloop or self.callback or self.callback_input or
+                self.allow_partial_eval or self.n_threads > 1):
+            reallocated_info = calculate_reallocate_info(
+                order, fgraph, storage_map, no_recycling)
+        if reallocated_info:
+            orig_storage_map = storage_map.copy()
+            for var, holder in iteritems(reallocated_info):
+                storage_map[var] = storage_map[holder]
 
-        reallocated_info = calculate_reallocate_info(
-            order, fgraph, storage_map, compute_map_re, dependencies)
         t0 = time.time()
         linker_make_thunk_time = {}
         impl = None
         if self.c_thunks is False:
             impl = 'py'
-        for node in order:
-            try:
-                thunk_start = time.time()
-                thunks.append(node.op.make_thunk(node,
-                                                 storage_map,
-                                                 compute_map,
-                                                 no_recycling,
-                                                 impl=impl))
-                linker_make_thunk_time[node] = time.time() - thunk_start
-                if not hasattr(thunks[-1], 'lazy'):
-                    # We don't want all ops maker to think about lazy Ops.
-                    # So if they didn't specify that its lazy or not, it isn't.
-                    # If this member isn't present, it will crash later.
-                    thunks[-1].lazy = False
-            except Exception as e:
-                e.args = ("The following error happened while"
-                          " compiling the node", node, "\n") + e.args
-                raise
+        else:
+            theano.gof.cc.precompile_nodes(order, no_recycling)
+        with theano.compile.parallel_opt.optimized_inner_graphs(order):
+            for node in order:
+                try:
+                    thunk_start = time.time()
+                    thunks.append(node.op.make_thunk(node,
+                                                     storage_map,
+                                                     compute_map,
+                                                     no_recycling,
+                                                     impl=impl))
+                    linker_make_thunk_time[node] = time.time() - thunk_start
+                    if not hasattr(thunks[-1], 'lazy'):
+                        # We don't want all ops maker to think about lazy Ops.
+                        # So if they didn't specify that its lazy or not, it
+                        # isn't.
+                        # If this member isn't present, it will crash later.
+                        thunks[-1].lazy = False
+                except Exception as e:
+                    e.args = ("The following error happened while"
+                              " compiling the node", node, "\n") + e.args
+                    raise
         t1 = time.time()
 
+        lazy = self.lazy
+        if lazy is None:
+            lazy = config.vm.lazy
+        if lazy is None:
+            lazy = not all([(not th.lazy) for th in thunks])
+        if lazy and reallocated_info:
+            # The thunks may not be executed in the order of the schedule.
+            storage_map.update(orig_storage_map)
+            reallocated_info = {}
+            thunks = [node.op.make_thunk(node, storage_map, compute_map,
+                                         no_recycling, impl=impl)
+                      for node in order]
+            for thunk in thunks:
+                if not hasattr(thunk, 'lazy'):
+                    thunk.lazy = False
+            t1 = time.time()
+
         if self.profile:
             self.profile.linker_node_make_thunks += t1 - t0
             self.profile.linker_make_thunk_time = linker_make_thunk_time
@@ -1075,18 +1315,17 @@ class VM_Linker(link.LocalLinker):
             thunk.inputs = [storage_map[v] for v in node.inputs]
             thunk.outputs = [storage_map[v] for v in node.outputs]
 
-        lazy = self.lazy
-        if lazy is None:
-            lazy = config.vm.lazy
-        if lazy is None:
-            lazy = not all([(not th.lazy) for th in thunks])
-        if not (lazy or (config.profile and config.profile_memory) or
-                self.use_cloop or self.callback or self.callback_input):
-            for pair in itervalues(reallocated_info):
-                storage_map[pair[1]] = storage_map[pair[0]]
+        tracer = self.tracer
+        if tracer is None:
+            tracer = theano.gof.trace.get_default_tracer()
+        if tracer is not None:
+            thunks = [theano.gof.trace.TracedThunk(thunk, node, i, tracer)
+                      for i, (node, thunk) in enumerate(zip(order, thunks))]
 
         computed, last_user = link.gc_helper(order)
         if self.allow_gc:
+            # Don't free the buffers that will be reused.
+            reused = set(itervalues(reallocated_info))
             post_thunk_clear = []
             for node in order:
                 clear_after_this_thunk = []
@@ -1094,7 +1333,7 @@ class VM_Linker(link.LocalLinker):
                     if (input in computed and
                             input not in fgraph.outputs and
                             node == last_user[input] and
-                            input not in reallocated_info):
+                            input not in reused):
                         clear_after_this_thunk.append(storage_map[input])
                 post_thunk_clear.append(clear_after_this_thunk)
         else:
@@ -1110,6 +1349,7 @@ class VM_Linker(link.LocalLinker):
 
         vm.storage_map = storage_map
         vm.compute_map = compute_map
+        vm.tracer = tracer
 
         return (vm,
                 [link.Container(input, storage)
@@ -1125,5 +1365,9 @@ class VM_Linker(link.LocalLinker):
             self.c_thunks = True
         if not hasattr(self, 'allow_partial_eval'):
             self.allow_partial_eval = None
+        if not hasattr(self, 'n_threads'):
+            self.n_threads = 1
+        if not hasattr(self, 'tracer'):
+            self.tracer = None
         if not hasattr(self, 'callback_input'):
             self.callback_input = None
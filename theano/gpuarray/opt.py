@@ -468,6 +468,20 @@ class GraphToGPU(Optimizer):
                     print(blanc + "  ", '  %.3fs - %s' % (t, o), file=stream)
             print(file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        (opt, toposort_timing, time_opts, node_created, process_count) = prof
+        local_optimizers = [{'name': str(o),
+                             'time': time_opts[o],
+                             'applied': count,
+                             'node_created': node_created[o]}
+                            for o, count in iteritems(process_count)]
+        local_optimizers.sort(key=lambda lo: (-lo['time'], lo['name']))
+        return {'class': 'GraphToGPU',
+                'name': getattr(opt, "name", getattr(opt, "__name__", "")),
+                'io_toposort_time': toposort_timing,
+                'local_optimizers': local_optimizers}
+
     @staticmethod
     def merge_profile(prof1, prof2):
         # (opt, toposort_timing, time_opts, node_created, process_count) = prof1
@@ -1679,46 +1693,6 @@ def tensor_to_gpu(x, context_name):
         return x
 
 
-def gpu_safe_new(x, tag=''):
-    """
-    Internal function that constructs a new variable from x with the same
-    type, but with a different name (old name + tag). This function is used
-    by gradient, or the R-op to construct new variables for the inputs of
-    the inner graph such that there is no interference between the original
-    graph and the newly constructed graph.
-
-    """
-    if hasattr(x, 'name') and x.name is not None:
-        nw_name = x.name + tag
-    else:
-        nw_name = None
-
-    if isinstance(x, theano.Constant):
-        return x.clone()
-
-    nw_x = x.type()
-    nw_x.name = nw_name
-    return nw_x
-
-
-def gpu_reconstruct_graph(inputs, outputs, tag=None):
-    """
-    Different interface to clone, that allows you to pass inputs.
-    Compared to clone, this method always replaces the inputs with
-    new variables of the same type, and returns those (in the same
-    order as the original inputs).
-
-    """
-    if tag is None:
-        tag = ''
-    nw_inputs = [gpu_safe_new(x, tag) for x in inputs]
-    givens = {}
-    for nw_x, x in zip(nw_inputs, inputs):
-        givens[x] = nw_x
-    nw_outputs = scan_utils.clone(outputs, replace=givens)
-    return (nw_inputs, nw_outputs)
-
-
 @register_opt('scan', 'fast_compile')
 @op_lifter([scan_op.Scan])
 @register_opt2([scan_op.Scan], 'fast_compile')
@@ -1753,13 +1727,7 @@ def local_gpua_scan_to_gpua(op, context_name, inputs, outputs):
         replace=list(zip(op.inputs,
                          (safe_to_cpu(x) for x in scan_ins))))
 
-    # We need to construct the hash here, because scan
-    # __init__ does not know about the gpu and can not
-    # handle graphs with inputs being on the gpu
-    tmp_in, tmp_out = gpu_reconstruct_graph(scan_ins, scan_outs)
-    local_fgraph = gof.FunctionGraph(tmp_in, tmp_out, clone=True)
-    _cmodule_key = gof.CLinker().cmodule_key_(local_fgraph, [])
-    info['gpu_hash'] = hash(_cmodule_key)
+    info['gpu_hash'] = gof.graph.graph_hash(scan_ins, scan_outs)
 
     def typebuild(dtype, broadcastable, context_name=context_name):
         return GpuArrayType(dtype=dtype, broadcastable=broadcastable,
@@ -0,0 +1,54 @@
+"""
+Compare the compilation profiles saved in two files by the Theano flag
+profiling.compile_report.
+
+Usage: python diff_compile_reports.py OLD.json NEW.json [NB_ROWS]
+
+The functions of the two files are matched by their name, and for each
+one, the metrics that changed the most are printed.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import json
+import sys
+
+from theano.compile.profiling import diff_compile_reports
+
+
+def _by_name(reports):
+    rval = {}
+    for report in reports:
+        name = report['message']
+        idx = 0
+        while (name, idx) in rval:
+            idx += 1
+        rval[(name, idx)] = report
+    return rval
+
+
+def main(old_file, new_file, nb_rows=20):
+    with open(old_file) as f:
+        old = _by_name(json.load(f))
+    with open(new_file) as f:
+        new = _by_name(json.load(f))
+    for key in sorted(set(old) | set(new), key=str):
+        name = '%s (%d)' % key if key[1] else str(key[0])
+        if key not in new:
+            print('Function %s: only in %s' % (name, old_file))
+            continue
+        if key not in old:
+            print('Function %s: only in %s' % (name, new_file))
+            continue
+        diff = diff_compile_reports(old[key], new[key])
+        print('Function %s: %d metrics changed' % (name, len(diff)))
+        for path, metric, v1, v2 in diff[:nb_rows]:
+            print('  %s %s: %s -> %s' % (path, metric, v1, v2))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4):
+        print(__doc__)
+        sys.exit(1)
+    main(*sys.argv[1:3], nb_rows=int(sys.argv[3]) if len(sys.argv) > 3
+         else 20)
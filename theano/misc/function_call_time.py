@@ -0,0 +1,67 @@
+"""
+Measure the overhead of calling a Theano function on small inputs.
+
+For small graphs, most of the time of a call is spent in
+`Function.__call__` checking the arguments, not in the computation. This
+prints the time per call of a few small functions, with the default checks
+and with `trust_input=True`, which skips them.
+
+"""
+from __future__ import absolute_import, print_function, division
+from optparse import OptionParser
+import sys
+import time
+
+import numpy as np
+
+import theano
+import theano.tensor as T
+from six.moves import xrange
+
+parser = OptionParser(usage='%prog <options>\n Compute the time per call'
+                      ' of small Theano functions')
+parser.add_option('-n', '--loops', action='store', dest='loops',
+                  default=20000, type="int",
+                  help="Number of calls of each function")
+
+
+def time_per_call(f, args, loops, repeat=5):
+    """
+    Return the best time per call over `repeat` runs of `loops` calls.
+
+    """
+    f(*args)
+    best = float('inf')
+    for r in xrange(repeat):
+        t0 = time.time()
+        for i in xrange(loops):
+            f(*args)
+        best = min(best, (time.time() - t0) / loops)
+    return best
+
+
+def main(loops):
+    floatX = theano.config.floatX
+    x = T.vector('x')
+    y = T.vector('y')
+    m = T.matrix('m')
+    w = theano.shared(np.ones((3, 3), dtype=floatX), 'w')
+    xv = np.ones(3, dtype=floatX)
+    mv = np.ones((2, 3), dtype=floatX)
+    cases = [
+        ('1 input', [x], x + 1, [xv]),
+        ('2 inputs', [x, y], x * y + 1, [xv, xv]),
+        ('3 inputs, shared', [m, x, y], T.dot(m, w) + x * y, [mv, xv, xv]),
+    ]
+    print('%-20s %14s %14s' % ('', 'us/call', 'trust_input'))
+    for name, inputs, output, args in cases:
+        f = theano.function(inputs, output)
+        dt = time_per_call(f, args, loops)
+        f.trust_input = True
+        dt_trust = time_per_call(f, args, loops)
+        print('%-20s %14.2f %14.2f' % (name, dt * 1e6, dt_trust * 1e6))
+
+
+if __name__ == '__main__':
+    options, arguments = parser.parse_args(sys.argv)
+    main(options.loops)
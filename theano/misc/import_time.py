@@ -0,0 +1,63 @@
+"""
+Measure the time taken by `import theano` in a new process.
+
+Short-lived processes pay this time each time they start. This imports
+Theano in a few new Python processes and prints the best and median import
+times, and the optional packages that the import loaded. Run it twice, so
+that the first run compiles the .pyc files and the C modules Theano needs
+at import.
+
+"""
+from __future__ import absolute_import, print_function, division
+from optparse import OptionParser
+import subprocess
+import sys
+
+parser = OptionParser(usage='%prog <options>\n Compute the time taken by'
+                      ' `import theano`')
+parser.add_option('-n', '--repeat', action='store', dest='repeat',
+                  default=7, type="int",
+                  help="Number of processes that import Theano")
+
+# Packages that Theano only imports when they are used.
+optional_modules = ['scipy.stats', 'scipy.signal', 'scipy.sparse',
+                    'theano.sparse', 'theano.tensor.signal',
+                    'theano.typed_list', 'theano.d3viz',
+                    'theano.gof.lazylinker_c']
+
+code = """
+import sys, time
+t0 = time.time()
+import theano
+print(time.time() - t0)
+print(len(sys.modules))
+print(' '.join(m for m in %r if m in sys.modules))
+""" % (optional_modules,)
+
+
+def import_time():
+    """
+    Return the import time, the number of modules and the optional modules
+    loaded by `import theano` in a new process.
+
+    """
+    out = subprocess.check_output([sys.executable, '-c', code])
+    lines = out.decode().splitlines()
+    return float(lines[-3]), int(lines[-2]), lines[-1].split()
+
+
+def main(repeat):
+    times = []
+    for i in range(repeat):
+        t, n_modules, loaded = import_time()
+        times.append(t)
+    times.sort()
+    print('import theano: best %.3fs, median %.3fs' %
+          (times[0], times[len(times) // 2]))
+    print('%d modules loaded' % n_modules)
+    print('optional modules loaded: %s' % (' '.join(loaded) or 'none'))
+
+
+if __name__ == '__main__':
+    options, arguments = parser.parse_args(sys.argv)
+    main(options.repeat)
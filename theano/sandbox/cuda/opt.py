@@ -2385,45 +2385,6 @@ def safe_to_cpu(x):
         return x
 
 
-def gpu_safe_new(x, tag=''):
-    """
-    Internal function that constructs a new variable from x with the same
-    type, but with a different name (old name + tag). This function is used
-    by gradient, or the R-op to construct new variables for the inputs of
-    the inner graph such that there is no interference between the original
-    graph and the newly constructed graph.
-
-    """
-    if hasattr(x, 'name') and x.name is not None:
-        nw_name = x.name + tag
-    else:
-        nw_name = None
-    if isinstance(x, theano.Constant):
-        return x.clone()
-
-    nw_x = x.type()
-    nw_x.name = nw_name
-    return nw_x
-
-
-def gpu_reconstruct_graph(inputs, outputs, tag=None):
-    """
-    Different interface to clone, that allows you to pass inputs.
-    Compared to clone, this method always replaces the inputs with
-    new variables of the same type, and returns those (in the same
-    order as the original inputs).
-
-    """
-    if tag is None:
-        tag = ''
-    nw_inputs = [gpu_safe_new(x, tag) for x in inputs]
-    givens = {}
-    for nw_x, x in zip(nw_inputs, inputs):
-        givens[x] = nw_x
-    nw_outputs = scan_utils.clone(outputs, replace=givens)
-    return (nw_inputs, nw_outputs)
-
-
 def tensor_to_cuda(x):
     if (isinstance(x.type, tensor.TensorType) and
             x.type.dtype == 'float32'):
@@ -2521,14 +2482,7 @@ def gpuScanOptimization(node):
                 scan_outs,
                 replace=list(zip(thescan.inputs,
                                  (safe_to_cpu(x) for x in scan_ins))))
-            # We need to construct the hash here, because scan
-            # __init__ does not know about cuda ndarray and can not
-            # handle graphs with inputs being Cuda Ndarrays
-            tmp_in, tmp_out = gpu_reconstruct_graph(scan_ins,
-                                                    scan_outs)
-            local_fgraph = gof.FunctionGraph(tmp_in, tmp_out)
-            _cmodule_key = gof.CLinker().cmodule_key_(local_fgraph, [])
-            info['gpu_hash'] = hash(_cmodule_key)
+            info['gpu_hash'] = gof.graph.graph_hash(scan_ins, scan_outs)
 
             nw_op = scan_op.Scan(scan_ins,
                                  scan_outs,
@@ -2569,14 +2523,7 @@ def gpuScanOptimization(node):
                 replace=list(zip(thescan.inputs,
                                  (safe_to_cpu(x) for x in scan_ins))))
 
-            # We need to construct the hash here, because scan
-            # __init__ does not know about cuda ndarray and can not
-            # handle graphs with inputs being Cuda Ndarrays
-            tmp_in, tmp_out = gpu_reconstruct_graph(scan_ins,
-                                                    scan_outs)
-            local_fgraph = gof.FunctionGraph(tmp_in, tmp_out)
-            _cmodule_key = gof.CLinker().cmodule_key_(local_fgraph, [])
-            info['gpu_hash'] = hash(_cmodule_key)
+            info['gpu_hash'] = gof.graph.graph_hash(scan_ins, scan_outs)
 
             _outputs = scan_op.Scan(
                 scan_ins,
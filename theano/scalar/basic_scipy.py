@@ -14,7 +14,6 @@ from theano.scalar.basic import (upgrade_to_float_no_complex,
 imported_scipy_special = False
 try:
     import scipy.special
-    import scipy.stats
     imported_scipy_special = True
 # Importing scipy.special may raise ValueError.
 # See http://projects.scipy.org/scipy/ticket/1739
@@ -362,6 +361,8 @@ class Chi2SF(BinaryScalarOp):
 
     @staticmethod
     def st_impl(x, k):
+        # scipy.stats takes long to import, so only do it when needed.
+        import scipy.stats
         return scipy.stats.chi2.sf(x, k)
 
     def impl(self, x, k):
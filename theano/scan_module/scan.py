@@ -81,7 +81,8 @@ def scan(fn,
          name=None,
          profile=False,
          allow_gc=None,
-         strict=False):
+         strict=False,
+         checkpoint=None):
     """
     This function constructs and applies a Scan op to the provided
     arguments.
@@ -335,6 +336,18 @@ def scan(fn,
         If true, all the shared variables used in ``fn`` must be provided as a
         part of ``non_sequences`` or ``sequences``.
 
+    checkpoint
+        Trade computation for memory in the gradient of ``scan``. If it is a
+        positive int ``k``, the gradient only stores the states at the
+        start of every segment of ``k`` steps, and computes the states of
+        each segment again when it needs them. If it is ``'sqrt'``, ``k`` is
+        the square root of the number of steps, so that ``2 * sqrt(n_steps)``
+        states are kept in memory instead of ``n_steps``. 0 disables it. If
+        set to None, this will use the value of config.scan.grad_checkpoint.
+        This is only done for loops whose outputs are all recurrent states
+        or sequences (no ``until`` condition, no updates of shared variables
+        and no ``truncate_gradient``).
+
     Returns
     -------
     tuple
@@ -1021,6 +1034,14 @@ def scan(fn,
     tap_array = mit_sot_tap_array + [[-1] for x in xrange(n_sit_sot)]
     if allow_gc is None:
         allow_gc = config.scan.allow_gc
+    if checkpoint is None:
+        checkpoint = config.scan.grad_checkpoint
+        if checkpoint != 'sqrt':
+            checkpoint = int(checkpoint or 0)
+    elif checkpoint != 'sqrt' and (not isinstance(checkpoint, integer_types) or
+                                   checkpoint < 0):
+        raise ValueError("scan: checkpoint should be a non-negative int or "
+                         "'sqrt', got %s" % (checkpoint,))
     info = OrderedDict()
 
     info['tap_array'] = tap_array
@@ -1041,6 +1062,7 @@ def scan(fn,
     info['profile'] = profile
     info['allow_gc'] = allow_gc
     info['strict'] = strict
+    info['checkpoint'] = checkpoint
 
     local_op = scan_op.Scan(inner_inputs, new_outs, info)
 
@@ -0,0 +1,242 @@
+#include <Python.h>
+#include "theano_mod_helper.h"
+#include "numpy/arrayobject.h"
+
+#if PY_VERSION_HEX >= 0x03000000
+#include "numpy/npy_3kcompat.h"
+#define PyCObject_AsVoidPtr  NpyCapsule_AsVoidPtr
+#define PyCObject_GetDesc  NpyCapsule_GetDesc
+#define PyCObject_Check NpyCapsule_Check
+#endif
+
+/**
+
+The time loop of a Scan op whose inner graph is compiled by the CLinker
+into a single cthunk (see Scan.make_c_loop in scan_op.py).
+
+At each step, the inputs of the inner graph that change from step to step
+are set to views of a row of an outer array (a sequence, or the buffer of
+a mit-sot or sit-sot output for one of its taps), the cthunk is called,
+and its outputs are copied to a row of the buffers of the outputs.
+
+  */
+
+/**
+  One input or output of the inner graph that the loop updates at each
+  step: the storage cell of the cthunk and the outer array. At step t, the
+  row (base + t) % modulus of the array is used.
+  */
+typedef struct {
+  PyObject * cell;
+  PyArrayObject * array;
+  npy_intp base;
+  npy_intp modulus;
+} loop_slot;
+
+static int unpack_slots(PyObject * pylist, loop_slot ** dst, Py_ssize_t * len,
+                        const char * name)
+{
+  if (!PyList_Check(pylist))
+    {
+      PyErr_Format(PyExc_TypeError, "%s must be a list", name);
+      return -1;
+    }
+  *len = PyList_Size(pylist);
+  *dst = (loop_slot*)calloc(*len + 1, sizeof(loop_slot));
+  if (!*dst)
+    {
+      PyErr_NoMemory();
+      return -1;
+    }
+  for (Py_ssize_t i = 0; i < *len; ++i)
+    {
+      PyObject * array;
+      loop_slot * slot = *dst + i;
+      if (!PyArg_ParseTuple(PyList_GET_ITEM(pylist, i), "OOnn",
+                            &slot->cell, &array, &slot->base, &slot->modulus))
+        return -1;
+      if (!PyList_Check(slot->cell) || PyList_Size(slot->cell) != 1)
+        {
+          PyErr_Format(PyExc_TypeError,
+                       "%s: the storage cells must be lists of length 1",
+                       name);
+          return -1;
+        }
+      if (array == Py_None)
+        continue;
+      if (!PyArray_Check(array) || PyArray_NDIM((PyArrayObject*)array) < 1
+          || slot->modulus <= 0
+          || slot->modulus > PyArray_DIMS((PyArrayObject*)array)[0])
+        {
+          PyErr_Format(PyExc_ValueError,
+                       "%s: expected an array with at least one dimension"
+                       " and at least `modulus` rows", name);
+          return -1;
+        }
+      slot->array = (PyArrayObject*)array;
+    }
+  return 0;
+}
+
+/**
+  Return a new view of the row `i` of `a`.
+  */
+static PyObject * row_view(PyArrayObject * a, npy_intp i)
+{
+  PyArray_Descr * descr = PyArray_DESCR(a);
+  Py_INCREF(descr);
+  PyObject * view = PyArray_NewFromDescr(
+      &PyArray_Type, descr, PyArray_NDIM(a) - 1,
+      PyArray_DIMS(a) + 1, PyArray_STRIDES(a) + 1,
+      PyArray_BYTES(a) + i * PyArray_STRIDES(a)[0],
+      PyArray_FLAGS(a) & ~NPY_ARRAY_OWNDATA, NULL);
+  if (!view)
+    return NULL;
+  Py_INCREF(a);
+  if (PyArray_SetBaseObject((PyArrayObject*)view, (PyObject*)a) < 0)
+    {
+      Py_DECREF(view);
+      return NULL;
+    }
+  PyArray_UpdateFlags((PyArrayObject*)view, NPY_ARRAY_UPDATE_ALL);
+  return view;
+}
+
+/**
+  Copy the value computed for an output to its row of the output buffer.
+  */
+static int store_output(loop_slot * slot, npy_intp t)
+{
+  PyObject * value = PyList_GET_ITEM(slot->cell, 0);
+  if (!PyArray_Check(value))
+    {
+      PyErr_SetString(PyExc_TypeError,
+                      "Scan: the inner function did not return an ndarray");
+      return -1;
+    }
+  PyArrayObject * dest = (PyArrayObject*)row_view(
+      slot->array, (slot->base + t) % slot->modulus);
+  if (!dest)
+    return -1;
+  if (PyArray_NDIM(dest) != PyArray_NDIM((PyArrayObject*)value)
+      || !PyArray_CompareLists(PyArray_DIMS(dest),
+                               PyArray_DIMS((PyArrayObject*)value),
+                               PyArray_NDIM(dest)))
+    {
+      PyErr_Format(PyExc_ValueError,
+                   "Scan: the shape of an output changed at step %ld",
+                   (long)t);
+      Py_DECREF(dest);
+      return -1;
+    }
+  int err = PyArray_CopyInto(dest, (PyArrayObject*)value);
+  Py_DECREF(dest);
+  return err;
+}
+
+static PyObject * run_loop(PyObject * self, PyObject * args)
+{
+  PyObject * py_cthunk = NULL;
+  PyObject * py_inputs = NULL;
+  PyObject * py_outputs = NULL;
+  Py_ssize_t t_begin, t_end, n_inputs, n_outputs;
+  loop_slot * inputs = NULL;
+  loop_slot * outputs = NULL;
+  PyObject * rval = NULL;
+  int failure = 0;
+
+  if (!PyArg_ParseTuple(args, "OnnOO", &py_cthunk, &t_begin, &t_end,
+                        &py_inputs, &py_outputs))
+    return NULL;
+  if (!PyCObject_Check(py_cthunk))
+    {
+      PyErr_SetString(PyExc_ValueError,
+                      "Argument to run_loop must be a PyCObject.");
+      return NULL;
+    }
+  int (*fn)(void*) = (int (*)(void*))(PyCObject_AsVoidPtr(py_cthunk));
+  void * it = PyCObject_GetDesc(py_cthunk);
+
+  if (unpack_slots(py_inputs, &inputs, &n_inputs, "inputs")
+      || unpack_slots(py_outputs, &outputs, &n_outputs, "outputs"))
+    goto done;
+
+  for (Py_ssize_t t = t_begin; t < t_end; ++t)
+    {
+      for (Py_ssize_t i = 0; i < n_inputs; ++i)
+        {
+          if (!inputs[i].array)
+            continue;
+          PyObject * view = row_view(
+              inputs[i].array, (inputs[i].base + t) % inputs[i].modulus);
+          if (!view)
+            goto done;
+          // Steals the reference to view.
+          PyList_SetItem(inputs[i].cell, 0, view);
+        }
+      failure = fn(it);
+      if (failure)
+        break;
+      for (Py_ssize_t i = 0; i < n_outputs; ++i)
+        {
+          if (outputs[i].array && store_output(outputs + i, t))
+            goto done;
+        }
+    }
+  rval = PyLong_FromLong(failure);
+
+done:
+  free(inputs);
+  free(outputs);
+  return rval;
+}
+
+static PyObject * get_version(PyObject *dummy, PyObject *args)
+{
+  PyObject *result = PyFloat_FromDouble(0.1);
+  return result;
+}
+
+static PyMethodDef scan_loop_methods[] = {
+  {"run_loop", run_loop, METH_VARARGS,
+   "run_loop(cthunk, t_begin, t_end, inputs, outputs)\n\n"
+   "Run the steps t_begin to t_end of a Scan loop. Return 0, or the failure"
+   " code of the cthunk."},
+  {"get_version",  get_version, METH_VARARGS, "Get extension version."},
+  {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+#if defined(NPY_PY3K)
+static struct PyModuleDef moduledef = {
+        PyModuleDef_HEAD_INIT,
+        "scan_loop",
+        NULL,
+        -1,
+        scan_loop_methods,
+        NULL,
+        NULL,
+        NULL,
+        NULL
+};
+#endif
+#if defined(NPY_PY3K)
+#define RETVAL m
+PyMODINIT_FUNC
+PyInit_scan_loop(void) {
+#else
+#define RETVAL
+PyMODINIT_FUNC
+initscan_loop(void)
+{
+#endif
+    PyObject* m;
+
+    import_array();
+#if defined(NPY_PY3K)
+    m = PyModule_Create(&moduledef);
+#else
+    m = Py_InitModule3("scan_loop", scan_loop_methods,
+                       "The time loop of Scan ops, in C.");
+#endif
+    return RETVAL;
+}
@@ -207,13 +207,14 @@ class Scan(PureOp):
         if self.info['gpu'] or self.info['gpua']:
             self._hash_inner_graph = self.info['gpu_hash']
         else:
-            tmp_in, tmp_out = scan_utils.reconstruct_graph(self.inputs,
-                                                           self.outputs)
-            local_fgraph = gof.FunctionGraph(tmp_in, tmp_out, clone=False)
-            self._cmodule_key = gof.CLinker().cmodule_key_variables(self.inputs,
-                                                                    self.outputs,
-                                                                    [])
-            self._hash_inner_graph = hash(self._cmodule_key)
+            for var in gof.graph.inputs(self.outputs):
+                if (var not in self.inputs and
+                        not isinstance(var, gof.Constant)):
+                    raise gof.fg.MissingInputError(
+                        "An input of the inner graph of scan was not"
+                        " provided and not given a value.", variable=var)
+            self._hash_inner_graph = gof.graph.graph_hash(self.inputs,
+                                                          self.outputs)
 
         # Compute mappings between outer inputs, outer outputs, inner
         # inputs and inner outputs to determine with variables are associated
@@ -293,6 +294,13 @@ class Scan(PureOp):
 
     def __setstate__(self, d):
         self.__dict__.update(d)
+        # The structural hash of the inner graph is not stable across
+        # processes, so the pickled one can't be compared to the hash of
+        # the Scans of this process.
+        self._hash_inner_graph = gof.graph.graph_hash(self.inputs,
+                                                      self.outputs)
+        if self.info['gpu'] or self.info.get('gpua', False):
+            self.info['gpu_hash'] = self._hash_inner_graph
         if "allow_gc" not in self.__dict__:
             self.allow_gc = True
             self.info['allow_gc'] = True
@@ -649,6 +657,9 @@ class Scan(PureOp):
         for key in keys_to_check:
             if self.info[key] != other.info[key]:
                 return False
+        # Graphs that compute the same thing have the same structural hash.
+        if self._hash_inner_graph != other._hash_inner_graph:
+            return False
         # If everything went OK up to here, there is still one thing to
         # check. Namely, do the internal graph represent same
         # computations
@@ -697,49 +708,15 @@ class Scan(PureOp):
                      self._hash_inner_graph,
                      scan_utils.hash_listsDictsTuples(self.info)))
 
-    def make_thunk(self, node, storage_map, compute_map, no_recycling,
-                   impl=None):
+    def inner_function_args(self):
         """
-
-        Parameters
-        ----------
-        node
-            Something previously returned by self.make_node.
-        storage_map
-            dict variable -> one-element-list where a computed
-            value for this variable may be found.
-        compute_map
-            dict variable -> one-element-list where a boolean
-            value will be found. The boolean indicates whether the
-            variable's storage_map container contains a valid value (True)
-            or if it has not been computed yet (False).
-        no_recycling
-            List of variables for which it is forbidden to reuse memory
-            allocated by a previous call.
-        impl
-            Use 'py' if we want python execution.
-        Notes
-        -----
-        If the thunk consults the storage_map on every call, it is safe
-        for it to ignore the no_recycling argument, because elements of the
-        no_recycling list will have a value of None in the storage map. If
-        the thunk can potentially cache return values (like CLinker does),
-        then it must not do so for variables in the no_recycling list.
+        Return the arguments of `theano.function` used to compile the inner
+        graph, as a tuple (inputs, outputs, kwargs), or None if it is
+        already compiled (see `theano.compile.parallel_opt`).
 
         """
-
-        # Before building the thunk, validate that the inner graph is
-        # coherent
-        self.validate_inner_graph()
-
-        # Setting up all my variables in what I believe is a more Cython
-        # friendly form
-
-        node_input_storage = [storage_map[r] for r in node.inputs]
-        node_output_storage = [storage_map[r] for r in node.outputs]
-        node_input_compute = [compute_map[r] for r in node.inputs]
-        node_output_compute = [compute_map[r] for r in node.outputs]
-        #_logger.debug('Compiling node %i of graph' % node_idx)
+        if getattr(self, 'fn', None):
+            return None
         # If a shared variable is the result of a ViewOp it is a clear
         # indication that we need to copy that value after the perform of
         # scan is done
@@ -838,6 +815,53 @@ class Scan(PureOp):
 
             compilation_mode = self.mode_instance
 
+        return (wrapped_inputs, wrapped_outputs,
+                dict(mode=compilation_mode, name=self.name,
+                     on_unused_input='ignore'))
+
+    def make_thunk(self, node, storage_map, compute_map, no_recycling,
+                   impl=None):
+        """
+
+        Parameters
+        ----------
+        node
+            Something previously returned by self.make_node.
+        storage_map
+            dict variable -> one-element-list where a computed
+            value for this variable may be found.
+        compute_map
+            dict variable -> one-element-list where a boolean
+            value will be found. The boolean indicates whether the
+            variable's storage_map container contains a valid value (True)
+            or if it has not been computed yet (False).
+        no_recycling
+            List of variables for which it is forbidden to reuse memory
+            allocated by a previous call.
+        impl
+            Use 'py' if we want python execution.
+        Notes
+        -----
+        If the thunk consults the storage_map on every call, it is safe
+        for it to ignore the no_recycling argument, because elements of the
+        no_recycling list will have a value of None in the storage map. If
+        the thunk can potentially cache return values (like CLinker does),
+        then it must not do so for variables in the no_recycling list.
+
+        """
+
+        # Before building the thunk, validate that the inner graph is
+        # coherent
+        self.validate_inner_graph()
+
+        # Setting up all my variables in what I believe is a more Cython
+        # friendly form
+
+        node_input_storage = [storage_map[r] for r in node.inputs]
+        node_output_storage = [storage_map[r] for r in node.outputs]
+        node_input_compute = [compute_map[r] for r in node.inputs]
+        node_output_compute = [compute_map[r] for r in node.outputs]
+        #_logger.debug('Compiling node %i of graph' % node_idx)
         profile = None
         if (theano.config.profile or
             (isinstance(self.profile, (string_types, bool, integer_types))
@@ -851,12 +875,12 @@ class Scan(PureOp):
         # make_thunk can be called many times on the same op
         # we do not want to recompile the inner fct every time.
         if not getattr(self, 'fn', None):
+            wrapped_inputs, wrapped_outputs, kwargs = \
+                self.inner_function_args()
             self.fn = function(wrapped_inputs,
                                wrapped_outputs,
-                               mode=compilation_mode,
-                               name=self.name,
                                profile=profile,
-                               on_unused_input='ignore')
+                               **kwargs)
 
         # Analyse the compile inner function to determine which inputs and
         # outputs are on the gpu and speed up some checks during the execution
@@ -865,6 +889,9 @@ class Scan(PureOp):
         self.outs_is_tensor = [isinstance(out, theano.tensor.TensorVariable)
                                for out in self.fn.maker.fgraph.outputs]
 
+        # Only `execute` and `execute_c_loop` start the circular output
+        # buffers at their final offset (see `start_positions`), the Cython
+        # loop rotates them after the loop.
         try:
             if impl == 'py':
                 raise theano.gof.cmodule.MissingGXX
@@ -944,6 +971,12 @@ class Scan(PureOp):
                                          self, node)
         except (ImportError, theano.gof.cmodule.MissingGXX):
             p = self.execute
+        if impl != 'py':
+            c_loop = self.make_c_loop()
+            if c_loop is not None:
+                def p_c_loop(node, args, outs, c_loop=c_loop):
+                    return self.execute_c_loop(node, args, outs, c_loop)
+                p = p_c_loop
         # default arguments are stored in the closure of `rval`
 
         # Big ugly hack since we can't get the real value of allow_gc
@@ -1138,25 +1171,7 @@ class Scan(PureOp):
         t0_call = time.time()
         t_fn = 0
         n_steps = args[0]
-        seqs = []
-        if n_steps < 0:
-            # History, in the past, this was used for backward
-            # scan. Now we reverse the inputs outside of scan.
-            raise IndexError(
-                "Scan was asked to run for negative number of step %d" %
-                n_steps)
-        elif n_steps == 0:
-            raise NotImplementedError(
-                "We didn't implemented yet the case where scan do 0 iteration")
-        else:
-            for idx, seq in enumerate(args[1:self.seqs_arg_offset]):
-                if seq.shape[0] < n_steps:
-                    raise ValueError(('Sequence is shorter then the required '
-                                      'number of steps : (n_steps, seq, '
-                                      'seq.shape):'), n_steps,
-                                     node.inputs[1 + idx],
-                                     seq.shape)
-                seqs.append(seq)
+        seqs = self.check_sequences(node, args)
 
         # 2. Allocate memory for the outputs. Construct the list:
         #       store_steps  -- map containting the length of each output
@@ -1171,29 +1186,11 @@ class Scan(PureOp):
                              self.nit_sot_arg_offset + self.n_nit_sot]
                         ]
 
-        pos = [(-self.mintaps[idx]) % store_steps[idx] for idx
-               in xrange(self.n_outs + self.n_nit_sot)]
+        pos = self.start_positions(store_steps, n_steps)
         if not getattr(self, 'destroy_map', None):
             self.destroy_map = OrderedDict()
         # 2.1 Create storage space for outputs
-        for idx in xrange(self.n_outs):
-            if idx in self.destroy_map:
-                # ^ Case 1. Outputs should be computed inplace of their
-                # initial state
-                outs[idx][0] = args[self.seqs_arg_offset + idx]
-            elif (outs[idx][0] is not None and
-                  outs[idx][0].shape[1:] == args[self.seqs_arg_offset +
-                                                 idx].shape[1:]
-                  and outs[idx][0].shape[0] >= store_steps[idx]):
-                # Put in the values of the initial state
-                outs[idx][0] = outs[idx][0][:store_steps[idx]]
-                if idx > self.n_mit_mot:
-                    l = - self.mintaps[idx]
-                    outs[idx][0][:l] = args[self.seqs_arg_offset + idx][:l]
-                else:
-                    outs[idx][0][:] = args[self.seqs_arg_offset + idx]
-            else:
-                outs[idx][0] = args[self.seqs_arg_offset + idx].copy()
+        self.allocate_outputs(args, outs, store_steps, pos)
 
         offset = self.nit_sot_arg_offset + self.n_nit_sot
         other_args = args[offset:]
@@ -1493,12 +1490,266 @@ class Scan(PureOp):
             i = i + 1
 
         # 6. Check if you need to re-order output buffers
+        self.reorder_outputs(node, outs, store_steps, pos, i, n_steps)
+
+        # We never reuse the input or output storage of the
+        # inner function so we clear it.
+        for i_s in input_storage:
+            i_s.storage[0] = None
+        for o_s in output_storage:
+            o_s.storage[0] = None
+
+        t_call = time.time() - t0_call
+        # NOTE: make this match what's in function_module.Function
+        # and this little string helps us to find this spot:
+        # "PROFILE_CODE"
+
+        if hasattr(self.fn.maker, 'profile') and self.fn.maker.profile:
+            profile = self.fn.maker.profile
+            profile.callcount += 1
+            profile.nbsteps += n_steps
+            profile.call_time += t_call
+            profile.vm_call_time += t_fn
+            if hasattr(self.fn.fn, 'update_profile'):
+                self.fn.fn.update_profile(profile)
+
+        self.t_call = t_call
+        self.t_fn = t_fn
+
+    def make_c_loop(self):
+        """
+        Compile the inner graph into a single C thunk for `execute_c_loop`.
+
+        With the Theano flag ``scan.c_loop``, the whole inner graph is
+        compiled by the CLinker, and the time loop calls it at each step
+        without going back to Python (see scan_loop.c). This is only
+        possible on the CPU, when all the ops of the inner graph have C
+        code and the mode of the inner function allows C code, and for
+        scans without mit-mot or shared outputs and without condition.
+
+        Returns
+        -------
+        tuple or None
+            The thunk and the storage cells of its inputs and outputs, or
+            None if the inner graph can't be compiled that way.
+
+        """
+        if (not config.scan.c_loop or not config.cxx or
+                self.as_while or self.n_mit_mot or self.n_shared_outs or
+                self.info['gpu'] or self.info['gpua'] or
+                not all(self.inps_is_tensor) or
+                not all(self.outs_is_tensor) or
+                not isinstance(self.fn.maker.linker,
+                               (gof.vm.VM_Linker, gof.OpWiseCLinker,
+                                gof.CLinker)) or
+                getattr(self.fn.maker.linker, 'c_thunks', True) is False or
+                getattr(self.fn.maker, 'profile', None)):
+            return None
+        fgraph = self.fn.maker.fgraph
+        if not all(isinstance(node.op, gof.op.CLinkerOp)
+                   for node in fgraph.apply_nodes):
+            return None
+        try:
+            from . import scan_loop_ext  # noqa
+            linker = gof.CLinker().accept(fgraph, no_recycling=[])
+            thunk, in_storage, out_storage = linker.make_thunk()
+        except (ImportError, NotImplementedError,
+                gof.utils.MethodNotDefined, gof.cmodule.MissingGXX) as e:
+            _logger.debug('Scan %s does not use the C loop: %s',
+                          self.name, e)
+            return None
+        return (thunk, [c.storage for c in in_storage],
+                [c.storage for c in out_storage])
+
+    def execute_c_loop(self, node, args, outs, c_loop):
+        """
+        Like `execute`, but the time loop runs in C (see `make_c_loop`).
+
+        """
+        from .scan_loop_ext import run_loop
+        t0_call = time.time()
+        thunk, in_cells, out_cells = c_loop
+        n_steps = args[0]
+        seqs = self.check_sequences(node, args)
+
+        store_steps = [arg.shape[0] for arg
+                       in args[self.seqs_arg_offset:
+                               self.shared_arg_offset]]
+        store_steps += [arg for arg in
+                        args[self.nit_sot_arg_offset:
+                             self.nit_sot_arg_offset + self.n_nit_sot]
+                        ]
+        pos = self.start_positions(store_steps, n_steps)
+        if not getattr(self, 'destroy_map', None):
+            self.destroy_map = OrderedDict()
+        self.allocate_outputs(args, outs, store_steps, pos)
+
+        # At step t, the loop uses the row (base + t) % modulus of the
+        # arrays, given as (storage cell, array, base, modulus).
+        inputs = [(in_cells[idx], seq, 0, n_steps)
+                  for idx, seq in enumerate(seqs)]
+        offset = self.n_seqs
+        for idx in xrange(self.n_outs):
+            for tap in self.tap_array[idx]:
+                inputs.append((in_cells[offset], outs[idx][0],
+                               (pos[idx] + tap) % store_steps[idx],
+                               store_steps[idx]))
+                offset += 1
+        other_args = args[self.nit_sot_arg_offset + self.n_nit_sot:]
+        for idx, arg in enumerate(other_args):
+            in_cells[offset + idx][0] = arg
+        outputs = [(out_cells[idx], outs[idx][0], pos[idx], store_steps[idx])
+                   for idx in xrange(self.n_outs)]
+        # The shape of the nit-sot outputs is known after the first step.
+        outputs += [(out_cells[idx], None, 0, 1)
+                    for idx in xrange(self.n_outs,
+                                      self.n_outs + self.n_nit_sot)]
+        try:
+            failure = run_loop(thunk.cthunk, 0, 1, inputs, outputs)
+            if not failure:
+                for j in xrange(self.n_outs, self.n_outs + self.n_nit_sot):
+                    value = out_cells[j][0]
+                    shape = (store_steps[j],) + value.shape
+                    if (outs[j][0] is None or
+                            outs[j][0].shape[0] < store_steps[j] or
+                            outs[j][0].shape[1:] != shape[1:] or
+                            outs[j][0].dtype != value.dtype):
+                        outs[j][0] = node.outputs[j].type.value_zeros(shape)
+                    elif outs[j][0].shape[0] != store_steps[j]:
+                        outs[j][0] = outs[j][0][:store_steps[j]]
+                    outs[j][0][pos[j]] = value
+                    outputs[j] = (out_cells[j], outs[j][0], pos[j],
+                                  store_steps[j])
+                failure = run_loop(thunk.cthunk, 1, n_steps, inputs, outputs)
+            if failure:
+                try:
+                    thunk.raise_failure(failure)
+                except Exception:
+                    if hasattr(thunk, 'position_of_error'):
+                        gof.link.raise_with_op(
+                            thunk.nodes[thunk.position_of_error])
+                    raise
+        finally:
+            for cell in in_cells + out_cells:
+                cell[0] = None
+
+        pos = [(idx + n_steps) % store for idx, store in
+               izip(pos, store_steps)]
+        self.reorder_outputs(node, outs, store_steps, pos, n_steps, n_steps)
+        self.t_call = time.time() - t0_call
+        self.t_fn = self.t_call
+
+    def check_sequences(self, node, args):
+        """
+        Check the number of steps and the length of the sequences in `args`,
+        and return the sequences.
+
+        """
+        n_steps = args[0]
+        seqs = []
+        if n_steps < 0:
+            # History, in the past, this was used for backward
+            # scan. Now we reverse the inputs outside of scan.
+            raise IndexError(
+                "Scan was asked to run for negative number of step %d" %
+                n_steps)
+        elif n_steps == 0:
+            raise NotImplementedError(
+                "We didn't implemented yet the case where scan do 0 iteration")
+        else:
+            for idx, seq in enumerate(args[1:self.seqs_arg_offset]):
+                if seq.shape[0] < n_steps:
+                    raise ValueError(('Sequence is shorter then the required '
+                                      'number of steps : (n_steps, seq, '
+                                      'seq.shape):'), n_steps,
+                                     node.inputs[1 + idx],
+                                     seq.shape)
+                seqs.append(seq)
+        return seqs
+
+    def start_positions(self, store_steps, n_steps):
+        """
+        Return the row of the output buffers written by the first step.
+
+        The buffers of the mit-sot, sit-sot and nit-sot outputs that keep
+        fewer rows than the number of steps are circular. When the number of
+        steps is known in advance (there is no condition), they start at the
+        row that makes the last step write their last row, so that
+        `reorder_outputs` has nothing to do after the loop.
+
+        Only the Python loop (`execute`) and the C loop (`execute_c_loop`)
+        use these positions. The Cython loop of scan_perform.pyx, which is
+        used by default when it can be compiled, still starts the buffers
+        at the row after the initial state and rotates them after the loop.
+
+        """
+        pos = []
+        for idx in xrange(self.n_outs + self.n_nit_sot):
+            if (idx >= self.n_mit_mot and not self.as_while and
+                    store_steps[idx] < n_steps - self.mintaps[idx]):
+                pos.append((-n_steps) % store_steps[idx])
+            else:
+                pos.append((-self.mintaps[idx]) % store_steps[idx])
+        return pos
+
+    def allocate_outputs(self, args, outs, store_steps, pos):
+        """
+        Put the initial states of the outputs in their buffers, `outs`.
+
+        The buffers of the outputs computed inplace are their initial
+        states, the others reuse the previous buffers when they are large
+        enough. The initial states of the mit-sot and sit-sot outputs are
+        then moved to the rows just before `pos` (see `start_positions`).
+
+        """
+        for idx in xrange(self.n_outs):
+            if idx in self.destroy_map:
+                # ^ Case 1. Outputs should be computed inplace of their
+                # initial state
+                outs[idx][0] = args[self.seqs_arg_offset + idx]
+            elif (outs[idx][0] is not None and
+                  outs[idx][0].shape[1:] == args[self.seqs_arg_offset +
+                                                 idx].shape[1:]
+                  and outs[idx][0].shape[0] >= store_steps[idx]):
+                # Put in the values of the initial state
+                outs[idx][0] = outs[idx][0][:store_steps[idx]]
+                if idx > self.n_mit_mot:
+                    l = - self.mintaps[idx]
+                    outs[idx][0][:l] = args[self.seqs_arg_offset + idx][:l]
+                else:
+                    outs[idx][0][:] = args[self.seqs_arg_offset + idx]
+            else:
+                outs[idx][0] = args[self.seqs_arg_offset + idx].copy()
+
+            if idx < self.n_mit_mot:
+                continue
+            l = - self.mintaps[idx]
+            start = (pos[idx] - l) % store_steps[idx]
+            if start != 0:
+                # The rows of the initial state wrap around the end of the
+                # buffer when start + l > store_steps[idx].
+                init = outs[idx][0][:l].copy()
+                first = min(l, store_steps[idx] - start)
+                outs[idx][0][start:start + first] = init[:first]
+                outs[idx][0][:l - first] = init[first:]
+
+    def reorder_outputs(self, node, outs, store_steps, pos, i, n_steps):
+        """
+        Put the rows of the output buffers in the order of the steps, after
+        `i` steps.
+
+        The buffers that keep fewer rows than the number of steps are
+        circular: `pos` is the position of the next row to write. They are
+        already in order when it is 0, which `start_positions` ensures for
+        the scans without condition.
+
+        """
         begin = self.n_mit_mot
         end = self.n_outs + self.n_nit_sot
         for idx in xrange(begin, end):
-            if (store_steps[idx] < i - self.mintaps[idx] and
-                pos[idx] < store_steps[idx]):
-
+            if store_steps[idx] < i - self.mintaps[idx]:
+                if pos[idx] == 0:
+                    continue
                 pdx = pos[idx]
                 if pdx >= store_steps[idx] // 2:
                     # It seems inefficient to copy the bigger part of the
@@ -1546,30 +1797,6 @@ class Scan(PureOp):
                     # little trick that I used
                     outs[idx][0] = outs[idx][0][:-(n_steps - i)]
 
-        # We never reuse the input or output storage of the
-        # inner function so we clear it.
-        for i_s in input_storage:
-            i_s.storage[0] = None
-        for o_s in output_storage:
-            o_s.storage[0] = None
-
-        t_call = time.time() - t0_call
-        # NOTE: make this match what's in function_module.Function
-        # and this little string helps us to find this spot:
-        # "PROFILE_CODE"
-
-        if hasattr(self.fn.maker, 'profile') and self.fn.maker.profile:
-            profile = self.fn.maker.profile
-            profile.callcount += 1
-            profile.nbsteps += n_steps
-            profile.call_time += t_call
-            profile.vm_call_time += t_fn
-            if hasattr(self.fn.fn, 'update_profile'):
-                self.fn.fn.update_profile(profile)
-
-        self.t_call = t_call
-        self.t_fn = t_fn
-
     # Infer Shape
     def infer_shape(self, node, input_shapes):
         # input_shapes correspond to the shapes of node.inputs
@@ -1917,7 +2144,237 @@ class Scan(PureOp):
         return mappings
 
     # GRAD FUNCTION
+    def can_checkpoint_grad(self, dC_douts):
+        """
+        Return True if `grad` should recompute the states of this scan.
+
+        This is the case when the scan was created with a ``checkpoint``
+        value and only has sit-sot, mit-sot and nit-sot outputs.
+
+        """
+        return bool(self.info.get('checkpoint') and
+                    self.n_mit_mot == 0 and
+                    self.n_shared_outs == 0 and
+                    self.n_mit_sot + self.n_sit_sot > 0 and
+                    not self.as_while and
+                    self.truncate_gradient == -1 and
+                    not self.info['gpu'] and not self.info['gpua'] and
+                    not any(isinstance(g.type, NullType) for g in dC_douts))
+
+    def checkpointed_grad(self, inputs, dC_douts):
+        """
+        Compute the gradient of this scan without storing all its states.
+
+        The steps are split into segments of ``k`` steps, where ``k`` is
+        the ``checkpoint`` value of the scan, or the square root of the
+        number of steps if it is ``'sqrt'``. A first scan over the segments
+        computes and stores the states at the start of each segment. Then
+        the segments are processed from the last one: the states of the
+        segment are computed again from its first state, and the gradient
+        is backpropagated through it with the usual scan gradient. At most
+        ``n_steps / k + k`` states are kept in memory at the same time,
+        instead of ``n_steps``, at the cost of computing the forward pass
+        twice more.
+
+        Returns None if a gradient is undefined, in which case the usual
+        gradient should be used.
+
+        """
+        outs = self(*inputs)
+        if not isinstance(outs, (list, tuple)):
+            outs = [outs]
+        n_steps = inputs[0]
+        seqs = self.outer_seqs(inputs)
+        states = self.outer_mitsot(inputs) + self.outer_sitsot(inputs)
+        non_seqs = self.outer_non_seqs(inputs)
+        n_states = len(states)
+        # Number of initial rows of the buffer of each state.
+        init_lens = [-min(taps) for taps in self.tap_array]
+
+        if self.info['checkpoint'] == 'sqrt':
+            k = tensor.ceil(tensor.sqrt(n_steps)).astype('int64')
+        else:
+            k = tensor.constant(self.info['checkpoint'], dtype='int64')
+        # A segment must be long enough to compute all the initial rows of
+        # the buffers of the next one.
+        k = tensor.maximum(k, max(init_lens))
+        n_segments = tensor.maximum((n_steps + k - 1) // k, 1)
+
+        info = OrderedDict(self.info)
+        info['checkpoint'] = 0
+        info['name'] = 'segment_of_' + self.name
+        segment_op = Scan(*scan_utils.reconstruct_graph(self.inputs,
+                                                        self.outputs),
+                          info=info)
+
+        def is_float(var):
+            return var.type.dtype in tensor.float_dtypes
+
+        def segment(idx, firsts):
+            # Apply the scan on the idx-th segment, given the initial rows
+            # of its state buffers.
+            start = idx * k
+            length = tensor.minimum(k, n_steps - start)
+            seq_slices = [x[start:start + length] for x in seqs]
+            seg_outs = segment_op(*([length] + seq_slices +
+                                    [scan_utils.expand_empty(f, length)
+                                     for f in firsts] +
+                                    [length] * self.n_nit_sot +
+                                    non_seqs))
+            if not isinstance(seg_outs, (list, tuple)):
+                seg_outs = [seg_outs]
+            return start, length, seq_slices, seg_outs
+
+        # Forward pass: the initial rows of the state buffers of each
+        # segment.
+        firsts = [x[:l] for x, l in zip(states, init_lens)]
+
+        def forward_step(idx, *args):
+            seg_outs = segment(idx, args[:n_states])[3]
+            return [o[-l:] for o, l in zip(seg_outs, init_lens)]
+
+        # The outer variables used by the loops over the segments are given
+        # explicitly, otherwise scan would compute their whole graph again
+        # at each step.
+        outer_vars = [n_steps, k] + seqs + non_seqs
+        lasts, _ = theano.scan(forward_step,
+                               sequences=tensor.arange(n_segments),
+                               outputs_info=firsts,
+                               non_sequences=outer_vars,
+                               name='checkpoints_of_' + self.name,
+                               mode=self.mode,
+                               checkpoint=0)
+        if not isinstance(lasts, list):
+            lasts = [lasts]
+        checkpoints = [tensor.concatenate([tensor.shape_padleft(f), l[:-1]])
+                       for f, l in zip(firsts, lasts)]
+
+        # Backward pass, from the last segment.
+        g_outs = []
+        for out, g in zip(outs, dC_douts):
+            if isinstance(g.type, DisconnectedType) or not is_float(out):
+                g_outs.append(None)
+            else:
+                g_outs.append(g.astype(out.dtype))
+        float_seqs = [x for x in seqs if is_float(x)]
+        float_states = [j for j in xrange(n_states) if is_float(states[j])]
+        float_non_seqs = [x for x in non_seqs if is_float(x)]
+
+        def backward_step(idx, *args):
+            firsts = args[:n_states]
+            carries = args[n_states:n_states + len(float_states)]
+            accs = args[n_states + len(float_states):
+                        n_states + len(float_states) + len(float_non_seqs)]
+            start, length, seq_slices, seg_outs = segment(idx, firsts)
+            known_grads = OrderedDict()
+            for j, carry in zip(float_states, carries):
+                # The gradient on the new states of this segment, plus the
+                # one on the initial states of the next segment.
+                g = tensor.zeros_like(seg_outs[j])
+                if g_outs[j] is not None:
+                    g = tensor.set_subtensor(
+                        g[init_lens[j]:],
+                        g_outs[j][start + init_lens[j]:
+                                  start + length + init_lens[j]])
+                known_grads[seg_outs[j]] = tensor.inc_subtensor(
+                    g[length:], carry)
+            for j in xrange(n_states, len(seg_outs)):
+                if g_outs[j] is not None:
+                    known_grads[seg_outs[j]] = g_outs[j][start:
+                                                         start + length]
+            float_slices = [x for x in seq_slices if is_float(x)]
+            wrt = (float_slices + [firsts[j] for j in float_states] +
+                   float_non_seqs)
+            grads = gradient.grad(cost=None, wrt=wrt,
+                                  known_grads=known_grads,
+                                  disconnected_inputs='ignore',
+                                  return_disconnected='zero')
+            g_seqs = []
+            for x, g in zip(float_slices, grads):
+                # All the segments have k rows, to be stacked by scan.
+                padded = tensor.zeros([k] + [x.shape[d]
+                                             for d in xrange(1, x.ndim)],
+                                      dtype=g.dtype)
+                g_seqs.append(tensor.set_subtensor(padded[:length], g))
+            grads = grads[len(float_slices):]
+            new_carries = grads[:len(float_states)]
+            new_accs = [acc + g for acc, g in
+                        zip(accs, grads[len(float_states):])]
+            return g_seqs + new_carries + new_accs
+
+        outputs_info = ([None] * len(float_seqs) +
+                        [tensor.zeros_like(firsts[j]) for j in float_states] +
+                        [tensor.zeros_like(x) for x in float_non_seqs])
+        if not outputs_info:
+            return None
+        try:
+            results, _ = theano.scan(
+                backward_step,
+                sequences=[tensor.arange(n_segments)[::-1]] +
+                [c[::-1] for c in checkpoints],
+                outputs_info=outputs_info,
+                non_sequences=outer_vars + [g for g in g_outs
+                                            if g is not None],
+                name='grad_of_' + self.name,
+                mode=self.mode,
+                checkpoint=0)
+        except gradient.NullTypeGradError:
+            return None
+        if not isinstance(results, list):
+            results = [results]
+
+        g_seq_chunks = results[:len(float_seqs)]
+        g_firsts = [r[-1] for r in
+                    results[len(float_seqs):len(float_seqs) +
+                            len(float_states)]]
+        g_non_seqs = [r[-1] for r in
+                      results[len(float_seqs) + len(float_states):]]
+
+        def zero_grad(x):
+            return tensor.zeros_like(x, dtype=theano.config.floatX)
+
+        gradients = [DisconnectedType()()]
+        for x in seqs:
+            if not is_float(x):
+                gradients.append(zero_grad(x))
+                continue
+            chunks = g_seq_chunks.pop(0)[::-1]
+            g = chunks.reshape([n_segments * k] +
+                               [x.shape[d] for d in xrange(1, x.ndim)],
+                               ndim=x.ndim)
+            gradients.append(tensor.set_subtensor(
+                tensor.zeros_like(x)[:n_steps], g[:n_steps]))
+        for j, x in enumerate(states):
+            if not is_float(x):
+                gradients.append(zero_grad(x))
+                continue
+            # The initial rows of the outputs are the ones of the inputs.
+            g = g_firsts.pop(0)
+            if g_outs[j] is not None:
+                g = g + g_outs[j][:init_lens[j]]
+            gradients.append(tensor.set_subtensor(
+                tensor.zeros_like(x)[:init_lens[j]], g))
+        gradients += [DisconnectedType()() for x in xrange(self.n_nit_sot)]
+        for x in non_seqs:
+            if is_float(x):
+                gradients.append(g_non_seqs.pop(0))
+            else:
+                gradients.append(zero_grad(x))
+
+        # Mask disconnected gradients, like `grad` does.
+        connection_pattern = self.connection_pattern(outs[0].owner)
+        for idx in xrange(len(gradients)):
+            if not any(connection_pattern[idx][kdx] and
+                       not isinstance(dC_douts[kdx].type, DisconnectedType)
+                       for kdx in xrange(len(outs))):
+                gradients[idx] = DisconnectedType()()
+        return gradients
+
     def grad(self, inputs, dC_douts):
+        if self.can_checkpoint_grad(dC_douts):
+            gradients = self.checkpointed_grad(inputs, dC_douts)
+            if gradients is not None:
+                return gradients
         outs = self(*inputs)
         if not isinstance(outs, (list, tuple)):
             outs = [outs]
@@ -4,7 +4,9 @@ The Optimization provided in this file:
 
 local opt: remove_constants_and_unused_inputs_scan,
            constant_folding_for_scan2,
-           scan_merge_inouts
+           scan_merge_inouts,
+           scan_unroll,
+           scan_vectorize_map
            They are wrapped in in2out to create global opt.
 global opt: ScanInplaceOptimizer,
             PushOutNonSeqScan,
@@ -19,7 +21,8 @@ optdb: scan_eqopt1 (.1), scan_eqopt2(1.6), scan_inplace(75)
 scan_eqopt1 -> scan_seqopt1
 scan_seqopt1 -> in2out(remove_constants_and_unused_inputs_scan)(1),
                 PushOutNonSeqScan(2),
-                PushOutSeqScan(3), PushOutDot1(4)
+                PushOutSeqScan(3), in2out(scan_vectorize_map)(3.5),
+                PushOutDot1(4)
 scan_eqopt2 -> They are all global optimizer. (in2out convert local to global).
                This is important, as the order is important and all global
                optimizer run before local optimizer in the order they where
@@ -43,6 +46,7 @@ scan_eqopt2 -> They are all global optimizer. (in2out convert local to global).
 
                in2out(constant_folding),
                in2out(remove_constants_and_unused_inputs_scan1),
+               in2out(scan_unroll),
                ScanMerge,
                in2out(remove_constants_and_unused_inputs_scan2),
                in2out(scan_merge_inouts),
@@ -59,6 +63,7 @@ import numpy
 import theano
 from theano import tensor, scalar
 from theano.tensor import opt, get_scalar_constant_value, Alloc, AllocEmpty
+from theano.tensor.batch import batch_graph
 from theano import gof
 from six import integer_types, iteritems
 from six.moves import xrange
@@ -2077,6 +2082,128 @@ def scan_merge_inouts(node):
     return na.outer_outputs
 
 
+@gof.local_optimizer([scan_op.Scan])
+def scan_unroll(node):
+    """
+    Replace a scan with a small constant number of steps by its unrolled
+    inner graph.
+
+    The steps of a scan can't be optimized together, and each one pays the
+    call of the inner function. When the number of steps is at most the
+    Theano flag ``scan.unroll``, and the unrolled graph has at most
+    ``scan.unroll_max_nodes`` nodes, the inner graph is copied once per
+    step, so that the fusion of elemwise ops and the gemm optimizations can
+    work across the steps.
+
+    This is only done for scans without mit-mot outputs, condition or
+    inner scans, on which the memory optimization of ScanSaveMem was not
+    applied: the buffers of the mit-sot and sit-sot outputs then hold the
+    initial taps followed by the outputs of all the steps.
+
+    """
+    op = node.op
+    if (not isinstance(op, scan_op.Scan) or theano.config.scan.unroll <= 0 or
+            op.as_while or op.n_mit_mot or op.info['gpu'] or
+            op.info['gpua'] or hasattr(op, '_scan_savemem_visited')):
+        return False
+    try:
+        n_steps = int(get_scalar_constant_value(node.inputs[0]))
+    except tensor.NotScalarConstantError:
+        return False
+    if not 0 < n_steps <= theano.config.scan.unroll:
+        return False
+    inner_nodes = gof.graph.ops(op.inputs, op.outputs)
+    if (n_steps * len(inner_nodes) > theano.config.scan.unroll_max_nodes or
+            any(isinstance(n.op, scan_op.Scan) for n in inner_nodes)):
+        # The size of the inner graph doesn't account for the steps of the
+        # inner scans.
+        return False
+
+    a = scan_args(node.inputs, node.outputs, op.inputs, op.outputs, op.info)
+    taps = a.mit_sot_in_slices + [[-1]] * len(a.outer_in_sit_sot)
+    # The rows of the buffer of each mit-sot and sit-sot output: first its
+    # initial taps, then the outputs of the steps.
+    states = [[buf[i] for i in xrange(-min(t))]
+              for buf, t in zip(a.outer_in_mit_sot + a.outer_in_sit_sot,
+                                taps)]
+    nit_sot = [[] for out in a.inner_out_nit_sot]
+    shared = list(a.outer_in_shared)
+    inner_in_states = a.inner_in_mit_sot + [[x] for x in a.inner_in_sit_sot]
+    inner_outs = (a.inner_out_mit_sot + a.inner_out_sit_sot +
+                  a.inner_out_nit_sot + a.inner_out_shared)
+    for step in xrange(n_steps):
+        givens = OrderedDict()
+        for x, seq in zip(a.inner_in_seqs, a.outer_in_seqs):
+            givens[x] = seq[step]
+        for xs, rows, t in zip(inner_in_states, states, taps):
+            for x, tap in zip(xs, t):
+                givens[x] = rows[-min(t) + step + tap]
+        givens.update(zip(a.inner_in_shared, shared))
+        givens.update(zip(a.inner_in_non_seqs, a.outer_in_non_seqs))
+        outs = scan_utils.clone(inner_outs, replace=givens)
+        for rows, out in zip(states, outs):
+            rows.append(out)
+        outs = outs[len(states):]
+        for rows, out in zip(nit_sot, outs):
+            rows.append(out)
+        shared = outs[len(nit_sot):]
+
+    rval = []
+    for out, rows in zip(a.outer_out_mit_sot + a.outer_out_sit_sot +
+                         a.outer_out_nit_sot, states + nit_sot):
+        rval.append(tensor.patternbroadcast(tensor.stack(rows),
+                                            out.broadcastable))
+    rval += [tensor.patternbroadcast(x, out.broadcastable)
+             for x, out in zip(shared, a.outer_out_shared)]
+    return rval
+
+
+@gof.local_optimizer([scan_op.Scan])
+def scan_vectorize_map(node):
+    """
+    Replace a scan that only maps over its sequences by a graph that
+    computes all the steps at once.
+
+    When a scan has no state carried from one step to the next (only nit-sot
+    outputs and no shared variables updated), its steps are independent.
+    If all the inner ops that depend on the sequences have a batching rule
+    (see `theano.tensor.batch`), the inner graph is rebuilt on the whole
+    sequences with `batch_graph`, which removes the loop and the call of the
+    inner function at each step.
+
+    PushOutSeqScan already moves out of the scan the elemwise and dimshuffle
+    nodes that only depend on the sequences; this optimization handles the
+    ones that are left.
+
+    """
+    op = node.op
+    if (not isinstance(op, scan_op.Scan) or op.as_while or op.n_mit_mot or
+            op.n_mit_sot or op.n_sit_sot or op.n_shared_outs or
+            not op.n_nit_sot or op.info['gpu'] or op.info['gpua'] or
+            hasattr(op, '_scan_savemem_visited')):
+        return False
+    a = scan_args(node.inputs, node.outputs, op.inputs, op.outputs, op.info)
+    if not a.outer_in_seqs:
+        return False
+
+    # Keep the errors that the scan raises on bad lengths.
+    n_steps = node.inputs[0]
+    n_steps = tensor.opt.assert_op(
+        n_steps, tensor.ge(n_steps, 0),
+        *[tensor.ge(seq.shape[0], n_steps) for seq in a.outer_in_seqs])
+    try:
+        outs = batch_graph(a.inner_in_seqs,
+                           [seq[:n_steps] for seq in a.outer_in_seqs],
+                           a.inner_out_nit_sot)
+    except NotImplementedError:
+        # Some op of the inner graph can't work on the whole sequences.
+        return False
+    outs = scan_utils.clone(outs, replace=OrderedDict(
+        zip(a.inner_in_non_seqs, a.outer_in_non_seqs)))
+    return [tensor.patternbroadcast(v, out.broadcastable)
+            for v, out in zip(outs, a.outer_out_nit_sot)]
+
+
 class PushOutDot1(gof.Optimizer):
     """
     Graph optimizer for Scan(makes it run inplace).
@@ -2301,6 +2428,14 @@ scan_seqopt1.register('scanOp_pushout_seqs_ops',
                       'scan')
 
 
+scan_seqopt1.register('scanOp_vectorize_map',
+                      opt.in2out(scan_vectorize_map, ignore_newtrees=True),
+                      3.5,
+                      'scan_vectorize_map',
+                      'fast_run',
+                      'scan')
+
+
 scan_seqopt1.register('scan_pushout_dot1',
                       PushOutDot1(),
                       4,
@@ -2334,6 +2469,14 @@ scan_eqopt2.register('scanOp_remove_constants_and_unused_inputs1',
                      'scan')
 
 
+scan_eqopt2.register('scanOp_unroll',
+                     opt.in2out(scan_unroll, ignore_newtrees=True),
+                     3,
+                     'scan_unroll',
+                     'fast_run',
+                     'scan')
+
+
 # after const merge but before stabilize so that we can have identity
 # for equivalent nodes but we still have the chance to hoist stuff out
 # of the scan later.
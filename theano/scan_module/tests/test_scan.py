@@ -271,6 +271,17 @@ class T_Scan(unittest.TestCase):
         theano_values = my_f(state, steps)
         utt.assert_allclose(numpy_values, theano_values)
 
+    def test_pickle_hash(self):
+        x = theano.tensor.vector('x')
+        output, _ = theano.scan(lambda x_t: 2 * x_t, sequences=x)
+        op = output.owner.op
+        # Simulate a hash computed by another process.
+        op._hash_inner_graph += 1
+        op2 = pickle.loads(pickle.dumps(op, protocol=-1))
+        op._hash_inner_graph -= 1
+        assert op2 == op
+        assert hash(op2) == hash(op)
+
     # Test that the inner input_storage and output_storage are
     # properly cleared
     def test_inner_storage_leak(self):
@@ -2438,6 +2449,39 @@ class T_Scan(unittest.TestCase):
         utt.assert_allclose(tx4, v_u[-1] + 4.)
         utt.assert_allclose(tx5, v_u[-1] + 5.)
 
+    def test_save_mem_circular_buffers(self):
+        # The circular buffers of the outputs start at the row that makes
+        # the last step write their last row, for every number of steps, in
+        # the Python loop and the C loop.
+        u = theano.tensor.vector('u')
+        x0 = theano.tensor.vector('x0')
+        y0 = theano.tensor.scalar('y0')
+        [x, y, z], _ = theano.scan(
+            lambda u_t, x_tm3, x_tm1, y_tm1: (x_tm3 + 0.5 * x_tm1 + u_t,
+                                              y_tm1 * 0.9 + u_t,
+                                              u_t * 2.),
+            sequences=u,
+            outputs_info=[dict(initial=x0, taps=[-3, -1]), y0, None])
+        for mode, c_loop in [(theano.Mode(linker='py'), False),
+                             (mode_with_opt, False), (mode_with_opt, True)]:
+            with theano.configparser.change_flags(**{'scan.c_loop': c_loop}):
+                f = theano.function([u, x0, y0],
+                                    [x[-1], x[-4:], y[-2:], z[-3:]],
+                                    mode=mode, allow_input_downcast=True)
+            rng = numpy.random.RandomState(utt.fetch_seed())
+            for n_steps in xrange(1, 9):
+                v_u = rng.uniform(size=(n_steps,), low=-1., high=1.)
+                v_x = [1., 2., 3.]
+                v_y = [4.]
+                for u_t in v_u:
+                    v_x.append(v_x[-3] + 0.5 * v_x[-1] + u_t)
+                    v_y.append(v_y[-1] * 0.9 + u_t)
+                x_last, x_4, y_2, z_3 = f(v_u, [1., 2., 3.], 4.)
+                utt.assert_allclose(x_last, v_x[-1])
+                utt.assert_allclose(x_4, v_x[3:][-4:])
+                utt.assert_allclose(y_2, v_y[1:][-2:])
+                utt.assert_allclose(z_3, v_u[-3:] * 2.)
+
     def test_use_scan_direct_output(self):
         # This test looks for a crash that happened when directly using the
         # recurrent output of a scan node instead of taking the result
@@ -2629,7 +2673,8 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[y])
 
         f = theano.function([x, y], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                                         'scan_vectorize_map'))
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2639,7 +2684,8 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[y], n_steps=3)
 
         f = theano.function([x, y], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                                         'scan_vectorize_map'))
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2649,7 +2695,8 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[y], n_steps=4)
 
         f = theano.function([x, y], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                                         'scan_vectorize_map'))
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2659,7 +2706,8 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[x])
 
         f = theano.function([x], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                                         'scan_vectorize_map'))
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2669,7 +2717,8 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[x], mode='FAST_COMPILE')
 
         f = theano.function([x], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                                         'scan_vectorize_map'))
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2679,7 +2728,8 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[x], truncate_gradient=1)
 
         f = theano.function([x], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                                         'scan_vectorize_map'))
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2703,7 +2753,8 @@ class T_Scan(unittest.TestCase):
 
         f = theano.function(
             [x, y], [sy, sz],
-            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                         'scan_vectorize_map'))
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
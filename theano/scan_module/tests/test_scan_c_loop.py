@@ -0,0 +1,107 @@
+from __future__ import absolute_import, print_function, division
+
+import numpy
+import unittest
+
+import theano
+import theano.tensor as T
+from theano import config
+from theano.configparser import change_flags
+from theano.scan_module.scan_op import Scan
+from theano.tests import unittest_tools as utt
+
+
+class TestScanCLoop(unittest.TestCase):
+
+    def setUp(self):
+        if not config.cxx:
+            raise unittest.SkipTest("Need a c compiler.")
+        utt.seed_rng()
+        self.mode = theano.compile.get_default_mode().including('scan')
+        if getattr(self.mode.linker, 'c_thunks', True) is False:
+            raise unittest.SkipTest("The mode does not use C code.")
+
+    def compile(self, inputs, outputs, c_loop):
+        with change_flags(**{'scan.c_loop': c_loop}):
+            f = theano.function(inputs, outputs, mode=self.mode)
+        scan_ops = [node.op for node in f.maker.fgraph.apply_nodes
+                    if isinstance(node.op, Scan)]
+        assert scan_ops
+        return f, scan_ops
+
+    def check(self, inputs, outputs, values, uses_c_loop=True):
+        f, scan_ops = self.compile(inputs, outputs, True)
+        with change_flags(**{'scan.c_loop': True}):
+            for op in scan_ops:
+                assert (op.make_c_loop() is not None) == uses_c_loop
+        g, _ = self.compile(inputs, outputs, False)
+        for r, e in zip(f(*values), g(*values)):
+            utt.assert_allclose(r, e)
+
+    def test_taps(self):
+        x = T.matrix('x')
+        W = T.matrix('W')
+        h0 = T.vector('h0')
+
+        def step(xt, hm2, hm1, c, W):
+            # dot(hm1, W) without Gemv, that has no C code when
+            # blas.ldflags is empty.
+            h = T.tanh(xt + (hm1.dimshuffle(0, 'x') * W).sum(axis=0) +
+                       0.5 * hm2)
+            return h, c + h.sum(), h.max()
+
+        (h, c, m), _ = theano.scan(
+            step, sequences=x,
+            outputs_info=[dict(initial=T.stack([h0, h0 * 2]), taps=[-2, -1]),
+                          T.constant(0., dtype=config.floatX), None],
+            non_sequences=W)
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        values = [rng.rand(7, 3).astype(config.floatX),
+                  rng.rand(3, 3).astype(config.floatX),
+                  rng.rand(3).astype(config.floatX)]
+        # All the steps, and only the last ones (which use circular
+        # buffers).
+        self.check([x, W, h0], [h, c, m], values)
+        self.check([x, W, h0], [h[-1], c[-1], m], values)
+
+    def test_error(self):
+        x = T.matrix('x')
+        W = T.matrix('W')
+        h, _ = theano.scan(lambda xt, hm1, W: T.tanh(xt + T.dot(hm1, W)),
+                           sequences=x, outputs_info=x[0], non_sequences=W)
+        f, _ = self.compile([x, W], h, True)
+        xv = numpy.ones((4, 3), dtype=config.floatX)
+        expected = [xv[0]]
+        for xt in xv:
+            expected.append(numpy.tanh(xt + expected[-1]))
+        utt.assert_allclose(f(xv, numpy.eye(3, dtype=config.floatX)),
+                            expected[1:])
+        self.assertRaises(ValueError, f, xv,
+                          numpy.ones((2, 2), dtype=config.floatX))
+
+    def test_no_c_code(self):
+        # MatrixInverse has no C code: the loop runs as usual.
+        x = T.tensor3('x')
+        y, _ = theano.scan(lambda xt: T.nlinalg.matrix_inverse(xt).sum(),
+                           sequences=x)
+        xv = (numpy.random.RandomState(utt.fetch_seed()).rand(3, 2, 2) +
+              numpy.eye(2)).astype(config.floatX)
+        self.check([x], [y], [xv], uses_c_loop=False)
+
+    def test_nested_scan(self):
+        # The inner scan has no C code, but it can use the C loop itself.
+        x = T.tensor3('x')
+
+        def inner(xt):
+            h, _ = theano.scan(lambda xtt, hm1: T.tanh(xtt + hm1),
+                               sequences=xt, outputs_info=xt[0])
+            return h[-1]
+
+        y, _ = theano.scan(inner, sequences=x)
+        xv = numpy.random.RandomState(utt.fetch_seed()).rand(
+            3, 4, 2).astype(config.floatX)
+        f, scan_ops = self.compile([x], y, True)
+        with change_flags(**{'scan.c_loop': True}):
+            assert scan_ops[0].make_c_loop() is None
+        g, _ = self.compile([x], y, False)
+        utt.assert_allclose(f(xv), g(xv))
@@ -5,6 +5,7 @@ import unittest
 
 import theano
 import theano.tensor as T
+from theano.tests import unittest_tools as utt
 
 try:
     from pygpu.gpuarray import GpuArrayException
@@ -68,3 +69,44 @@ class TestScanCheckpoint(unittest.TestCase):
         """Test that an error rises if we use taps in outputs_info."""
         self.assertRaises(RuntimeError, theano.scan_checkpoints,
                           lambda: None, [], {'initial': self.A, 'taps': [-2]})
+
+
+class TestGradCheckpoint(unittest.TestCase):
+
+    def grads(self, checkpoint, n_steps=None):
+        x = T.matrix('x')
+        h0 = T.vector('h0')
+        W = T.matrix('W')
+        m0 = T.matrix('m0')
+
+        def step(x_t, m_tm2, m_tm1, h_tm1, W):
+            h_t = T.tanh(T.dot(h_tm1, W) + x_t + 0.5 * m_tm2)
+            m_t = T.tanh(0.3 * m_tm1 + h_t)
+            return m_t, h_t, (h_t ** 2).sum()
+
+        (m, h, y), _ = theano.scan(
+            step, sequences=x,
+            outputs_info=[dict(initial=m0, taps=[-2, -1]), h0, None],
+            non_sequences=W, n_steps=n_steps, checkpoint=checkpoint)
+        cost = h[-1].sum() + 0.1 * m.sum() + y.sum() + (h ** 2).sum()
+        f = theano.function([x, h0, W, m0], T.grad(cost, [x, h0, W, m0]))
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        return f(*[rng.rand(*shape).astype(theano.config.floatX)
+                   for shape in [(7, 3), (3,), (3, 3), (2, 3)]])
+
+    def test_grad(self):
+        expected = self.grads(0)
+        for checkpoint in [1, 3, 7, 10, 'sqrt']:
+            for g, e in zip(self.grads(checkpoint), expected):
+                utt.assert_allclose(g, e)
+
+    def test_n_steps(self):
+        # The sequence is longer than the number of steps.
+        expected = self.grads(0, n_steps=5)
+        for g, e in zip(self.grads(2, n_steps=5), expected):
+            utt.assert_allclose(g, e)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, theano.scan, lambda h: h * 2,
+                          outputs_info=T.vector(), n_steps=3,
+                          checkpoint=-1)
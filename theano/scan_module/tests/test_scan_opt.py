@@ -201,8 +201,8 @@ class TestPushOutScanOutputDot(object):
                                           non_sequences=b)
 
         # Compile the function twice, once with the optimization and once
-        # without
-        opt_mode = mode.including("scan")
+        # without. This scan is a map, keep it to check its inner graph.
+        opt_mode = mode.including("scan").excluding("scan_vectorize_map")
         f_opt = theano.function([a, b], outputs, mode=opt_mode)
 
         no_opt_mode = mode.excluding("scanOp_pushout_output")
@@ -421,3 +421,120 @@ class TestPushOutSumOfDot():
         output_no_opt = f_no_opt(input1_value, input2_value, input3_value)
 
         utt.assert_allclose(output_opt, output_no_opt)
+
+
+class TestScanUnroll(unittest.TestCase):
+    """
+    Test the scan_unroll optimization, that replaces scans with a small
+    constant number of steps by their unrolled inner graph.
+    """
+
+    def setUp(self):
+        utt.seed_rng()
+        self.mode = mode.including("scan")
+
+    def rnn(self, n_steps):
+        x = T.matrix('x')
+        W = T.matrix('W')
+        h0 = T.vector('h0')
+        count = theano.shared(numpy.asarray(0, dtype='int32'))
+
+        def step(xt, hm2, hm1, c, W):
+            h = T.tanh(xt + T.dot(hm1, W) + 0.5 * hm2)
+            return [h, c + h.sum(), h.max()], {count: count + 1}
+
+        (h, c, m), updates = theano.scan(
+            step, sequences=x, n_steps=n_steps,
+            outputs_info=[dict(initial=T.stack([h0, h0 * 2]), taps=[-2, -1]),
+                          T.constant(0., dtype=config.floatX), None],
+            non_sequences=W)
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        values = [rng.rand(5, 3).astype(config.floatX),
+                  rng.rand(3, 3).astype(config.floatX),
+                  rng.rand(3).astype(config.floatX)]
+        return [x, W, h0], [h, c, m], updates, values, count
+
+    def check(self, n_steps, unrolled, **flags):
+        inputs, outputs, updates, values, count = self.rnn(n_steps)
+        flags.setdefault('scan.unroll', 4)
+        with theano.configparser.change_flags(**flags):
+            f = theano.function(inputs, outputs, updates=updates,
+                                mode=self.mode)
+        has_scan = any(isinstance(node.op, Scan)
+                       for node in f.maker.fgraph.apply_nodes)
+        assert has_scan != unrolled
+        g = theano.function(inputs, outputs, updates=updates,
+                            mode=self.mode.excluding('scan_unroll'))
+        for r, e in zip(f(*values), g(*values)):
+            utt.assert_allclose(r, e)
+        assert count.get_value() == 2 * n_steps
+
+    def test_unroll(self):
+        self.check(4, True)
+
+    def test_too_many_steps(self):
+        self.check(5, False)
+
+    def test_too_many_nodes(self):
+        self.check(4, False, **{'scan.unroll_max_nodes': 10})
+
+
+class TestScanVectorizeMap(unittest.TestCase):
+    """
+    Test the scan_vectorize_map optimization, that replaces scans without
+    state by their inner graph applied to the whole sequences.
+    """
+
+    def setUp(self):
+        utt.seed_rng()
+        self.mode = mode.including("scan")
+
+    def check(self, fn, inputs, values, vectorized=True):
+        outputs, _ = theano.map(fn, sequences=inputs[0],
+                                non_sequences=inputs[1:])
+        f = theano.function(inputs, outputs, mode=self.mode)
+        has_scan = any(isinstance(node.op, Scan)
+                       for node in f.maker.fgraph.apply_nodes)
+        assert has_scan != vectorized
+        g = theano.function(inputs, outputs,
+                            mode=self.mode.excluding('scan_vectorize_map'))
+        for r, e in zip(f(*values), g(*values)):
+            assert r.shape == e.shape
+            utt.assert_allclose(r, e)
+
+    def test_vectorize(self):
+        x = T.tensor3('x')
+        W = T.matrix('W')
+        v = T.vector('v')
+
+        def step(xt, W, v):
+            h = T.tanh(T.dot(xt, W))
+            return [h.sum(axis=1), h.max(), T.argmax(h, axis=0),
+                    T.dot(v, xt.T), T.dot(h.T, h), xt.mean(), W.sum(),
+                    h[1:, 0]]
+
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        values = [rng.rand(5, 3, 4).astype(config.floatX),
+                  rng.rand(4, 4).astype(config.floatX),
+                  rng.rand(4).astype(config.floatX)]
+        self.check(step, [x, W, v], values)
+
+    def test_unsupported_op(self):
+        # The inner Sort can't be vectorized.
+        x = T.matrix('x')
+        values = [numpy.random.RandomState(utt.fetch_seed()).rand(
+            5, 3).astype(config.floatX)]
+        self.check(lambda xt: T.sqrt(xt.sum()) + T.sort(xt), [x], values,
+                   vectorized=False)
+
+    def test_error(self):
+        x = T.matrix('x')
+        W = T.matrix('W')
+        y, _ = theano.map(lambda xt, W: T.dot(xt, W).sum(), sequences=x,
+                          non_sequences=W)
+        f = theano.function([x, W], y, mode=self.mode)
+        assert not any(isinstance(node.op, Scan)
+                       for node in f.maker.fgraph.apply_nodes)
+        self.assertRaises(ValueError, f,
+                          numpy.ones((4, 3), dtype=config.floatX),
+                          numpy.ones((2, 2), dtype=config.floatX))
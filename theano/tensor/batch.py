@@ -0,0 +1,185 @@
+"""
+Rewrite a graph to compute it on a batch of inputs at once.
+
+`batch_graph` gives, for a graph computing some outputs from some inputs, a
+graph computing the same outputs for inputs stacked along a new leading
+axis: output[i] is the output computed from the inputs input[i]. This is
+what `Function.map` uses to evaluate a function on many small inputs with a
+single call.
+
+Each Op is rewritten by a rule registered with `register_batch_rule`. The
+nodes that don't depend on the batched inputs are kept as they are.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import copy
+
+from six.moves import xrange
+
+from theano import gof
+from theano.compile import Shape, Shape_i
+from theano.tensor import basic as T
+from theano.tensor.elemwise import CAReduce, DimShuffle, Elemwise
+from theano.tensor.subtensor import Subtensor
+
+_batch_rules = {}
+
+
+def register_batch_rule(op_class):
+    """
+    Decorator registering the batching rule of the Ops of class `op_class`
+    (and its subclasses, unless they have their own rule).
+
+    A rule is called as ``rule(node, inputs, batched)`` where `inputs` are
+    the new inputs of `node` and `batched` tells which of them have the
+    batch axis in front of the original ones. It returns the outputs of the
+    node, all with the batch axis in front.
+
+    """
+    def register(rule):
+        _batch_rules[op_class] = rule
+        return rule
+    return register
+
+
+def get_batch_rule(op):
+    for cls in type(op).__mro__:
+        if cls in _batch_rules:
+            return _batch_rules[cls]
+    return None
+
+
+def batch_graph(inputs, batched_inputs, outputs):
+    """
+    Return the outputs of the graph computed on batched inputs.
+
+    Parameters
+    ----------
+    inputs : list of Variables
+        The inputs to batch.
+    batched_inputs : list of Variables
+        For each input, a variable with one more leading dimension.
+    outputs : list of Variables
+        The outputs to compute.
+
+    Returns
+    -------
+    list of Variables
+        The batched outputs, all with a leading batch dimension.
+
+    Raises
+    ------
+    NotImplementedError
+        When an Op of the graph depending on the inputs has no batching
+        rule, or its rule can't batch this node.
+
+    """
+    batched = dict(zip(inputs, batched_inputs))
+    for node in gof.graph.io_toposort(gof.graph.inputs(outputs), outputs):
+        if not any(i in batched for i in node.inputs):
+            continue
+        rule = get_batch_rule(node.op)
+        if rule is None:
+            raise NotImplementedError(
+                "No batching rule for the Op %s" % node.op)
+        new_inputs = [batched.get(i, i) for i in node.inputs]
+        try:
+            new_outputs = rule(node, new_inputs,
+                               [i in batched for i in node.inputs])
+        except (TypeError, ValueError) as e:
+            # The Op refused the batched inputs.
+            raise NotImplementedError(
+                "Could not batch the node %s: %s" % (node, e))
+        if (len(new_outputs) != len(node.outputs) or
+                any(new_out.ndim != out.ndim + 1
+                    for out, new_out in zip(node.outputs, new_outputs))):
+            raise NotImplementedError(
+                "The batching rule of %s returned wrong outputs" % node.op)
+        for out, new_out in zip(node.outputs, new_outputs):
+            batched[out] = new_out
+
+    # The outputs that don't depend on the inputs are repeated.
+    n = batched_inputs[0].shape[0]
+    rval = []
+    for out in outputs:
+        if out in batched:
+            rval.append(batched[out])
+        else:
+            out = T.as_tensor_variable(out)
+            rval.append(T.alloc(out, n, *[out.shape[i]
+                                          for i in xrange(out.ndim)]))
+    return rval
+
+
+@register_batch_rule(Elemwise)
+def _batch_elemwise(node, inputs, batched):
+    # Elemwise pads the inputs with fewer dimensions with broadcastable
+    # dimensions on the left, where the batch axis is.
+    op = node.op
+    if op.inplace_pattern:
+        # The batched inputs can be views of other variables.
+        op = Elemwise(op.scalar_op, nfunc_spec=op.nfunc_spec)
+    return op.make_node(*inputs).outputs
+
+
+@register_batch_rule(DimShuffle)
+def _batch_dimshuffle(node, inputs, batched):
+    x, = inputs
+    new_order = [0] + [d if d == 'x' else d + 1 for d in node.op.new_order]
+    return [x.dimshuffle(*new_order)]
+
+
+@register_batch_rule(CAReduce)
+def _batch_careduce(node, inputs, batched):
+    x, = inputs
+    op = copy.copy(node.op)
+    if op.axis is None:
+        op.axis = tuple(xrange(1, x.ndim))
+    else:
+        op.axis = tuple(a + 1 if a >= 0 else a for a in op.axis)
+    return op.make_node(x).outputs
+
+
+@register_batch_rule(T.MaxAndArgmax)
+def _batch_max_and_argmax(node, inputs, batched):
+    x, = inputs
+    axis = [a + 1 if a >= 0 else a for a in node.op.axis]
+    return T.MaxAndArgmax(axis).make_node(x).outputs
+
+
+@register_batch_rule(Shape)
+def _batch_shape(node, inputs, batched):
+    # All the items of the batch have the same shape.
+    x, = inputs
+    return [T.alloc(x.shape[1:], x.shape[0], x.ndim - 1)]
+
+
+@register_batch_rule(Shape_i)
+def _batch_shape_i(node, inputs, batched):
+    x, = inputs
+    return [T.alloc(x.shape[node.op.i + 1], x.shape[0])]
+
+
+@register_batch_rule(Subtensor)
+def _batch_subtensor(node, inputs, batched):
+    if any(batched[1:]):
+        raise NotImplementedError("Can't batch the indices of %s" % node.op)
+    # Take all the items of the batch.
+    op = Subtensor((slice(None),) + node.op.idx_list)
+    return op.make_node(*inputs).outputs
+
+
+@register_batch_rule(T.Dot)
+def _batch_dot(node, inputs, batched):
+    x, y = inputs
+    if all(batched):
+        return [T.batched_dot(x, y)]
+    elif batched[0]:
+        return [T.dot(x, y)]
+    else:
+        # Sum over the last axis of x and the axis after the batch axis of
+        # y, then move the batch axis in front.
+        r = T.tensordot(x, y, [[x.ndim - 1], [1]])
+        b = x.ndim - 1
+        return [r.dimshuffle(*([b] + [i for i in xrange(r.ndim) if i != b]))]
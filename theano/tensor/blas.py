@@ -1517,6 +1517,23 @@ class GemmOptimizer(Optimizer):
                 if i[1] > 0:
                     print(i)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        return {'class': 'GemmOptimizer',
+                'nb_iter': prof[1],
+                'nb_replacement': prof[2],
+                'nb_replacement_didn_t_remove': prof[3],
+                'nb_inconsistency_make': prof[4],
+                'nb_inconsistency_replace': prof[5],
+                'time_canonicalize': prof[6],
+                'time_factor_can': prof[7],
+                'time_factor_list': prof[8],
+                'time_toposort': prof[9],
+                'validate_time': prof[10],
+                'callback_time': prof[11],
+                'callbacks_time': dict(
+                    (str(f), t) for f, t in iteritems(prof[12]) if t > 0)}
+
 
 class Dot22(GemmRelated):
     """Compute a matrix-matrix product.
@@ -172,6 +172,18 @@ class InplaceElemwiseOptimizer(Optimizer):
             for n in sorted(ndim.keys()):
                 print(blanc, n, ndim[n], file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        rval = {'class': 'InplaceElemwiseOptimizer',
+                'op': str(prof['opt'].op),
+                'ndim': dict((str(n), nb) for n, nb in iteritems(prof['ndim']))}
+        for k in ['node_before',
+                  'nb_call_replace',
+                  'nb_call_validate',
+                  'nb_inconsistent']:
+            rval[k] = prof[k]
+        return rval
+
     def apply(self, fgraph):
         """
         Usage: InplaceElemwiseOptimizer(op).optimize(fgraph)
@@ -1009,14 +1021,32 @@ class ShapeFeature(object):
         """Return symbolic r.shape[i] for tensor variable r, int i."""
         if hasattr(r.type, "broadcastable") and r.type.broadcastable[i]:
             return self.lscalar_one
-        else:
+        # The Shape_i are interned, so that each one is built once and the
+        # same dimension is always represented by the same variable.
+        s = self.shape_i_vars.get((r, i))
+        if s is None:
             # Do not call make_node for test_value
             s = Shape_i(i)(r)
             try:
                 s = get_scalar_constant_value(s)
             except NotScalarConstantError:
                 pass
-            return s
+            self.shape_i_vars[(r, i)] = s
+        return s
+
+    def int_constant(self, value):
+        """Return the int64 constant for the shape element `value`.
+
+        The constants are interned, so that equal shape elements are the
+        same variable and don't have to be merged.
+
+        """
+        value = int(value)
+        c = self.int_constants.get(value)
+        if c is None:
+            c = T.constant(value, dtype='int64')
+            self.int_constants[value] = c
+        return c
 
     def shape_tuple(self, r):
         """Return a tuple of symbolic shape vars for tensor variable r."""
@@ -1060,7 +1090,7 @@ class ShapeFeature(object):
                 (isinstance(s_i, numpy.ndarray) and s_i.ndim == 0)):
             # this shape is a constant
             assert s_i >= 0
-            return T.constant(s_i, dtype='int64')
+            return self.int_constant(s_i)
         if type(s_i) in (tuple, list):
             # this dimension is the same as many of the inputs
             # which tells us that if one of the inputs is known,
@@ -1284,6 +1314,15 @@ class ShapeFeature(object):
         self.shape_of_reverse_index = {}
         # shape var -> graph v
 
+        self.scheduled_reverse_index = {}
+        # Variable -> the Shape_i nodes scheduled to use its shape
+
+        self.shape_i_vars = {}
+        # (Variable, i) -> its Shape_i(i), or its constant shape[i]
+
+        self.int_constants = {1: self.lscalar_one}
+        # int -> int64 constant
+
         for node in fgraph.toposort():
             self.on_import(fgraph, node, reason='on_attach')
 
@@ -1291,6 +1330,9 @@ class ShapeFeature(object):
         self.shape_of = {}
         self.scheduled = {}
         self.shape_of_reverse_index = {}
+        self.scheduled_reverse_index = {}
+        self.shape_i_vars = {}
+        self.int_constants = {}
         del fgraph.shape_feature
 
     def on_import(self, fgraph, node, reason):
@@ -1337,7 +1379,7 @@ class ShapeFeature(object):
                     assert str(d.dtype) != 'uint64', node
                     new_shape += sh[len(new_shape):i + 1]
                     if isinstance(d, T.Constant):
-                        casted_d = T.constant(d.data, dtype='int64')
+                        casted_d = self.int_constant(d.data)
                     else:
                         casted_d = theano.tensor.cast(d, 'int64')
                     new_shape[i] = casted_d
@@ -1350,6 +1392,13 @@ class ShapeFeature(object):
         for r, s in izip(node.outputs, o_shapes):
             self.set_shape(r, s)
 
+    def on_prune(self, fgraph, node, reason):
+        # The outputs of node are no longer in the graph, so the optimizers
+        # won't ask for their Shape_i anymore.
+        for r in node.outputs:
+            for i in xrange(getattr(r, 'ndim', None) or 0):
+                self.shape_i_vars.pop((r, i), None)
+
     def on_change_input(self, fgraph, node, i, r, new_r, reason):
         if new_r not in self.shape_of:
             # It happen that the fgraph didn't called on_import for some
@@ -1396,11 +1445,14 @@ class ShapeFeature(object):
                         % (node, i, r, new_r))
 
                 self.scheduled[shpnode] = new_r
+                self.scheduled_reverse_index.setdefault(new_r, set()).add(
+                    shpnode)
         # In case 2, if r is a variable that we've scheduled for shape update,
         # then we should cancel it.
-        unscheduled = [k for k, v in self.scheduled.items() if v == r]
-        for k in unscheduled:
-            del self.scheduled[k]
+        for k in self.scheduled_reverse_index.pop(r, ()):
+            # The reverse index isn't updated when k is scheduled again.
+            if self.scheduled.get(k) is r:
+                del self.scheduled[k]
 
         # In either case, r could be in shape_of.values(), that is, r itself
         # is the shape of  something. In that case, we want to update
@@ -1441,6 +1493,12 @@ class ShapeFeature(object):
         for dx, dy in zip(sx, sy):
             if dx is dy:
                 continue
+            if isinstance(dx, Constant) and isinstance(dy, Constant):
+                # The constants are interned, but not the ones returned as
+                # they are by infer_shape.
+                if dx.data == dy.data:
+                    continue
+                return False
             # Need to try to find that they are the same shape. We
             # need to compare the full graph. It could be slow. So I
             # just implement for now the case of Shape_i.
@@ -7267,6 +7325,18 @@ class FusionOptimizer(Optimizer):
                     print(blanc, "     ", i)
         print(blanc, " time_toposort", prof[7], file=stream)
 
+    @staticmethod
+    def profile_to_dict(prof):
+        return {'class': 'FusionOptimizer',
+                'nb_iter': prof[1],
+                'nb_replacement': prof[2],
+                'nb_inconsistency_replace': prof[3],
+                'validate_time': prof[4],
+                'callback_time': prof[5],
+                'callbacks_time': dict(
+                    (str(f), t) for f, t in iteritems(prof[6]) if t > 0),
+                'time_toposort': prof[7]}
+
 
 def local_add_mul_fusion(node):
     """Fuse consecutive add or mul in one such node with more inputs.
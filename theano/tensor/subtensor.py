@@ -936,13 +936,12 @@ class Subtensor(Op):
         //This is needed for NumPy 1.5, but not 1.7.2
         PyArray_UpdateFlags(xview, NPY_ARRAY_C_CONTIGUOUS| NPY_ARRAY_F_CONTIGUOUS);
         Py_XDECREF(%(z)s);
-        Py_INCREF(py_%(x)s);
+        Py_INCREF((PyObject*)%(x)s);
 #if NPY_API_VERSION < 0x00000007
-        PyArray_BASE(xview) = py_%(x)s;
+        PyArray_BASE(xview) = (PyObject*)%(x)s;
 #else
-        PyArray_SetBaseObject(xview, py_%(x)s);
+        PyArray_SetBaseObject(xview, (PyObject*)%(x)s);
 #endif
-        assert(py_%(x)s == (PyObject*)%(x)s);
         %(z)s = xview;
         """ % locals()
 
@@ -955,7 +954,7 @@ class Subtensor(Op):
         # have a versioned version of this op's C code.
         if len(hv) == 0:
             return ()
-        return (4, hv)
+        return (5, hv)
 
     def R_op(self, inputs, eval_points):
         # Subtensor is not differentiable wrt to its indices, therefore we
@@ -1477,7 +1476,7 @@ class IncSubtensor(Op):
     def c_code_cache_version(self):
         hv = Subtensor.helper_c_code_cache_version()
         if hv:
-            return (1, hv)
+            return (2, hv)
         else:
             return ()
 
@@ -1505,8 +1504,9 @@ class IncSubtensor(Op):
         # max_depth: we pass 0 to have this parameter ignored
         # requirements: here we pass NPY_ARRAY_ENSURECOPY to force a copy
         # context: this is almost always NULL, I'm not sure what it's used for
-        return """(PyArrayObject*)PyArray_FromAny(py_%(x)s, NULL, 0, 0,
-                NPY_ARRAY_ENSURECOPY, NULL)""" % locals()
+        return """(PyArrayObject*)PyArray_FromAny(
+                (PyObject*)%(x)s, NULL, 0, 0, NPY_ARRAY_ENSURECOPY,
+                NULL)""" % locals()
 
     def make_view_array(self, x, view_ndim):
         """
@@ -1569,7 +1569,7 @@ class IncSubtensor(Op):
 
         return """
             PyArrayObject * add_rval = (PyArrayObject*)PyNumber_InPlaceAdd(
-                    (PyObject*)zview, py_%(x)s);
+                    (PyObject*)zview, (PyObject*)%(x)s);
             if (add_rval)
             {
                 assert (PyArray_Check((PyObject*)add_rval));
@@ -1939,8 +1939,9 @@ class AdvancedIncSubtensor1(Op):
         # max_depth: we pass 0 to have this parameter ignored
         # requirements: here we pass NPY_ARRAY_ENSURECOPY to force a copy
         # context: this is almost always NULL, I'm not sure what it's used for
-        return """(PyArrayObject*)PyArray_FromAny(py_%(x)s, NULL, 0, 0,
-                NPY_ARRAY_ENSURECOPY, NULL)""" % locals()
+        return """(PyArrayObject*)PyArray_FromAny(
+                (PyObject*)%(x)s, NULL, 0, 0, NPY_ARRAY_ENSURECOPY,
+                NULL)""" % locals()
 
     def c_support_code(self):
         from theano.gof.cutils import compile_cutils_code
@@ -1986,7 +1987,7 @@ class AdvancedIncSubtensor1(Op):
         """ % locals()
 
     def c_code_cache_version(self):
-        return (3,)
+        return (4,)
 
     def perform(self, node, inp, out_):
         # TODO opt to make this inplace
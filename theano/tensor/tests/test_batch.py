@@ -0,0 +1,105 @@
+from __future__ import absolute_import, print_function, division
+
+import numpy as np
+from nose.tools import assert_raises
+
+import theano
+from theano import tensor
+from theano.tensor.batch import batch_graph, register_batch_rule
+from theano.tests import unittest_tools as utt
+
+
+def check_map(inputs, outputs, batchable=True, n=4):
+    rng = np.random.RandomState(utt.fetch_seed())
+    f = theano.function(inputs, outputs)
+    args = [rng.rand(*((n,) + (3,) * i.ndim)).astype(i.dtype)
+            for i in inputs]
+    rval = f.map(*args)
+    assert (f._map_fn is not False) == batchable
+    for i in range(n):
+        expected = f(*[a[i] for a in args])
+        for e, r in zip(expected, rval):
+            utt.assert_allclose(e, r[i])
+
+
+def test_batch_elemwise():
+    x = tensor.vector('x')
+    s = tensor.scalar('s')
+    check_map([x, s], [tensor.exp(x) * s + 1,
+                       x.dimshuffle('x', 0) + x.dimshuffle(0, 'x'),
+                       s * 2])
+
+
+def test_batch_reduce():
+    m = tensor.matrix('m')
+    check_map([m], [m.sum(), m.sum(axis=1), m.max(axis=0),
+                    tensor.argmax(m, axis=-1), m.prod(axis=[0, 1])])
+
+
+def test_batch_subtensor():
+    m = tensor.matrix('m')
+    i = tensor.lscalar('i')
+    check_map([m], [m[0], m[1:, -1], m[::2].sum(), m.shape[1] * m.mean()])
+    assert_raises(NotImplementedError, batch_graph,
+                  [i], [tensor.lvector()], [m[i]])
+
+
+def test_batch_dot():
+    m = tensor.matrix('m')
+    x = tensor.vector('x')
+    w = theano.shared(np.arange(6).reshape(3, 2).astype(m.dtype), 'w')
+    check_map([m, x], [tensor.dot(m, x), tensor.dot(x, m.T),
+                       tensor.dot(x, x), tensor.dot(m, m),
+                       tensor.dot(m, w), tensor.dot(w.T, m),
+                       tensor.dot(w[:, 0], m.T), w.sum()])
+
+
+def test_batch_not_supported():
+    x = tensor.vector('x')
+    assert_raises(NotImplementedError, batch_graph,
+                  [x], [tensor.matrix()], [tensor.sort(x)])
+    check_map([x], [tensor.sort(x) + 1, x.sum()], batchable=False)
+
+
+class VectorOp(theano.Op):
+    """Copy a vector, refusing inputs of other dimensions."""
+
+    __props__ = ()
+
+    def make_node(self, x):
+        if x.ndim != 1:
+            raise TypeError('x must be a vector')
+        return theano.Apply(self, [x], [x.type()])
+
+    def perform(self, node, inputs, outputs):
+        outputs[0][0] = inputs[0].copy()
+
+
+@register_batch_rule(VectorOp)
+def _batch_vector_op(node, inputs, batched):
+    return node.op.make_node(*inputs).outputs
+
+
+def test_batch_rule_fails():
+    x = tensor.vector('x')
+    assert_raises(NotImplementedError, batch_graph,
+                  [x], [tensor.matrix()], [VectorOp()(x)])
+    check_map([x], [VectorOp()(x) * 2], batchable=False)
+
+
+def test_map_outputs():
+    x = tensor.vector('x')
+    f = theano.function([x], x * 2)
+    xv = np.ones((2, 3), dtype=x.dtype)
+    utt.assert_allclose(f.map(xv), xv * 2)
+    f = theano.function([x], {'a': x * 2, 'b': x.sum()})
+    r = f.map(xv)
+    utt.assert_allclose(r['a'], xv * 2)
+    utt.assert_allclose(r['b'], [3, 3])
+    assert_raises(TypeError, f.map, xv, xv)
+    assert_raises(TypeError, f.map, xv[0, 0])
+    # With updates, the function is called on each input.
+    s = theano.shared(np.asarray(0, dtype=x.dtype))
+    f = theano.function([x], x.sum() + s, updates={s: s + 1})
+    utt.assert_allclose(f.map(xv), [3, 4])
+    assert s.get_value() == 2
@@ -6462,6 +6462,35 @@ class TestShapeFeature(unittest.TestCase):
         self.assertRaises(IndexError, shape_feature.same_shape, x, o, 1, 0)
         self.assertRaises(IndexError, shape_feature.same_shape, x, o, 0, 1)
 
+    def test_interned(self):
+        x = matrix()
+        y = T.zeros((3, 5))
+        z = T.ones((5, 3))
+        fgraph = FunctionGraph([x], [x.T, y, z.T, z])
+        shape_feature = opt.ShapeFeature()
+        fgraph.attach_feature(shape_feature)
+        x = fgraph.inputs[0]
+        xt, y, zt, z = fgraph.outputs
+        # Each Shape_i is only built once.
+        assert shape_feature.shape_ir(0, x) is shape_feature.shape_ir(0, x)
+        assert shape_feature.shape_of[x][1] is shape_feature.shape_of[xt][0]
+        # Equal shape constants are the same shape.
+        assert shape_feature.same_shape(y, zt)
+        assert not shape_feature.same_shape(y, z)
+
+    def test_interned_pruned(self):
+        x = matrix()
+        fgraph = FunctionGraph([x], [T.exp(x)], clone=False)
+        shape_feature = opt.ShapeFeature()
+        fgraph.attach_feature(shape_feature)
+        y = fgraph.outputs[0]
+        shape_feature.shape_ir(0, y)
+        assert (y, 0) in shape_feature.shape_i_vars
+        fgraph.replace(y, T.log(x))
+        # The Shape_i of the variables removed from the graph are dropped.
+        assert (y, 0) not in shape_feature.shape_i_vars
+        assert (x, 0) in shape_feature.shape_i_vars
+
 
 def test_assert_op_gradient():
     x = T.vector('x')
@@ -2,8 +2,12 @@
 Test config options.
 """
 from __future__ import absolute_import, print_function, division
+import threading
 import unittest
-from theano.configparser import AddConfigVar, ConfigParam, THEANO_FLAGS_DICT
+
+import theano
+from theano.configparser import (AddConfigVar, ConfigParam, THEANO_FLAGS_DICT,
+                                 change_flags, local_flags)
 
 
 class T_config(unittest.TestCase):
@@ -42,3 +46,52 @@ class T_config(unittest.TestCase):
         assert 'T_config.test_invalid_default_b' not in THEANO_FLAGS_DICT
 
         # TODO We should remove these dummy options on test exit.
+
+    def test_local_flags(self):
+        # The values set by local_flags are only seen by the thread that set
+        # them.
+        orig = theano.config.traceback.limit
+        seen = []
+        entered = threading.Event()
+        checked = threading.Event()
+
+        def other_thread():
+            with local_flags(**{'traceback.limit': orig + 3}):
+                seen.append(theano.config.traceback.limit)
+                entered.set()
+                checked.wait()
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        entered.wait()
+        assert theano.config.traceback.limit == orig
+        with local_flags(**{'traceback.limit': orig + 1}):
+            assert theano.config.traceback.limit == orig + 1
+            with local_flags(**{'traceback.limit': orig + 2}):
+                assert theano.config.traceback.limit == orig + 2
+            assert theano.config.traceback.limit == orig + 1
+        checked.set()
+        thread.join()
+        assert seen == [orig + 3]
+        assert theano.config.traceback.limit == orig
+
+    def test_change_flags_in_local_flags(self):
+        # Changing a flag set by local_flags only changes the value seen by
+        # the current thread.
+        orig = theano.config.traceback.limit
+        seen = []
+
+        def other_thread():
+            seen.append(theano.config.traceback.limit)
+
+        with local_flags(**{'traceback.limit': orig + 1}):
+            with change_flags(**{'traceback.limit': orig + 2}):
+                assert theano.config.traceback.limit == orig + 2
+                thread = threading.Thread(target=other_thread)
+                thread.start()
+                thread.join()
+            assert theano.config.traceback.limit == orig + 1
+            theano.config.traceback.limit = orig + 3
+            assert theano.config.traceback.limit == orig + 3
+        assert theano.config.traceback.limit == orig
+        assert seen == [orig]